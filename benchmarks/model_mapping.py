@@ -0,0 +1,178 @@
+"""Compare the old by-name dataclass row mapping with the positional tuple models.
+
+Run from the repository root: python -m benchmarks.model_mapping [rows]
+No database is needed; records are built with asyncpg's internal constructor.
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Callable, Optional, Tuple
+
+from asyncpg.protocol.protocol import _create_record
+
+from bot.database.repositories.events import Event
+from bot.database.repositories.registrations import Participant
+from bot.database.repositories.users import User
+
+EVENT_FIELDS = (
+    "id", "title", "date", "time", "end_date", "end_time", "place", "description", "cost", "image_file_id",
+    "max_participants", "reminder_3days", "reminder_1day", "reminder_3days_sent_at", "reminder_1day_sent_at", "status",
+)
+USER_FIELDS = ("id", "telegram_id", "username", "role", "first_name", "last_name")
+PARTICIPANT_FIELDS = ("user_id", "telegram_id", "username", "first_name", "last_name")
+
+
+@dataclass
+class LegacyEvent:
+    id: int
+    title: str
+    date: date
+    time: Optional[dt_time]
+    end_date: Optional[date]
+    end_time: Optional[dt_time]
+    place: Optional[str]
+    description: Optional[str]
+    cost: Optional[float]
+    image_file_id: Optional[str]
+    image_file_ids: Tuple[str, ...]
+    max_participants: Optional[int]
+    reminder_3days: bool
+    reminder_1day: bool
+    reminder_3days_sent_at: Optional[datetime]
+    reminder_1day_sent_at: Optional[datetime]
+    status: str
+
+
+@dataclass
+class LegacyUser:
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    role: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class LegacyParticipant:
+    user_id: int
+    telegram_id: Optional[int]
+    username: Optional[str]
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+
+def legacy_event(record) -> LegacyEvent:
+    return LegacyEvent(
+        id=record["id"],
+        title=record["title"],
+        date=record["date"],
+        time=record["time"],
+        end_date=record["end_date"],
+        end_time=record["end_time"],
+        place=record["place"],
+        description=record["description"],
+        cost=float(record["cost"]) if record["cost"] is not None else None,
+        image_file_id=record["image_file_id"],
+        image_file_ids=(),
+        max_participants=record["max_participants"],
+        reminder_3days=record["reminder_3days"],
+        reminder_1day=record["reminder_1day"],
+        reminder_3days_sent_at=record["reminder_3days_sent_at"],
+        reminder_1day_sent_at=record["reminder_1day_sent_at"],
+        status=record["status"],
+    )
+
+
+def legacy_user(record) -> LegacyUser:
+    return LegacyUser(
+        id=record["id"],
+        telegram_id=record["telegram_id"],
+        username=record["username"],
+        role=record["role"],
+        first_name=record.get("first_name"),
+        last_name=record.get("last_name"),
+    )
+
+
+def legacy_participant(record) -> LegacyParticipant:
+    return LegacyParticipant(
+        user_id=record["user_id"],
+        telegram_id=record["telegram_id"],
+        username=record["username"],
+        first_name=record.get("first_name"),
+        last_name=record.get("last_name"),
+    )
+
+
+def make_records(fields: tuple[str, ...], rows: list[tuple[Any, ...]]) -> list:
+    mapping = {name: index for index, name in enumerate(fields)}
+    return [_create_record(mapping, row) for row in rows]
+
+
+def event_rows(count: int, cost: Callable[[int], Any]) -> list[tuple[Any, ...]]:
+    return [
+        (
+            index, f"Event {index}", date(2026, 1, 1), dt_time(19, 0), None, None, "Place", "Description",
+            cost(index), f"file-{index}", 20, True, True, None, None, "active",
+        )
+        for index in range(count)
+    ]
+
+
+def measure(label: str, mapper: Callable, records: list) -> tuple[float, int]:
+    # Best of three for time; a separate traced pass for the memory kept by the result.
+    best = float("inf")
+    for _ in range(3):
+        gc.collect()
+        started = time.perf_counter()
+        result = [mapper(record) for record in records]
+        best = min(best, time.perf_counter() - started)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = [mapper(record) for record in records]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"  {label:<10} {best * 1000:8.1f} ms {retained / 1024 / 1024:8.1f} MiB")
+    return best, retained
+
+
+def compare(name: str, legacy: tuple[Callable, list], compact: tuple[Callable, list]) -> None:
+    print(name)
+    old_time, old_memory = measure("legacy", *legacy)
+    new_time, new_memory = measure("tuple", *compact)
+    print(f"  {'saving':<10} {100 * (1 - new_time / old_time):7.1f} % {100 * (1 - new_memory / old_memory):7.1f} %")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{count} rows, time is best of 3, memory is what the mapped list retains")
+    compare(
+        "Event",
+        # The database used to return numeric cost as Decimal; it is now cast to float8 in SQL.
+        (legacy_event, make_records(EVENT_FIELDS, event_rows(count, lambda index: Decimal("1500.00")))),
+        (lambda record: Event(*record), make_records(EVENT_FIELDS, event_rows(count, lambda index: 1500.0))),
+    )
+    user_rows = [(index, 10_000 + index, f"user{index}", "user", "Name", None) for index in range(count)]
+    compare(
+        "User",
+        (legacy_user, make_records(USER_FIELDS, user_rows)),
+        (lambda record: User(*record), make_records(USER_FIELDS, user_rows)),
+    )
+    participant_rows = [(index, 10_000 + index, f"user{index}", "Name", None) for index in range(count)]
+    compare(
+        "Participant",
+        (legacy_participant, make_records(PARTICIPANT_FIELDS, participant_rows)),
+        (lambda record: Participant(*record), make_records(PARTICIPANT_FIELDS, participant_rows)),
+    )
+
+
+if __name__ == "__main__":
+    main()
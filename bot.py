@@ -1,20 +1,33 @@
 import asyncio
 import logging
+import signal
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
-from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from zoneinfo import ZoneInfo
 
 from config import load_config
-from bot.database import close_pool, init_pool, run_schema_setup
+from bot.database import close_pool, close_replica, init_pool, init_replica, run_schema_setup
+from bot.database.fsm_storage import WriteBatchIsolation, build_fsm_storage
+from bot.database.pool import QUERY_CLASS_BACKGROUND, query_class
+from bot.database.profiler import get_profiler
 from bot.handlers import setup as setup_handlers
 from bot.handlers.payment_webhook import setup_webhook_app
+from bot.handlers.telegram_webhook import setup_telegram_webhook
+from bot.middleware.api_calls import ApiCallBudgetMiddleware, ApiCallCountingMiddleware
+from bot.middleware.edit_dedup import SkipUnchangedEditsMiddleware
+from bot.middleware.message_tracking import MessageTrackingMiddleware
+from bot.middleware.metrics import HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from bot.middleware.unit_of_work import UnitOfWorkMiddleware
 from bot.services.container import build_services
 from bot.utils.di import set_config, set_services
+from bot.utils.loop_monitor import build_loop_monitor
+from bot.utils.tasks import init_task_supervisor
+from bot.utils.telegram_session import RateLimitedSession
+from bot.utils.update_scheduler import ChatUpdateScheduler
 
 
 async def main() -> None:
@@ -22,16 +35,37 @@ async def main() -> None:
     try:
         config = load_config()
         set_config(config)
-        await init_pool(config.database.dsn)
+        tasks = init_task_supervisor(config.runtime)
+        tasks.start_service(build_loop_monitor(config.runtime).run(), kind="loop_lag_monitor")
+        await init_pool(config.database)
         await run_schema_setup()
+        replica = await init_replica(config.database)
         services = build_services(config)
         set_services(services)
-        session = AiohttpSession(timeout=30.0)
+        session = RateLimitedSession(config.bot.rate_limit, timeout=30.0)
+        session.middleware(MessageTrackingMiddleware(services.message_registry))
+        if config.bot.webhook is None:
+            # Behind a webhook load balancer another instance may have changed the message since.
+            session.middleware(SkipUnchangedEditsMiddleware())
+        session.middleware(ApiCallCountingMiddleware())
         bot = Bot(token=config.bot.token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-        dp = Dispatcher()
+        fsm_storage = build_fsm_storage(config.fsm)
+        # State changes made while handling an update are written once, after the handler
+        # returns; a handler that raises leaves the stored state as it was.
+        events_isolation = WriteBatchIsolation(fsm_storage, ChatUpdateScheduler(config.bot.update_concurrency))
+        dp = Dispatcher(storage=fsm_storage, events_isolation=events_isolation)
+        dp.update.outer_middleware(UpdateMetricsMiddleware())
+        dp.update.outer_middleware(UnitOfWorkMiddleware())
+        dp.message.middleware(HandlerMetricsMiddleware())
+        dp.callback_query.middleware(HandlerMetricsMiddleware())
+        dp.message.middleware(ApiCallBudgetMiddleware(config.bot.api_call_budget))
+        dp.callback_query.middleware(ApiCallBudgetMiddleware(config.bot.api_call_budget))
         setup_handlers(dp)
         
-        webhook_app = setup_webhook_app()
+        webhook_app = setup_webhook_app(bot, config.metrics.token)
+        telegram_webhook = None
+        if config.bot.webhook:
+            telegram_webhook = setup_telegram_webhook(webhook_app, dp, bot, config.bot.webhook)
         webhook_runner = web.AppRunner(webhook_app)
         await webhook_runner.setup()
         webhook_site = web.TCPSite(webhook_runner, "0.0.0.0", 8777)
@@ -42,14 +76,80 @@ async def main() -> None:
         try:
             scheduler = AsyncIOScheduler(timezone=ZoneInfo("Europe/Moscow"))
             async def reminders_job() -> None:
-                await services.reminders.process_due_reminders(bot)
+                with query_class(QUERY_CLASS_BACKGROUND):
+                    await services.reminders.process_due_reminders(bot)
             scheduler.add_job(reminders_job, "cron", minute="*/5", id="reminders")
+            async def reconciliation_job() -> None:
+                with query_class(QUERY_CLASS_BACKGROUND):
+                    await services.reconciliation.reconcile(bot)
+            scheduler.add_job(
+                reconciliation_job,
+                "interval",
+                minutes=config.reconciliation.interval_minutes,
+                id="payments_reconciliation",
+                max_instances=1,
+                coalesce=True,
+            )
+            if services.retention.enabled:
+                async def retention_job() -> None:
+                    with query_class(QUERY_CLASS_BACKGROUND):
+                        await services.retention.archive()
+                scheduler.add_job(
+                    retention_job,
+                    "cron",
+                    hour=config.retention.run_at.hour,
+                    minute=config.retention.run_at.minute,
+                    id="retention",
+                    max_instances=1,
+                    coalesce=True,
+                )
+            async def fsm_purge_job() -> None:
+                with query_class(QUERY_CLASS_BACKGROUND):
+                    await fsm_storage.purge_expired()
+            scheduler.add_job(fsm_purge_job, "interval", hours=1, id="fsm_purge", max_instances=1, coalesce=True)
+            async def message_registry_purge_job() -> None:
+                with query_class(QUERY_CLASS_BACKGROUND):
+                    await services.message_registry.purge_expired()
+            scheduler.add_job(
+                message_registry_purge_job,
+                "interval",
+                hours=1,
+                id="message_registry_purge",
+                max_instances=1,
+                coalesce=True,
+            )
+            profiler = get_profiler()
+            if profiler and config.database.profiler.dump_path:
+                scheduler.add_job(
+                    profiler.dump,
+                    "interval",
+                    minutes=config.database.profiler.dump_interval_minutes,
+                    id="query_profile_dump",
+                    coalesce=True,
+                )
             scheduler.start()
-            await dp.start_polling(bot, polling_timeout=20)
+            with query_class(QUERY_CLASS_BACKGROUND):
+                # The task copies the current context, so the worker keeps the background timeouts.
+                tasks.start_service(services.refunds.run(bot), kind="refund_worker")
+                if replica:
+                    tasks.start_service(replica.run(), kind="replica_monitor")
+            if telegram_webhook:
+                await telegram_webhook.set_webhook()
+                await _wait_for_stop_signal()
+            else:
+                # getUpdates is refused while a webhook is set, e.g. after switching back from webhook mode.
+                await bot.delete_webhook()
+                await dp.start_polling(bot, polling_timeout=20)
         finally:
             if scheduler:
                 scheduler.shutdown(wait=False)
+            profiler = get_profiler()
+            if profiler:
+                profiler.dump()
             await webhook_runner.cleanup()
+            # After the webhook drain, so cleanups started by the last updates still run.
+            await tasks.drain(config.runtime.background_drain_seconds)
+            await close_replica()
             await close_pool()
             await bot.session.close()
     except Exception as e:
@@ -57,6 +157,18 @@ async def main() -> None:
         raise
 
 
+async def _wait_for_stop_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+
+
 if __name__ == "__main__":
     asyncio.run(main())
 
@@ -1,5 +1,15 @@
 from .migrations import run_schema_setup
 from .pool import close_pool, get_pool, init_pool
+from .replica import close_replica, init_replica
+from .unit_of_work import unit_of_work
 
-__all__ = ["close_pool", "get_pool", "init_pool", "run_schema_setup"]
+__all__ = [
+    "close_pool",
+    "close_replica",
+    "get_pool",
+    "init_pool",
+    "init_replica",
+    "run_schema_setup",
+    "unit_of_work",
+]
 
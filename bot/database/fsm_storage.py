@@ -0,0 +1,274 @@
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, AsyncGenerator, AsyncIterator, Mapping, Optional
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+
+from config import FSMConfig
+from bot.database.pool import get_pool
+from bot.database.repositories.fsm_states import FSMKey, FSMStateRepository
+from bot.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+_TYPE_TAG = "__fsm_type__"
+_PURGE_BATCH_SIZE = 1000
+
+_batch: ContextVar[Optional["_Batch"]] = ContextVar("fsm_write_batch", default=None)
+
+CACHE_LOOKUPS = Counter(
+    "fsm_cache_lookups_total",
+    "FSM state reads by whether the in-process cache answered them.",
+    ("result",),
+)
+WRITES = Counter(
+    "fsm_writes_total",
+    "FSM state changes written, folded into a later write, or discarded with a failed handler.",
+    ("outcome",),
+)
+
+
+@dataclass(slots=True)
+class _Entry:
+    state: Optional[str]
+    data: dict[str, Any]
+    # Wall clock of the last change, for the abandoned-state TTL.
+    updated_at: float
+    # Monotonic time the entry was last read from or written to the database.
+    synced_at: float
+
+
+@dataclass(slots=True)
+class _Batch:
+    # Every state read or written while handling one update, and which of them changed.
+    entries: dict[FSMKey, _Entry] = field(default_factory=dict)
+    dirty: set[FSMKey] = field(default_factory=set)
+
+
+class PostgresStorage(BaseStorage):
+    """FSM storage in the fsm_states table with an LRU write-through cache in front.
+
+    Inside write_batch() a state is read at most once and changes are written once
+    when the batch ends, so several update_data calls in one handler cost one
+    statement; a batch that ends with an exception writes nothing. The cache across updates only knows this process's writes, which is why
+    FSM_CACHE_TTL_SECONDS defaults to 0 behind a webhook, where any instance may get
+    the next update of a chat.
+    """
+
+    def __init__(self, repository: FSMStateRepository, config: FSMConfig) -> None:
+        self._repository = repository
+        self._config = config
+        self._cache: OrderedDict[FSMKey, _Entry] = OrderedDict()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._load(_storage_key(key))
+        entry.state = state.state if isinstance(state, State) else state
+        await self._write(_storage_key(key), entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = await self._load(_storage_key(key))
+        return entry.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._load(_storage_key(key))
+        entry.data = copy.deepcopy(dict(data))
+        await self._write(_storage_key(key), entry)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        entry = await self._load(_storage_key(key))
+        return copy.deepcopy(entry.data)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        entry = await self._load(_storage_key(key))
+        entry.data.update(copy.deepcopy(dict(data)))
+        await self._write(_storage_key(key), entry)
+        return copy.deepcopy(entry.data)
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+    @asynccontextmanager
+    async def write_batch(self) -> AsyncIterator[None]:
+        if _batch.get() is not None:
+            yield
+            return
+        batch = _Batch()
+        token = _batch.set(batch)
+        try:
+            yield
+        except BaseException:
+            # The handler failed: its state changes are dropped, and the cache forgets the
+            # entries it changed in place so the next update rereads them.
+            for key in batch.dirty:
+                self._cache.pop(key, None)
+            if batch.dirty:
+                WRITES.inc(len(batch.dirty), outcome="discarded")
+            raise
+        finally:
+            _batch.reset(token)
+        if batch.dirty:
+            await self._flush({key: batch.entries[key] for key in batch.dirty})
+
+    async def purge_expired(self) -> int:
+        ttl = self._config.state_ttl_hours * 3600
+        removed = 0
+        while True:
+            count = await self._repository.delete_expired(ttl, _PURGE_BATCH_SIZE)
+            removed += count
+            if count < _PURGE_BATCH_SIZE:
+                break
+        if removed:
+            logger.info(f"Purged {removed} abandoned FSM states")
+        return removed
+
+    async def _load(self, key: FSMKey) -> _Entry:
+        batch = _batch.get()
+        if batch is not None and key in batch.entries:
+            return batch.entries[key]
+        entry = await self._load_shared(key)
+        if batch is not None:
+            batch.entries[key] = entry
+        return entry
+
+    async def _load_shared(self, key: FSMKey) -> _Entry:
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.synced_at < self._config.cache_ttl_seconds:
+            if time.time() - entry.updated_at >= self._config.state_ttl_hours * 3600:
+                entry.state, entry.data = None, {}
+            self._cache.move_to_end(key)
+            CACHE_LOOKUPS.inc(result="hit")
+            return entry
+        CACHE_LOOKUPS.inc(result="miss")
+        stored = await self._repository.get(key, self._config.state_ttl_hours * 3600)
+        if stored is None:
+            entry = _Entry(state=None, data={}, updated_at=time.time(), synced_at=now)
+        else:
+            entry = _Entry(
+                state=stored.state,
+                data=json.loads(stored.data, object_hook=_decode_value),
+                updated_at=time.time() - stored.age_seconds,
+                synced_at=now,
+            )
+        self._remember(key, entry)
+        return entry
+
+    async def _write(self, key: FSMKey, entry: _Entry) -> None:
+        entry.updated_at = time.time()
+        self._remember(key, entry)
+        batch = _batch.get()
+        if batch is None:
+            await self._flush({key: entry})
+            return
+        if key in batch.dirty:
+            WRITES.inc(outcome="coalesced")
+        batch.entries[key] = entry
+        batch.dirty.add(key)
+
+    async def _flush(self, entries: Mapping[FSMKey, _Entry]) -> None:
+        saves = []
+        deletes = []
+        for key, entry in entries.items():
+            if entry.state is None and not entry.data:
+                deletes.append(key)
+            else:
+                saves.append((key, entry.state, json.dumps(entry.data, default=_encode_value, ensure_ascii=False)))
+        try:
+            if saves:
+                await self._repository.save_many(saves)
+            if deletes:
+                await self._repository.delete_many(deletes)
+        except (asyncpg.PostgresError, OSError, TimeoutError) as e:
+            # The cache must not claim a state the database never got.
+            for key in entries:
+                self._cache.pop(key, None)
+            logger.error(f"Failed to persist {len(entries)} FSM states: {e}")
+            raise
+        WRITES.inc(len(entries), outcome="written")
+        synced_at = time.monotonic()
+        for entry in entries.values():
+            entry.synced_at = synced_at
+
+    def _remember(self, key: FSMKey, entry: _Entry) -> None:
+        if self._config.cache_size <= 0:
+            return
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._config.cache_size:
+            self._cache.popitem(last=False)
+
+
+class WriteBatchIsolation(BaseEventIsolation):
+    """Event isolation that runs each update inside one storage write batch.
+
+    aiogram reads the update's FSM state inside the isolation lock, before any outer
+    middleware runs, so the batch has to open here for that read to count as its first.
+    """
+
+    def __init__(self, storage: PostgresStorage, inner: BaseEventIsolation) -> None:
+        self._storage = storage
+        self._inner = inner
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        async with self._inner.lock(key), self._storage.write_batch():
+            yield
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+
+def _storage_key(key: StorageKey) -> FSMKey:
+    return (
+        key.bot_id,
+        key.chat_id,
+        key.user_id,
+        key.thread_id or 0,
+        key.business_connection_id or "",
+        key.destiny,
+    )
+
+
+def _encode_value(value: Any) -> Any:
+    # FSM data holds parsed dates and times from the event wizard; JSON has no type for them.
+    if isinstance(value, datetime):
+        return {_TYPE_TAG: "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {_TYPE_TAG: "date", "value": value.isoformat()}
+    if isinstance(value, dt_time):
+        return {_TYPE_TAG: "time", "value": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {_TYPE_TAG: "decimal", "value": str(value)}
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"FSM data value of type {type(value).__name__} is not serializable")
+
+
+def _decode_value(value: dict[str, Any]) -> Any:
+    kind = value.get(_TYPE_TAG)
+    if kind is None:
+        return value
+    raw = value["value"]
+    if kind == "datetime":
+        return datetime.fromisoformat(raw)
+    if kind == "date":
+        return date.fromisoformat(raw)
+    if kind == "time":
+        return dt_time.fromisoformat(raw)
+    if kind == "decimal":
+        return Decimal(raw)
+    return value
+
+
+def build_fsm_storage(config: FSMConfig) -> PostgresStorage:
+    return PostgresStorage(FSMStateRepository(get_pool()), config)
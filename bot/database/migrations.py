@@ -2,7 +2,7 @@ import logging
 
 from asyncpg import Connection
 
-from .pool import get_pool
+from .pool import QUERY_CLASS_BULK, get_pool, query_timeout
 from .schema import STATEMENTS
 
 logger = logging.getLogger(__name__)
@@ -17,7 +17,7 @@ async def run_schema_setup() -> None:
 async def _apply_statements(connection: Connection) -> None:
     for i, statement in enumerate(STATEMENTS, 1):
         try:
-            await connection.execute(statement)
+            await connection.execute(statement, timeout=query_timeout(QUERY_CLASS_BULK))
             logger.debug(f"Migration {i}/{len(STATEMENTS)} applied successfully")
         except Exception as e:
             logger.warning(f"Migration {i}/{len(STATEMENTS)} failed (may already be applied): {e}")
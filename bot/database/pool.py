@@ -1,25 +1,72 @@
 import asyncio
-from typing import Optional
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
 
 import asyncpg
 
+from config import DatabaseConfig, QueryTimeouts
+from bot.database.profiler import enable_profiler
+from bot.utils.metrics import Counter, Gauge, Histogram
+
+QUERY_CLASS_INTERACTIVE = "interactive"
+QUERY_CLASS_BACKGROUND = "background"
+QUERY_CLASS_BULK = "bulk"
+
 _pool: Optional[asyncpg.Pool] = None
 _lock = asyncio.Lock()
+_config: Optional[DatabaseConfig] = None
+_query_class: ContextVar[str] = ContextVar("db_query_class", default=QUERY_CLASS_INTERACTIVE)
 
+POOL_ACQUIRE_SECONDS = Histogram(
+    "db_pool_acquire_seconds",
+    "Time spent waiting for a pooled connection.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_ACQUIRE_TIMEOUTS = Counter(
+    "db_pool_acquire_timeouts_total",
+    "Connection acquisitions that gave up waiting.",
+)
+POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Connections currently checked out of the pool.",
+)
+POOL_SIZE = Gauge(
+    "db_pool_connections",
+    "Connections currently open, idle or in use.",
+)
+POOL_MAX_SIZE = Gauge(
+    "db_pool_max_connections",
+    "Configured pool size limit.",
+)
+QUERY_TIMEOUTS = Counter(
+    "db_query_timeouts_total",
+    "Queries cancelled by their per-class timeout.",
+    ("query_class",),
+)
 
-async def init_pool(dsn: str) -> asyncpg.Pool:
-    global _pool
+
+async def init_pool(config: DatabaseConfig) -> asyncpg.Pool:
+    global _pool, _config
     async with _lock:
         if _pool is None:
+            _config = config
             _pool = await asyncpg.create_pool(
-                dsn,
-                min_size=5,
-                max_size=10,
-                command_timeout=5,
+                config.dsn,
+                min_size=config.min_size,
+                max_size=config.max_size,
+                command_timeout=config.timeouts.interactive,
+                statement_cache_size=config.statement_cache_size,
+                max_inactive_connection_lifetime=config.max_inactive_connection_lifetime,
                 server_settings={
                     "application_name": "povod_bot",
                 },
             )
+            POOL_SIZE.set_function(_pool.get_size)
+            POOL_IN_USE.set_function(lambda: _pool.get_size() - _pool.get_idle_size() if _pool else 0)
+            POOL_MAX_SIZE.set(config.max_size)
+            enable_profiler(config.profiler, _pool)
     return _pool
 
 
@@ -36,3 +83,46 @@ async def close_pool() -> None:
             await _pool.close()
             _pool = None
 
+
+async def acquire(pool: asyncpg.Pool) -> asyncpg.Connection:
+    timeout = _config.acquire_timeout if _config else None
+    started = time.perf_counter()
+    try:
+        connection = await pool.acquire(timeout=timeout)
+    except asyncio.TimeoutError:
+        POOL_ACQUIRE_TIMEOUTS.inc()
+        raise
+    finally:
+        POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
+    return connection
+
+
+@asynccontextmanager
+async def pooled_connection(pool: asyncpg.Pool) -> AsyncIterator[asyncpg.Connection]:
+    connection = await acquire(pool)
+    try:
+        yield connection
+    finally:
+        await pool.release(connection)
+
+
+@contextmanager
+def query_class(name: str) -> Iterator[None]:
+    token = _query_class.set(name)
+    try:
+        yield
+    finally:
+        _query_class.reset(token)
+
+
+def current_query_class() -> str:
+    return _query_class.get()
+
+
+def query_timeout(name: Optional[str] = None) -> float:
+    timeouts = _config.timeouts if _config else QueryTimeouts()
+    return getattr(timeouts, name or _query_class.get())
+
+
+def record_query_timeout(name: Optional[str] = None) -> None:
+    QUERY_TIMEOUTS.inc(query_class=name or _query_class.get())
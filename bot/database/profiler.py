@@ -0,0 +1,288 @@
+import json
+import logging
+import random
+import re
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import Lock
+from typing import Any, Optional
+
+import asyncpg
+
+from config import ProfilerConfig
+from bot.utils.metrics import Counter, Histogram, register, sample_line
+from bot.utils.tasks import spawn
+
+logger = logging.getLogger(__name__)
+
+_QUANTILES = (0.5, 0.95, 0.99)
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_WRITE_KEYWORDS = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|CREATE|ALTER|DROP|TRUNCATE|COPY)\b", re.IGNORECASE)
+# Frames in these files are plumbing; the caller label is the first frame outside them.
+_SKIP_FILES = {
+    __file__,
+    str(Path(__file__).with_name("unit_of_work.py")),
+    str(Path(__file__).with_name("repositories") / "base.py"),
+}
+
+QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Query latency by calling repository method.",
+    ("caller",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+QUERY_ROWS = Counter(
+    "db_query_rows_total",
+    "Rows returned or affected by calling repository method.",
+    ("caller",),
+)
+SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Queries slower than the configured threshold.",
+    ("caller",),
+)
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    caller: str
+    count: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    samples: deque = field(default_factory=deque)
+    last_plan: Optional[str] = None
+
+    def quantiles(self) -> dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {quantile: 0.0 for quantile in _QUANTILES}
+        return {
+            quantile: ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+            for quantile in _QUANTILES
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        quantiles = self.quantiles()
+        return {
+            "statement": self.statement,
+            "caller": self.caller,
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "p50_ms": round(quantiles[0.5] * 1000, 3),
+            "p95_ms": round(quantiles[0.95] * 1000, 3),
+            "p99_ms": round(quantiles[0.99] * 1000, 3),
+            "last_plan": self.last_plan,
+        }
+
+
+class QueryProfiler:
+    name = "db_query_latency_quantile_seconds"
+
+    def __init__(self, config: ProfilerConfig, pool: asyncpg.Pool) -> None:
+        self._config = config
+        self._pool = pool
+        self._stats: dict[tuple[str, str], StatementStats] = {}
+        self._lock = Lock()
+        self._explaining = False
+
+    def record(
+        self,
+        query: str,
+        args: tuple[Any, ...],
+        caller: str,
+        elapsed: float,
+        rows: int,
+        failed: bool,
+    ) -> None:
+        statement = normalize_statement(query)
+        key = (statement, caller)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = StatementStats(statement, caller, samples=deque(maxlen=self._config.sample_size))
+                self._stats[key] = stats
+            stats.count += 1
+            stats.errors += int(failed)
+            stats.rows += rows
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.samples.append(elapsed)
+        QUERY_SECONDS.observe(elapsed, caller=caller)
+        if rows:
+            QUERY_ROWS.inc(rows, caller=caller)
+        if elapsed * 1000 >= self._config.slow_query_ms:
+            SLOW_QUERIES.inc(caller=caller)
+            logger.warning(
+                f"Slow query {elapsed * 1000:.1f}ms in {caller}: {statement} params={redact_params(args)}"
+            )
+            if not failed and self._should_explain(query):
+                self._explaining = True
+                if spawn(self._explain(key, query, args), kind="explain_slow_query") is None:
+                    # The supervisor dropped it unstarted, so _explain will never clear the flag.
+                    self._explaining = False
+
+    def _should_explain(self, query: str) -> bool:
+        # EXPLAIN ANALYZE executes the statement, so only read-only ones are sampled.
+        if self._explaining or self._config.explain_sample_rate <= 0:
+            return False
+        if _WRITE_KEYWORDS.search(query):
+            return False
+        return random.random() < self._config.explain_sample_rate
+
+    async def _explain(self, key: tuple[str, str], query: str, args: tuple[Any, ...]) -> None:
+        try:
+            async with self._pool.acquire() as connection:
+                rows = await connection.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", *args)
+            plan = "\n".join(row[0] for row in rows)
+            with self._lock:
+                stats = self._stats.get(key)
+                if stats is not None:
+                    stats.last_plan = plan
+            logger.info(f"Plan for slow query in {key[1]}:\n{plan}")
+        except Exception as e:
+            logger.warning(f"Failed to explain slow query in {key[1]}: {e}")
+        finally:
+            self._explaining = False
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            items = [stats.to_dict() for stats in self._stats.values()]
+        return sorted(items, key=lambda item: item["total_ms"], reverse=True)
+
+    def dump(self, path: Optional[str] = None) -> Optional[Path]:
+        target = path or self._config.dump_path
+        if not target:
+            return None
+        payload = {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "statements": self.snapshot(),
+        }
+        destination = Path(target)
+        temporary = destination.with_suffix(destination.suffix + ".tmp")
+        temporary.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        temporary.replace(destination)
+        return destination
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} Query latency quantiles over the most recent samples by calling repository method.",
+            f"# TYPE {self.name} gauge",
+        ]
+        with self._lock:
+            per_caller: dict[str, list[float]] = {}
+            for stats in self._stats.values():
+                per_caller.setdefault(stats.caller, []).extend(stats.samples)
+        for caller, samples in sorted(per_caller.items()):
+            ordered = sorted(samples)
+            for quantile in _QUANTILES:
+                value = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+                lines.append(sample_line(self.name, {"caller": caller, "quantile": str(quantile)}, value))
+        return lines
+
+
+class ProfiledConnection:
+    def __init__(self, connection: asyncpg.Connection, profiler: QueryProfiler) -> None:
+        self._connection = connection
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> list[asyncpg.Record]:
+        return await self._run(self._connection.fetch, query, args, kwargs, len)
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Optional[asyncpg.Record]:
+        return await self._run(self._connection.fetchrow, query, args, kwargs, lambda row: int(row is not None))
+
+    async def fetchval(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        return await self._run(self._connection.fetchval, query, args, kwargs, lambda value: int(value is not None))
+
+    async def execute(self, query: str, *args: Any, **kwargs: Any) -> str:
+        return await self._run(self._connection.execute, query, args, kwargs, _status_rows)
+
+    async def executemany(self, command: str, args: Any, **kwargs: Any) -> None:
+        return await self._run(self._connection.executemany, command, (args,), kwargs, lambda _: 0)
+
+    async def _run(self, method, query: str, args: tuple[Any, ...], kwargs: dict[str, Any], count_rows) -> Any:
+        caller = _caller()
+        started = time.perf_counter()
+        try:
+            result = await method(query, *args, **kwargs)
+        except Exception:
+            self._profiler.record(query, args, caller, time.perf_counter() - started, 0, failed=True)
+            raise
+        self._profiler.record(query, args, caller, time.perf_counter() - started, count_rows(result), failed=False)
+        return result
+
+
+_profiler: Optional[QueryProfiler] = None
+
+
+def enable_profiler(config: ProfilerConfig, pool: asyncpg.Pool) -> Optional[QueryProfiler]:
+    global _profiler
+    if not config.enabled or _profiler is not None:
+        return _profiler
+    _profiler = QueryProfiler(config, pool)
+    register(_profiler)
+    logger.info(f"Query profiler enabled, slow threshold {config.slow_query_ms}ms")
+    return _profiler
+
+
+def get_profiler() -> Optional[QueryProfiler]:
+    return _profiler
+
+
+def profiled(connection: asyncpg.Connection) -> asyncpg.Connection:
+    if _profiler is None:
+        return connection
+    return ProfiledConnection(connection, _profiler)  # type: ignore[return-value]
+
+
+def normalize_statement(query: str) -> str:
+    statement = _WHITESPACE.sub(" ", query).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    return _NUMBER_LITERAL.sub("?", statement)
+
+
+def redact_params(args: tuple[Any, ...]) -> list[str]:
+    redacted = []
+    for value in args:
+        if value is None:
+            redacted.append("NULL")
+        elif isinstance(value, (str, bytes)):
+            redacted.append(f"<{type(value).__name__}:{len(value)}>")
+        elif isinstance(value, (list, tuple)):
+            redacted.append(f"<{type(value).__name__}:{len(value)}>")
+        else:
+            redacted.append(f"<{type(value).__name__}>")
+    return redacted
+
+
+def _status_rows(status: str) -> int:
+    last = status.rsplit(" ", 1)[-1] if status else ""
+    return int(last) if last.isdigit() else 0
+
+
+def _caller() -> str:
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename in _SKIP_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        return f"{type(owner).__name__}.{frame.f_code.co_name}"
+    return frame.f_code.co_name
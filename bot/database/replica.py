@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+import asyncpg
+
+from config import DatabaseConfig, ReplicaConfig
+from bot.database.unit_of_work import current_unit_of_work
+from bot.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# NULL while the replica has not replayed anything yet, which is treated as unusable.
+_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+_MAX_PINNED_USERS = 10_000
+
+_router: Optional["ReplicaRouter"] = None
+_primary_only: ContextVar[bool] = ContextVar("db_primary_only", default=False)
+
+REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag reported by the last check.",
+)
+REPLICA_AVAILABLE = Gauge(
+    "db_replica_available",
+    "Whether read-only queries are currently routed to the replica.",
+)
+READ_ROUTES = Counter(
+    "db_read_routes_total",
+    "Read-only repository calls by the pool that served them.",
+    ("target",),
+)
+
+
+# Failures that say the replica itself is unusable, as opposed to a bad or slow query.
+# TimeoutError is an OSError, so callers must let query timeouts through first.
+REPLICA_CONNECTION_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+
+class ReplicaRouter:
+    """Decides whether reads may use the replica, and owns its pool.
+
+    The pool is created on the first lag check that can reach the replica, so an
+    unreachable replica at startup only leaves reads on the primary until it is back.
+    """
+
+    def __init__(self, config: DatabaseConfig) -> None:
+        self.pool: Optional[asyncpg.Pool] = None
+        self._database = config
+        self._config: ReplicaConfig = config.replica
+        self._acquire_timeout = config.acquire_timeout
+        self._check_timeout = config.timeouts.interactive
+        self._available = False
+        self._pinned_users: dict[int, float] = {}
+
+    @property
+    def available(self) -> bool:
+        return self._available
+
+    @property
+    def acquire_timeout(self) -> float:
+        return self._acquire_timeout
+
+    @property
+    def pin_seconds(self) -> float:
+        # Lag is only sampled every interval, so it may have grown by up to that much since.
+        return self._config.max_lag_seconds + self._config.lag_check_interval_seconds
+
+    def pin_user(self, user_id: int) -> None:
+        self._pinned_users[user_id] = time.monotonic() + self.pin_seconds
+        if len(self._pinned_users) > _MAX_PINNED_USERS:
+            self._prune_pins()
+
+    def is_pinned(self, user_id: int) -> bool:
+        deadline = self._pinned_users.get(user_id)
+        if deadline is None:
+            return False
+        if deadline <= time.monotonic():
+            self._pinned_users.pop(user_id, None)
+            return False
+        return True
+
+    async def check_lag(self) -> None:
+        try:
+            pool = await self._ensure_pool()
+            async with pool.acquire(timeout=self._acquire_timeout) as connection:
+                lag = await connection.fetchval(_LAG_QUERY, timeout=self._check_timeout)
+        except Exception as e:
+            self._set_available(False, f"lag check failed: {e}")
+            return
+        if lag is None:
+            self._set_available(False, "replica has not replayed any transactions yet")
+            return
+        lag = float(lag)
+        REPLICA_LAG.set(lag)
+        if lag > self._config.max_lag_seconds:
+            self._set_available(False, f"lag {lag:.1f}s exceeds {self._config.max_lag_seconds}s")
+        else:
+            self._set_available(True, f"lag {lag:.1f}s")
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self._config.lag_check_interval_seconds)
+            await self.check_lag()
+            self._prune_pins()
+
+    def mark_unavailable(self, error: BaseException) -> None:
+        # The next lag check turns it back on once the replica answers again.
+        self._set_available(False, f"query failed: {type(error).__name__}: {error}")
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            await pool.close()
+
+    async def _ensure_pool(self) -> asyncpg.Pool:
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                self._config.dsn,
+                min_size=self._config.min_size,
+                max_size=self._config.max_size,
+                command_timeout=self._database.timeouts.interactive,
+                statement_cache_size=self._database.statement_cache_size,
+                max_inactive_connection_lifetime=self._database.max_inactive_connection_lifetime,
+                timeout=self._acquire_timeout,
+                server_settings={
+                    "application_name": "povod_bot_replica",
+                    "default_transaction_read_only": "on",
+                },
+            )
+        return self.pool
+
+    def _set_available(self, available: bool, reason: str) -> None:
+        if available != self._available:
+            log = logger.info if available else logger.warning
+            log(f"Read replica {'enabled' if available else 'disabled'}: {reason}")
+        self._available = available
+        REPLICA_AVAILABLE.set(int(available))
+
+    def _prune_pins(self) -> None:
+        now = time.monotonic()
+        for user_id, deadline in list(self._pinned_users.items()):
+            if deadline <= now:
+                del self._pinned_users[user_id]
+
+
+async def init_replica(config: DatabaseConfig) -> Optional[ReplicaRouter]:
+    global _router
+    if config.replica is None or _router is not None:
+        return _router
+    _router = ReplicaRouter(config)
+    await _router.check_lag()
+    if not _router.available:
+        logger.warning("Read replica is not usable yet, reads go to the primary until a lag check passes")
+    return _router
+
+
+async def close_replica() -> None:
+    global _router
+    if _router is not None:
+        router, _router = _router, None
+        await router.close()
+
+
+def get_replica_router() -> Optional[ReplicaRouter]:
+    return _router
+
+
+def replica_pool_for(user_id: Optional[int] = None) -> Optional[asyncpg.Pool]:
+    """Pool a read-only query may use, or None when it must go to the primary."""
+    if _router is None:
+        return None
+    uow = current_unit_of_work()
+    if (
+        not _router.available
+        or _primary_only.get()
+        or (uow is not None and (uow.primary_pinned or uow.in_transaction))
+        or (user_id is not None and _router.is_pinned(user_id))
+    ):
+        READ_ROUTES.inc(target="primary")
+        return None
+    if _router.pool is None:
+        READ_ROUTES.inc(target="primary")
+        return None
+    READ_ROUTES.inc(target="replica")
+    return _router.pool
+
+
+def mark_replica_unavailable(error: BaseException) -> None:
+    if _router is not None:
+        _router.mark_unavailable(error)
+
+
+def pin_user_to_primary(user_id: int) -> None:
+    """Send this user's reads, and the rest of the current update's, to the primary for a while."""
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.primary_pinned = True
+    if _router is not None:
+        _router.pin_user(user_id)
+
+
+@contextmanager
+def primary_only() -> Iterator[None]:
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
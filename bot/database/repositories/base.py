@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import asyncpg
+
+from bot.database.pool import query_timeout, record_query_timeout
+from bot.database.profiler import profiled
+from bot.database.replica import (
+    REPLICA_CONNECTION_ERRORS,
+    get_replica_router,
+    mark_replica_unavailable,
+    replica_pool_for,
+)
+from bot.database.unit_of_work import acquire_connection
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Repository:
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self._pool = pool
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[asyncpg.Connection]:
+        async with acquire_connection(self._pool) as connection:
+            yield profiled(connection)
+
+    async def _read(self, operation: Callable[[asyncpg.Connection], Awaitable[T]], user_id: Optional[int] = None) -> T:
+        # Read-only queries go to the replica while it keeps up; user_id names the user
+        # whose recent writes the result must reflect. If the replica fails underneath
+        # a query, it is switched off and the query runs again on the primary.
+        pool = replica_pool_for(user_id)
+        if pool is not None:
+            try:
+                connection = await pool.acquire(timeout=get_replica_router().acquire_timeout)
+            except (asyncio.TimeoutError, *REPLICA_CONNECTION_ERRORS) as e:
+                _replica_failed(e)
+            else:
+                try:
+                    return await operation(profiled(connection))
+                except asyncio.TimeoutError:
+                    raise
+                except REPLICA_CONNECTION_ERRORS as e:
+                    _replica_failed(e)
+                finally:
+                    await pool.release(connection)
+        async with self._connection() as connection:
+            return await operation(connection)
+
+    async def _read_fetch(self, query: str, *args: Any, user_id: Optional[int] = None) -> list[asyncpg.Record]:
+        return await self._read(
+            lambda connection: self._timed(connection.fetch(query, *args, timeout=query_timeout()), None), user_id
+        )
+
+    async def _read_fetchrow(self, query: str, *args: Any, user_id: Optional[int] = None) -> asyncpg.Record | None:
+        return await self._read(
+            lambda connection: self._timed(connection.fetchrow(query, *args, timeout=query_timeout()), None), user_id
+        )
+
+    async def _read_fetchval(self, query: str, *args: Any, user_id: Optional[int] = None) -> Any:
+        return await self._read(
+            lambda connection: self._timed(connection.fetchval(query, *args, timeout=query_timeout()), None), user_id
+        )
+
+    async def _fetch(self, query: str, *args: Any, query_class: Optional[str] = None) -> list[asyncpg.Record]:
+        async with self._connection() as connection:
+            return await self._timed(connection.fetch(query, *args, timeout=query_timeout(query_class)), query_class)
+
+    async def _fetchrow(self, query: str, *args: Any, query_class: Optional[str] = None) -> asyncpg.Record | None:
+        async with self._connection() as connection:
+            return await self._timed(connection.fetchrow(query, *args, timeout=query_timeout(query_class)), query_class)
+
+    async def _fetchval(self, query: str, *args: Any, query_class: Optional[str] = None) -> Any:
+        async with self._connection() as connection:
+            return await self._timed(connection.fetchval(query, *args, timeout=query_timeout(query_class)), query_class)
+
+    async def _execute(self, query: str, *args: Any, query_class: Optional[str] = None) -> str:
+        async with self._connection() as connection:
+            return await self._timed(connection.execute(query, *args, timeout=query_timeout(query_class)), query_class)
+
+    @staticmethod
+    async def _timed(operation, query_class: Optional[str]) -> Any:
+        try:
+            return await operation
+        except asyncio.TimeoutError:
+            record_query_timeout(query_class)
+            raise
+
+
+def _replica_failed(error: BaseException) -> None:
+    logger.warning(f"Replica read failed, retrying on the primary: {error!r}")
+    mark_replica_unavailable(error)
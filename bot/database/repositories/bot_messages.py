@@ -0,0 +1,48 @@
+from typing import Sequence
+
+from bot.database.repositories.base import Repository
+
+
+class BotMessageRepository(Repository):
+    async def add_many(self, chat_id: int, message_ids: Sequence[int]) -> None:
+        query = """
+        INSERT INTO bot_messages (chat_id, message_id)
+        SELECT $1, unnest($2::bigint[])
+        ON CONFLICT DO NOTHING
+        """
+        await self._execute(query, chat_id, list(message_ids))
+
+    async def take(
+        self,
+        chat_id: int,
+        up_to_message_id: int,
+        limit: int,
+        exclude: Sequence[int],
+        max_age_seconds: float,
+    ) -> list[int]:
+        # Taking is a delete, so two instances cleaning the same chat never get the same ids.
+        query = """
+        DELETE FROM bot_messages
+        WHERE chat_id = $1 AND message_id IN (
+            SELECT message_id FROM bot_messages
+            WHERE chat_id = $1 AND message_id <= $2 AND message_id <> ALL($4::bigint[])
+              AND sent_at > NOW() - make_interval(secs => $5)
+            ORDER BY message_id DESC
+            LIMIT $3
+        )
+        RETURNING message_id
+        """
+        records = await self._fetch(query, chat_id, up_to_message_id, limit, list(exclude), max_age_seconds)
+        return [record["message_id"] for record in records]
+
+    async def delete_older_than(self, max_age_seconds: float, batch_size: int) -> int:
+        query = """
+        DELETE FROM bot_messages
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM bot_messages
+            WHERE sent_at < NOW() - make_interval(secs => $1)
+            LIMIT $2
+        ))
+        """
+        result = await self._execute(query, max_age_seconds, batch_size)
+        return int(result.rsplit(" ", 1)[-1])
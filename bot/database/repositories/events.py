@@ -1,15 +1,16 @@
-from dataclasses import dataclass
 from datetime import date, datetime, time
-from typing import Optional, Sequence, Tuple
+from typing import Any, NamedTuple, Optional, Sequence, Tuple
 import logging
 
 import asyncpg
 
+from bot.database.pool import query_timeout
+from bot.database.repositories.base import Repository
+
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class Event:
+class Event(NamedTuple):
     id: int
     title: str
     date: date
@@ -20,52 +21,49 @@ class Event:
     description: Optional[str]
     cost: Optional[float]
     image_file_id: Optional[str]
-    image_file_ids: Tuple[str, ...]
     max_participants: Optional[int]
     reminder_3days: bool
     reminder_1day: bool
     reminder_3days_sent_at: Optional[datetime]
     reminder_1day_sent_at: Optional[datetime]
     status: str
+    image_file_ids: Tuple[str, ...] = ()
+
 
+# Same order as the Event fields: rows are mapped positionally.
+EVENT_COLUMNS = """
+    id, title, date, time, end_date, end_time, place, description, cost::float8 AS cost, image_file_id,
+    max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+"""
 
-class EventRepository:
-    def __init__(self, pool: asyncpg.Pool) -> None:
-        self._pool = pool
 
+class EventRepository(Repository):
     async def list_active(self, limit: int | None = None) -> Sequence[Event]:
         if limit is not None:
-            query = """
-            SELECT id, title, date, time, end_date, end_time, place, description, cost, image_file_id,
-                   max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+            query = f"""
+            SELECT {EVENT_COLUMNS}
             FROM events
             WHERE status = 'active'
             ORDER BY date ASC, time ASC
             LIMIT $1
             """
-            async with self._pool.acquire() as connection:
-                records = await connection.fetch(query, limit)
-                events = [self._to_event(record) for record in records]
-                await self._populate_images(connection, events)
-                return events
+            return await self._read(lambda connection: self._fetch_events(connection, query, limit))
         else:
-            query = """
-            SELECT id, title, date, time, end_date, end_time, place, description, cost, image_file_id,
-                   max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+            query = f"""
+            SELECT {EVENT_COLUMNS}
             FROM events
             WHERE status = 'active'
             ORDER BY date ASC, time ASC
             """
-            async with self._pool.acquire() as connection:
-                records = await connection.fetch(query)
-                events = [self._to_event(record) for record in records]
-                await self._populate_images(connection, events)
-                return events
+            return await self._read(lambda connection: self._fetch_events(connection, query))
+
+    async def _fetch_events(self, connection: asyncpg.Connection, query: str, *args: Any) -> list[Event]:
+        records = await self._timed(connection.fetch(query, *args, timeout=query_timeout()), None)
+        return await self._with_images(connection, [self._to_event(record) for record in records])
 
     async def list_reminder_candidates(self) -> Sequence[Event]:
-        query = """
-        SELECT id, title, date, time, end_date, end_time, place, description, cost, image_file_id,
-               max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+        query = f"""
+        SELECT {EVENT_COLUMNS}
         FROM events
         WHERE status = 'active'
           AND (
@@ -73,35 +71,33 @@ class EventRepository:
             OR (reminder_1day = TRUE AND reminder_1day_sent_at IS NULL)
           )
         """
-        async with self._pool.acquire() as connection:
-            records = await connection.fetch(query)
-            events = [self._to_event(record) for record in records]
-            await self._populate_images(connection, events)
-            return events
+        async with self._connection() as connection:
+            records = await self._timed(connection.fetch(query, timeout=query_timeout()), None)
+            return await self._with_images(connection, [self._to_event(record) for record in records])
 
     async def get(self, event_id: int) -> Optional[Event]:
-        query = """
-        SELECT id, title, date, time, end_date, end_time, place, description, cost, image_file_id,
-               max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+        async with self._connection() as connection:
+            return await self._get(connection, event_id)
+
+    async def _get(self, connection: asyncpg.Connection, event_id: int) -> Optional[Event]:
+        query = f"""
+        SELECT {EVENT_COLUMNS}
         FROM events
         WHERE id = $1
         """
-        async with self._pool.acquire() as connection:
-            record = await connection.fetchrow(query, event_id)
-            if record is None:
-                return None
-            event = self._to_event(record)
-            await self._populate_images(connection, [event])
-            return event
+        record = await self._timed(connection.fetchrow(query, event_id, timeout=query_timeout()), None)
+        if record is None:
+            return None
+        [event] = await self._with_images(connection, [self._to_event(record)])
+        return event
 
     async def create(self, data: dict) -> Event:
-        query = """
+        query = f"""
         INSERT INTO events (title, date, time, end_date, end_time, place, description, cost, image_file_id,
                             max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at,
                             reminder_1day_sent_at, status)
         VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15)
-        RETURNING id, title, date, time, end_date, end_time, place, description, cost, image_file_id,
-                  max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+        RETURNING {EVENT_COLUMNS}
         """
         raw_images = data.get("image_file_ids")
         images: Tuple[str, ...] = tuple(raw_images) if raw_images else ()
@@ -110,29 +106,33 @@ class EventRepository:
             if fallback:
                 images = (fallback,)
         image_for_column = images[0] if images else None
-        async with self._pool.acquire() as connection:
+        async with self._connection() as connection:
             async with connection.transaction():
-                record = await connection.fetchrow(
-                    query,
-                    data["title"],
-                    data["date"],
-                    data["time"],
-                    data.get("end_date"),
-                    data.get("end_time"),
-                    data.get("place"),
-                    data.get("description"),
-                    data.get("cost"),
-                    image_for_column,
-                    data.get("max_participants"),
-                    data.get("reminder_3days", False),
-                    data.get("reminder_1day", False),
-                    data.get("reminder_3days_sent_at"),
-                    data.get("reminder_1day_sent_at"),
-                    data.get("status", "active"),
+                record = await self._timed(
+                    connection.fetchrow(
+                        query,
+                        data["title"],
+                        data["date"],
+                        data["time"],
+                        data.get("end_date"),
+                        data.get("end_time"),
+                        data.get("place"),
+                        data.get("description"),
+                        data.get("cost"),
+                        image_for_column,
+                        data.get("max_participants"),
+                        data.get("reminder_3days", False),
+                        data.get("reminder_1day", False),
+                        data.get("reminder_3days_sent_at"),
+                        data.get("reminder_1day_sent_at"),
+                        data.get("status", "active"),
+                        timeout=query_timeout(),
+                    ),
+                    None,
                 )
                 event = self._to_event(record)
                 await self._replace_images(connection, event.id, images)
-                await self._populate_images(connection, [event])
+                [event] = await self._with_images(connection, [event])
                 return event
 
     async def update(self, event_id: int, data: dict) -> Optional[Event]:
@@ -147,14 +147,14 @@ class EventRepository:
             fields.append(f"{key} = ${idx}")
             values.append(value)
         if not fields:
-            async with self._pool.acquire() as connection:
-                event = await self.get(event_id)
+            async with self._connection() as connection:
+                event = await self._get(connection, event_id)
                 if event is None:
                     return None
                 if images is not None:
                     async with connection.transaction():
                         await self._replace_images(connection, event.id, images)
-                        await self._populate_images(connection, [event])
+                        [event] = await self._with_images(connection, [event])
                 return event
         values.append(event_id)
         placeholders = ", ".join(fields)
@@ -162,66 +162,48 @@ class EventRepository:
         UPDATE events
         SET {placeholders}
         WHERE id = ${len(values)}
-        RETURNING id, title, date, time, end_date, end_time, place, description, cost, image_file_id,
-                  max_participants, reminder_3days, reminder_1day, reminder_3days_sent_at, reminder_1day_sent_at, status
+        RETURNING {EVENT_COLUMNS}
         """
-        async with self._pool.acquire() as connection:
+        async with self._connection() as connection:
             async with connection.transaction():
-                record = await connection.fetchrow(query, *values)
+                record = await self._timed(connection.fetchrow(query, *values, timeout=query_timeout()), None)
                 if record is None:
                     return None
                 event = self._to_event(record)
                 if images is not None:
                     await self._replace_images(connection, event.id, images)
-                await self._populate_images(connection, [event])
+                [event] = await self._with_images(connection, [event])
                 return event
 
     def _to_event(self, record: asyncpg.Record) -> Event:
-        return Event(
-            id=record["id"],
-            title=record["title"],
-            date=record["date"],
-            time=record["time"],
-            end_date=record["end_date"],
-            end_time=record["end_time"],
-            place=record["place"],
-            description=record["description"],
-            cost=float(record["cost"]) if record["cost"] is not None else None,
-            image_file_id=record["image_file_id"],
-            image_file_ids=(),
-            max_participants=record["max_participants"],
-            reminder_3days=record["reminder_3days"],
-            reminder_1day=record["reminder_1day"],
-            reminder_3days_sent_at=record["reminder_3days_sent_at"],
-            reminder_1day_sent_at=record["reminder_1day_sent_at"],
-            status=record["status"],
-        )
-
-    async def _populate_images(self, connection: asyncpg.Connection, events: Sequence[Event]) -> None:
+        return Event(*record)
+
+    async def _with_images(self, connection: asyncpg.Connection, events: list[Event]) -> list[Event]:
         ids = [event.id for event in events]
         if not ids:
-            return
+            return events
         query = """
         SELECT event_id, file_id
         FROM event_images
         WHERE event_id = ANY($1::int[])
         ORDER BY event_id ASC, position ASC, id ASC
         """
-        records = await connection.fetch(query, ids)
+        records = await self._timed(connection.fetch(query, ids, timeout=query_timeout()), None)
         grouped: dict[int, list[str]] = {event_id: [] for event_id in ids}
         for record in records:
             grouped.setdefault(record["event_id"], []).append(record["file_id"])
+        result = []
         for event in events:
             images = grouped.get(event.id, [])
             if not images and event.image_file_id:
                 images = [event.image_file_id]
-            logger.info(f"[_populate_images] Event id={event.id}, loaded {len(images)} images")
-            event.image_file_ids = tuple(images)
-            event.image_file_id = images[0] if images else None
+            logger.info(f"[_with_images] Event id={event.id}, loaded {len(images)} images")
+            result.append(event._replace(image_file_ids=tuple(images), image_file_id=images[0] if images else None))
+        return result
 
     async def _replace_images(self, connection: asyncpg.Connection, event_id: int, images: Sequence[str]) -> None:
         logger.info(f"[_replace_images] Replacing images for event_id={event_id}, count={len(images)}")
-        await connection.execute("DELETE FROM event_images WHERE event_id = $1", event_id)
+        await self._timed(connection.execute("DELETE FROM event_images WHERE event_id = $1", event_id, timeout=query_timeout()), None)
         if not images:
             return
         insert_query = """
@@ -230,7 +212,7 @@ class EventRepository:
         """
         records = [(event_id, file_id, idx) for idx, file_id in enumerate(images)]
         try:
-            await connection.executemany(insert_query, records)
+            await self._timed(connection.executemany(insert_query, records, timeout=query_timeout()), None)
             logger.info(f"[_replace_images] Successfully inserted {len(records)} images for event_id={event_id}")
         except Exception as e:
             logger.error(f"[_replace_images] ERROR inserting images for event_id={event_id}: {e}", exc_info=True)
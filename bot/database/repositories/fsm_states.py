@@ -0,0 +1,60 @@
+from typing import NamedTuple, Optional, Sequence
+
+from bot.database.pool import query_timeout
+from bot.database.repositories.base import Repository
+
+# (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+FSMKey = tuple[int, int, int, int, str, str]
+
+_KEY_FILTER = """
+bot_id = $1 AND chat_id = $2 AND user_id = $3 AND thread_id = $4
+AND business_connection_id = $5 AND destiny = $6
+"""
+
+
+class StoredState(NamedTuple):
+    state: Optional[str]
+    data: str
+    age_seconds: float
+
+
+class FSMStateRepository(Repository):
+    async def get(self, key: FSMKey, ttl_seconds: float) -> Optional[StoredState]:
+        query = f"""
+        SELECT state, data::text AS data, EXTRACT(EPOCH FROM NOW() - updated_at)::float8 AS age_seconds
+        FROM fsm_states
+        WHERE {_KEY_FILTER}
+          AND updated_at > NOW() - make_interval(secs => $7)
+        """
+        record = await self._fetchrow(query, *key, ttl_seconds)
+        if record is None:
+            return None
+        return StoredState(*record)
+
+    async def save_many(self, rows: Sequence[tuple[FSMKey, Optional[str], str]]) -> None:
+        query = """
+        INSERT INTO fsm_states (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny, state, data, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8::jsonb, NOW())
+        ON CONFLICT (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny) DO UPDATE
+        SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+        """
+        args = [(*key, state, data) for key, state, data in rows]
+        async with self._connection() as connection:
+            await self._timed(connection.executemany(query, args, timeout=query_timeout()), None)
+
+    async def delete_many(self, keys: Sequence[FSMKey]) -> None:
+        query = f"DELETE FROM fsm_states WHERE {_KEY_FILTER}"
+        async with self._connection() as connection:
+            await self._timed(connection.executemany(query, list(keys), timeout=query_timeout()), None)
+
+    async def delete_expired(self, ttl_seconds: float, batch_size: int) -> int:
+        query = """
+        DELETE FROM fsm_states
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM fsm_states
+            WHERE updated_at < NOW() - make_interval(secs => $1)
+            LIMIT $2
+        ))
+        """
+        result = await self._execute(query, ttl_seconds, batch_size)
+        return int(result.rsplit(" ", 1)[-1])
@@ -1,12 +1,13 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import NamedTuple, Optional, Sequence
 
 import asyncpg
 
+from bot.database.repositories.base import Repository
 
-@dataclass(frozen=True)
-class Payment:
+
+class Payment(NamedTuple):
     id: int
     payment_id: str
     event_id: int
@@ -17,12 +18,26 @@ class Payment:
     paid_at: Optional[datetime]
     confirmation_url: Optional[str]
     payment_message_id: Optional[int]
+    refund_id: Optional[str] = None
+
 
+# Same order as the Payment fields: rows are mapped positionally.
+PAYMENT_COLUMNS = """
+    id, payment_id, event_id, user_id, amount::float8 AS amount, status, created_at, paid_at, confirmation_url,
+    payment_message_id, refund_id
+"""
 
-class PaymentRepository:
-    def __init__(self, pool: asyncpg.Pool) -> None:
-        self._pool = pool
 
+@dataclass(frozen=True, slots=True)
+class UnsettledPayment:
+    id: int
+    payment_id: str
+    status: str
+    refund_id: Optional[str]
+    created_at: datetime
+
+
+class PaymentRepository(Repository):
     async def create(
         self,
         payment_id: str,
@@ -32,39 +47,54 @@ class PaymentRepository:
         confirmation_url: Optional[str] = None,
         payment_message_id: Optional[int] = None,
     ) -> Payment:
-        query = """
+        query = f"""
         INSERT INTO payments (payment_id, event_id, user_id, amount, confirmation_url, payment_message_id)
         VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING id, payment_id, event_id, user_id, amount, status, created_at, paid_at, confirmation_url, payment_message_id
+        RETURNING {PAYMENT_COLUMNS}
         """
-        record = await self._pool.fetchrow(
+        record = await self._fetchrow(
             query, payment_id, event_id, user_id, amount, confirmation_url, payment_message_id
         )
         return self._to_payment(record)
 
     async def get_by_payment_id(self, payment_id: str) -> Optional[Payment]:
-        query = """
-        SELECT id, payment_id, event_id, user_id, amount, status, created_at, paid_at, confirmation_url, payment_message_id
+        query = f"""
+        SELECT {PAYMENT_COLUMNS}
         FROM payments
         WHERE payment_id = $1
         """
-        record = await self._pool.fetchrow(query, payment_id)
+        record = await self._fetchrow(query, payment_id)
         if record is None:
             return None
         return self._to_payment(record)
 
-    async def update_status(
+    async def transition_status(
         self,
         payment_id: str,
         status: str,
+        from_statuses: Sequence[str],
         paid_at: Optional[datetime] = None,
-    ) -> None:
+    ) -> Optional[Payment]:
+        # Conditional update: only one of several concurrent deliveries of the same
+        # notification wins the transition, the rest see None and skip side effects.
+        query = f"""
+        UPDATE payments
+        SET status = $2, paid_at = COALESCE($4, paid_at)
+        WHERE payment_id = $1 AND status = ANY($3::varchar[])
+        RETURNING {PAYMENT_COLUMNS}
+        """
+        record = await self._fetchrow(query, payment_id, status, list(from_statuses), paid_at)
+        if record is None:
+            return None
+        return self._to_payment(record)
+
+    async def update_refund_id(self, payment_id: str, refund_id: str) -> None:
         query = """
         UPDATE payments
-        SET status = $2, paid_at = $3
+        SET refund_id = $2
         WHERE payment_id = $1
         """
-        await self._pool.execute(query, payment_id, status, paid_at)
+        await self._execute(query, payment_id, refund_id)
 
     async def update_message_id(
         self,
@@ -76,7 +106,7 @@ class PaymentRepository:
         SET payment_message_id = $2
         WHERE payment_id = $1
         """
-        await self._pool.execute(query, payment_id, message_id)
+        await self._execute(query, payment_id, message_id)
 
     async def has_successful_payment(self, event_id: int, user_id: int) -> bool:
         query = """
@@ -85,33 +115,42 @@ class PaymentRepository:
             WHERE event_id = $1 AND user_id = $2 AND status = 'succeeded'
         )
         """
-        result = await self._pool.fetchval(query, event_id, user_id)
+        result = await self._fetchval(query, event_id, user_id)
         return bool(result)
 
     async def get_successful_payment(self, event_id: int, user_id: int) -> Optional[Payment]:
-        query = """
-        SELECT id, payment_id, event_id, user_id, amount, status, created_at, paid_at, confirmation_url, payment_message_id
+        query = f"""
+        SELECT {PAYMENT_COLUMNS}
         FROM payments
         WHERE event_id = $1 AND user_id = $2 AND status = 'succeeded'
         ORDER BY paid_at DESC
         LIMIT 1
         """
-        record = await self._pool.fetchrow(query, event_id, user_id)
+        record = await self._fetchrow(query, event_id, user_id)
         if record is None:
             return None
         return self._to_payment(record)
 
-    def _to_payment(self, record: asyncpg.Record) -> Payment:
-        return Payment(
-            id=record["id"],
-            payment_id=record["payment_id"],
-            event_id=record["event_id"],
-            user_id=record["user_id"],
-            amount=float(record["amount"]),
-            status=record["status"],
-            created_at=record["created_at"],
-            paid_at=record["paid_at"],
-            confirmation_url=record["confirmation_url"],
-            payment_message_id=record.get("payment_message_id"),
-        )
+    async def list_unsettled(
+        self,
+        after_id: int,
+        stale_after_minutes: int,
+        max_age_hours: int,
+        limit: int,
+    ) -> list[UnsettledPayment]:
+        # The status list must stay literal so the planner can use idx_payments_unsettled.
+        query = """
+        SELECT id, payment_id, status, refund_id, created_at::timestamptz AS created_at
+        FROM payments
+        WHERE status IN ('pending', 'waiting_for_capture', 'refund_pending')
+          AND id > $1
+          AND created_at < NOW() - make_interval(mins => $2)
+          AND created_at > NOW() - make_interval(hours => $3)
+        ORDER BY id ASC
+        LIMIT $4
+        """
+        records = await self._fetch(query, after_id, stale_after_minutes, max_age_hours, limit)
+        return [UnsettledPayment(*record) for record in records]
 
+    def _to_payment(self, record: asyncpg.Record) -> Payment:
+        return Payment(*record)
@@ -1,12 +1,19 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Literal, NamedTuple, Optional
 
 import asyncpg
 
+from bot.database.pool import QUERY_CLASS_BULK, query_timeout
+from bot.database.replica import pin_user_to_primary
+from bot.database.repositories.base import Repository
 
-@dataclass(frozen=True)
-class Promocode:
+RedemptionOutcome = Literal[
+    "applied", "not_found", "expired", "already_used", "exhausted", "event_not_found", "event_started"
+]
+
+
+class Promocode(NamedTuple):
     id: int
     event_id: int
     code: str
@@ -15,48 +22,120 @@ class Promocode:
     is_active: bool
     used_by_user_id: Optional[int]
     used_at: Optional[datetime]
+    max_uses: Optional[int] = None
+    uses_count: int = 0
+
 
+# Same order as the Promocode fields: rows are mapped positionally.
+PROMOCODE_COLUMNS = """
+    id, event_id, code, discount_amount::float8 AS discount_amount, expires_at, is_active, used_by_user_id, used_at,
+    max_uses, uses_count
+"""
 
-class PromocodeRepository:
-    def __init__(self, pool: asyncpg.Pool) -> None:
-        self._pool = pool
 
+@dataclass(frozen=True, slots=True)
+class PromocodeRedemption:
+    outcome: RedemptionOutcome
+    discount: Optional[float]
+
+
+class PromocodeRepository(Repository):
     async def get_by_code(self, event_id: int, code: str) -> Optional[Promocode]:
-        query = """
-        SELECT id, event_id, code, discount_amount, expires_at, is_active, used_by_user_id, used_at
+        query = f"""
+        SELECT {PROMOCODE_COLUMNS}
         FROM promocodes
         WHERE event_id = $1 AND code = $2
         """
-        record = await self._pool.fetchrow(query, event_id, code)
+        record = await self._fetchrow(query, event_id, code)
         if record is None:
             return None
         return self._to_promocode(record)
 
-    async def mark_used(self, promocode_id: int, user_id: int, used_at: datetime) -> None:
+    async def redeem(self, event_id: int, code: str, user_id: int) -> PromocodeRedemption:
+        # Validation, the usage counter, the usage row and the cached per-user discount
+        # all change in one statement. The conditional UPDATE on uses_count is the only
+        # contended write; a concurrent duplicate by the same user trips the unique
+        # usage constraint and rolls the whole statement back, counter included.
+        # expires_at and used_at are stored as naive UTC; event date/time are Moscow local.
         query = """
-        INSERT INTO promocode_usages (promocode_id, user_id, used_at)
-        VALUES ($1, $2, $3)
-        ON CONFLICT (promocode_id, user_id) DO NOTHING
-        """
-        await self._pool.execute(query, promocode_id, user_id, used_at)
-
-    async def is_used_by_user(self, promocode_id: int, user_id: int) -> bool:
-        query = """
-        SELECT EXISTS(
-            SELECT 1 FROM promocode_usages
-            WHERE promocode_id = $1 AND user_id = $2
+        WITH event AS (
+            SELECT ((e.date + COALESCE(e.time, TIME '00:00')) AT TIME ZONE 'Europe/Moscow') <= NOW() AS started
+            FROM events e
+            WHERE e.id = $1
+        ),
+        promo AS (
+            SELECT
+                p.id,
+                p.discount_amount,
+                p.is_active,
+                p.expires_at IS NOT NULL AND p.expires_at <= (NOW() AT TIME ZONE 'UTC') AS code_expired,
+                event.started AS event_started,
+                EXISTS (
+                    SELECT 1 FROM promocode_usages pu
+                    WHERE pu.promocode_id = p.id AND pu.user_id = $3
+                ) AS already_used
+            FROM promocodes p, event
+            WHERE p.event_id = $1 AND p.code = $2
+        ),
+        claimed AS (
+            UPDATE promocodes p
+            SET uses_count = p.uses_count + 1
+            FROM promo
+            WHERE p.id = promo.id
+              AND promo.is_active AND NOT promo.code_expired AND NOT promo.event_started AND NOT promo.already_used
+              AND (p.max_uses IS NULL OR p.uses_count < p.max_uses)
+            RETURNING p.id, p.discount_amount
+        ),
+        usage AS (
+            INSERT INTO promocode_usages (promocode_id, user_id, used_at)
+            SELECT id, $3, NOW() AT TIME ZONE 'UTC'
+            FROM claimed
+        ),
+        discount AS (
+            INSERT INTO promocode_discounts (event_id, user_id, promocode_id, discount_amount)
+            SELECT $1, $3, id, discount_amount
+            FROM claimed
+            ON CONFLICT (event_id, user_id) DO UPDATE
+            SET promocode_id = EXCLUDED.promocode_id,
+                discount_amount = EXCLUDED.discount_amount,
+                applied_at = EXCLUDED.applied_at
+            WHERE EXCLUDED.discount_amount > promocode_discounts.discount_amount
         )
+        SELECT
+            CASE
+                WHEN event.started IS NULL THEN 'event_not_found'
+                WHEN event.started THEN 'event_started'
+                WHEN promo.id IS NULL OR NOT promo.is_active THEN 'not_found'
+                WHEN claimed.id IS NOT NULL THEN 'applied'
+                WHEN promo.code_expired THEN 'expired'
+                WHEN promo.already_used THEN 'already_used'
+                ELSE 'exhausted'
+            END AS outcome,
+            promo.discount_amount
+        FROM (SELECT 1) AS single
+        LEFT JOIN event ON TRUE
+        LEFT JOIN promo ON TRUE
+        LEFT JOIN claimed ON TRUE
         """
-        return await self._pool.fetchval(query, promocode_id, user_id)
+        try:
+            record = await self._fetchrow(query, event_id, code, user_id)
+        except asyncpg.UniqueViolationError:
+            return PromocodeRedemption(outcome="already_used", discount=None)
+        if record["outcome"] == "applied":
+            pin_user_to_primary(user_id)
+        discount = record["discount_amount"]
+        return PromocodeRedemption(
+            outcome=record["outcome"],
+            discount=float(discount) if discount is not None else None,
+        )
 
     async def get_user_discount(self, event_id: int, user_id: int) -> float:
         query = """
-        SELECT COALESCE(MAX(p.discount_amount), 0)
-        FROM promocodes p
-        INNER JOIN promocode_usages pu ON p.id = pu.promocode_id
-        WHERE p.event_id = $1 AND pu.user_id = $2
+        SELECT discount_amount
+        FROM promocode_discounts
+        WHERE event_id = $1 AND user_id = $2
         """
-        value = await self._pool.fetchval(query, event_id, user_id)
+        value = await self._read_fetchval(query, event_id, user_id, user_id=user_id)
         return float(value or 0)
 
     async def create(
@@ -65,43 +144,80 @@ class PromocodeRepository:
         code: str,
         discount_amount: float,
         expires_at: Optional[datetime],
+        max_uses: Optional[int] = None,
     ) -> Promocode:
-        query = """
-        INSERT INTO promocodes (event_id, code, discount_amount, expires_at)
-        VALUES ($1, $2, $3, $4)
-        RETURNING id, event_id, code, discount_amount, expires_at, is_active, used_by_user_id, used_at
+        query = f"""
+        INSERT INTO promocodes (event_id, code, discount_amount, expires_at, max_uses)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING {PROMOCODE_COLUMNS}
         """
-        record = await self._pool.fetchrow(query, event_id, code, discount_amount, expires_at)
+        record = await self._fetchrow(query, event_id, code, discount_amount, expires_at, max_uses)
         return self._to_promocode(record)
 
+    async def bulk_create(
+        self,
+        event_id: int,
+        codes: Iterable[str],
+        discount_amount: float,
+        max_uses: Optional[int] = None,
+    ) -> list[str]:
+        # Codes are streamed through COPY into a transaction-local staging table, and a
+        # single INSERT ... SELECT lets the unique (event_id, code) constraint drop
+        # duplicates, both against existing codes and within the batch.
+        insert_query = """
+        INSERT INTO promocodes (event_id, code, discount_amount, max_uses)
+        SELECT DISTINCT $1::integer, code, $2::numeric, $3::integer
+        FROM promocode_import
+        ON CONFLICT (event_id, code) DO NOTHING
+        RETURNING code
+        """
+        timeout = query_timeout(QUERY_CLASS_BULK)
+        async with self._connection() as connection:
+            async with connection.transaction():
+                await self._timed(
+                    connection.execute(
+                        "CREATE TEMP TABLE promocode_import (code VARCHAR(64) NOT NULL) ON COMMIT DROP",
+                        timeout=timeout,
+                    ),
+                    QUERY_CLASS_BULK,
+                )
+                await self._timed(
+                    connection.copy_records_to_table(
+                        "promocode_import",
+                        records=((code,) for code in codes),
+                        columns=("code",),
+                        timeout=timeout,
+                    ),
+                    QUERY_CLASS_BULK,
+                )
+                records = await self._timed(
+                    connection.fetch(insert_query, event_id, discount_amount, max_uses, timeout=timeout),
+                    QUERY_CLASS_BULK,
+                )
+        return [record["code"] for record in records]
+
+    async def count_for_event(self, event_id: int) -> int:
+        query = "SELECT COUNT(*) FROM promocodes WHERE event_id = $1"
+        return await self._fetchval(query, event_id)
+
     async def delete_by_code(self, event_id: int, code: str) -> bool:
         query = """
         DELETE FROM promocodes
         WHERE event_id = $1 AND code = $2
         """
-        result = await self._pool.execute(query, event_id, code)
+        result = await self._execute(query, event_id, code)
         return result.upper().startswith("DELETE") and "0" not in result.split()[-1]
 
-    async def list_for_event(self, event_id: int) -> list[Promocode]:
-        query = """
-        SELECT id, event_id, code, discount_amount, expires_at, is_active, used_by_user_id, used_at
+    async def list_for_event(self, event_id: int, limit: Optional[int] = None) -> list[Promocode]:
+        query = f"""
+        SELECT {PROMOCODE_COLUMNS}
         FROM promocodes
         WHERE event_id = $1
         ORDER BY id DESC
+        LIMIT $2
         """
-        records = await self._pool.fetch(query, event_id)
+        records = await self._fetch(query, event_id, limit)
         return [self._to_promocode(record) for record in records]
 
     def _to_promocode(self, record: asyncpg.Record) -> Promocode:
-        return Promocode(
-            id=record["id"],
-            event_id=record["event_id"],
-            code=record["code"],
-            discount_amount=float(record["discount_amount"]),
-            expires_at=record["expires_at"],
-            is_active=record["is_active"],
-            used_by_user_id=record["used_by_user_id"],
-            used_at=record["used_at"],
-        )
-
-
+        return Promocode(*record)
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from bot.database.pool import query_timeout
+from bot.database.repositories.base import Repository
+
+
+@dataclass(frozen=True, slots=True)
+class RefundTask:
+    id: int
+    payment_id: str
+    event_id: int
+    amount: float
+    idempotency_key: str
+    attempts: int
+
+
+@dataclass(frozen=True, slots=True)
+class RefundProgress:
+    total: int
+    done: int
+    failed: int
+
+    @property
+    def finished(self) -> bool:
+        return self.done + self.failed >= self.total
+
+
+@dataclass(frozen=True, slots=True)
+class RefundBatch:
+    event_id: int
+    chat_id: Optional[int]
+    message_id: Optional[int]
+
+
+class RefundRepository(Repository):
+    async def enqueue_event(self, event_id: int, chat_id: Optional[int]) -> int:
+        # The idempotency key is generated once per payment and reused by every retry,
+        # so a crash between Refund.create and the status update cannot refund twice.
+        tasks_query = """
+        INSERT INTO refund_tasks (payment_id, event_id, amount)
+        SELECT payment_id, event_id, amount
+        FROM payments
+        WHERE event_id = $1 AND status = 'succeeded'
+        ON CONFLICT (payment_id) DO NOTHING
+        """
+        batch_query = """
+        INSERT INTO refund_batches (event_id, chat_id)
+        VALUES ($1, $2)
+        ON CONFLICT (event_id) DO UPDATE SET chat_id = COALESCE(EXCLUDED.chat_id, refund_batches.chat_id)
+        """
+        async with self._connection() as connection:
+            async with connection.transaction():
+                result = await self._timed(connection.execute(tasks_query, event_id, timeout=query_timeout()), None)
+                await self._timed(connection.execute(batch_query, event_id, chat_id, timeout=query_timeout()), None)
+        return int(result.split()[-1])
+
+    async def claim_due(self, limit: int, lease_seconds: int) -> list[RefundTask]:
+        # Claimed rows are pushed into the future for the lease duration, so another
+        # worker (or this one after a restart) only picks them up if we die mid-refund.
+        query = """
+        UPDATE refund_tasks
+        SET attempts = attempts + 1,
+            next_attempt_at = NOW() + make_interval(secs => $2),
+            updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM refund_tasks
+            WHERE status = 'queued' AND next_attempt_at <= NOW()
+            ORDER BY next_attempt_at ASC
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, payment_id, event_id, amount, idempotency_key, attempts
+        """
+        records = await self._fetch(query, limit, lease_seconds)
+        return [
+            RefundTask(
+                id=record["id"],
+                payment_id=record["payment_id"],
+                event_id=record["event_id"],
+                amount=float(record["amount"]),
+                idempotency_key=str(record["idempotency_key"]),
+                attempts=record["attempts"],
+            )
+            for record in records
+        ]
+
+    async def mark_done(self, task_id: int) -> None:
+        query = """
+        UPDATE refund_tasks
+        SET status = 'done', last_error = NULL, updated_at = NOW()
+        WHERE id = $1
+        """
+        await self._execute(query, task_id)
+
+    async def mark_retry(self, task_id: int, delay_seconds: int, max_attempts: int, error: str) -> None:
+        query = """
+        UPDATE refund_tasks
+        SET status = CASE WHEN attempts >= $3 THEN 'failed' ELSE 'queued' END,
+            next_attempt_at = NOW() + make_interval(secs => $2),
+            last_error = $4,
+            updated_at = NOW()
+        WHERE id = $1
+        """
+        await self._execute(query, task_id, delay_seconds, max_attempts, error)
+
+    async def next_due_in(self) -> Optional[float]:
+        query = """
+        SELECT EXTRACT(EPOCH FROM (MIN(next_attempt_at) - NOW()))
+        FROM refund_tasks
+        WHERE status = 'queued'
+        """
+        value = await self._fetchval(query)
+        return float(value) if value is not None else None
+
+    async def get_progress(self, event_id: int) -> RefundProgress:
+        query = """
+        SELECT
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE status = 'done') AS done,
+            COUNT(*) FILTER (WHERE status = 'failed') AS failed
+        FROM refund_tasks
+        WHERE event_id = $1
+        """
+        record = await self._fetchrow(query, event_id)
+        return RefundProgress(total=record["total"] or 0, done=record["done"] or 0, failed=record["failed"] or 0)
+
+    async def get_batch(self, event_id: int) -> Optional[RefundBatch]:
+        query = "SELECT event_id, chat_id, message_id FROM refund_batches WHERE event_id = $1"
+        record = await self._fetchrow(query, event_id)
+        if record is None:
+            return None
+        return RefundBatch(event_id=record["event_id"], chat_id=record["chat_id"], message_id=record["message_id"])
+
+    async def set_batch_message(self, event_id: int, message_id: int) -> None:
+        query = "UPDATE refund_batches SET message_id = $2 WHERE event_id = $1"
+        await self._execute(query, event_id, message_id)
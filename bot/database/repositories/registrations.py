@@ -1,19 +1,18 @@
 from dataclasses import dataclass
-from typing import Optional
-
-import asyncpg
+from typing import NamedTuple, Optional
 
+from bot.database.replica import pin_user_to_primary
+from bot.database.repositories.base import Repository
 from bot.utils.constants import STATUS_GOING, STATUS_NOT_GOING
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RegistrationStats:
     going: int
     not_going: int
 
 
-@dataclass(frozen=True)
-class Participant:
+class Participant(NamedTuple):
     user_id: int
     telegram_id: Optional[int]
     username: Optional[str]
@@ -21,10 +20,7 @@ class Participant:
     last_name: Optional[str] = None
 
 
-class RegistrationRepository:
-    def __init__(self, pool: asyncpg.Pool) -> None:
-        self._pool = pool
-
+class RegistrationRepository(Repository):
     async def get_stats(self, event_id: int) -> RegistrationStats:
         query = """
         SELECT
@@ -33,10 +29,8 @@ class RegistrationRepository:
         FROM registrations
         WHERE event_id = $1
         """
-        record = await self._pool.fetchrow(query, event_id, STATUS_GOING, STATUS_NOT_GOING)
-        going = record["going"] or 0
-        not_going = record["not_going"] or 0
-        return RegistrationStats(going=going, not_going=not_going)
+        record = await self._read_fetchrow(query, event_id, STATUS_GOING, STATUS_NOT_GOING)
+        return RegistrationStats(*record)
 
     async def list_participant_telegram_ids(self, event_id: int, status: str = STATUS_GOING) -> list[int]:
         query = """
@@ -45,7 +39,7 @@ class RegistrationRepository:
         JOIN users AS u ON u.id = r.user_id
         WHERE r.event_id = $1 AND r.status = $2 AND u.telegram_id IS NOT NULL
         """
-        rows = await self._pool.fetch(query, event_id, status)
+        rows = await self._read_fetch(query, event_id, status)
         return [row["telegram_id"] for row in rows]
 
     async def list_participants(self, event_id: int) -> list[Participant]:
@@ -56,15 +50,8 @@ class RegistrationRepository:
         WHERE r.event_id = $1 AND r.status = $2
         ORDER BY r.registered_at ASC
         """
-        rows = await self._pool.fetch(query, event_id, STATUS_GOING)
-        return [
-            Participant(
-                user_id=row["user_id"],
-                telegram_id=row["telegram_id"],
-                username=row["username"],
-            )
-            for row in rows
-        ]
+        rows = await self._read_fetch(query, event_id, STATUS_GOING)
+        return [Participant(*row) for row in rows]
 
     async def list_paid_participants(self, event_id: int) -> list[Participant]:
         query = """
@@ -75,24 +62,16 @@ class RegistrationRepository:
         WHERE r.event_id = $1 AND r.status = $2 AND p.status = 'succeeded'
         ORDER BY u.id, r.registered_at ASC
         """
-        rows = await self._pool.fetch(query, event_id, STATUS_GOING)
-        return [
-            Participant(
-                user_id=row["user_id"],
-                telegram_id=row["telegram_id"],
-                username=row["username"],
-                first_name=row.get("first_name"),
-                last_name=row.get("last_name"),
-            )
-            for row in rows
-        ]
+        rows = await self._read_fetch(query, event_id, STATUS_GOING)
+        return [Participant(*row) for row in rows]
 
     async def remove_participant(self, event_id: int, user_id: int) -> None:
         query = """
         DELETE FROM registrations
         WHERE event_id = $1 AND user_id = $2
         """
-        await self._pool.execute(query, event_id, user_id)
+        await self._execute(query, event_id, user_id)
+        pin_user_to_primary(user_id)
 
     async def add_participant(self, event_id: int, user_id: int, status: str = STATUS_GOING) -> None:
         query = """
@@ -100,7 +79,8 @@ class RegistrationRepository:
         VALUES ($1, $2, $3)
         ON CONFLICT (event_id, user_id) DO UPDATE SET status = $3
         """
-        await self._pool.execute(query, event_id, user_id, status)
+        await self._execute(query, event_id, user_id, status)
+        pin_user_to_primary(user_id)
 
     async def is_registered(self, event_id: int, user_id: int) -> bool:
         query = """
@@ -109,6 +89,6 @@ class RegistrationRepository:
             WHERE event_id = $1 AND user_id = $2 AND status = $3
         )
         """
-        result = await self._pool.fetchval(query, event_id, user_id, STATUS_GOING)
+        result = await self._read_fetchval(query, event_id, user_id, STATUS_GOING, user_id=user_id)
         return bool(result)
 
@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+
+from bot.database.pool import QUERY_CLASS_BULK
+from bot.database.repositories.base import Repository
+
+
+@dataclass(frozen=True, slots=True)
+class ArchivedTable:
+    name: str
+    columns: str
+    # SQL condition selecting the table's rows that belong to event $1.
+    event_filter: str
+
+
+# Children before parents: archiving payments would otherwise cascade-delete their refund tasks.
+ARCHIVED_TABLES = (
+    ArchivedTable(
+        "refund_tasks",
+        "id, payment_id, event_id, amount, idempotency_key, status, attempts, next_attempt_at, last_error, "
+        "created_at, updated_at",
+        "event_id = $1",
+    ),
+    ArchivedTable(
+        "promocode_usages",
+        "id, promocode_id, user_id, used_at",
+        "promocode_id IN (SELECT id FROM promocodes WHERE event_id = $1)",
+    ),
+    ArchivedTable(
+        "promocode_discounts",
+        "event_id, user_id, promocode_id, discount_amount, applied_at",
+        "event_id = $1",
+    ),
+    ArchivedTable(
+        "registrations",
+        "id, event_id, user_id, status, registered_at",
+        "event_id = $1",
+    ),
+    ArchivedTable(
+        "payments",
+        "id, payment_id, event_id, user_id, amount, status, created_at, paid_at, confirmation_url, "
+        "payment_message_id, refund_id",
+        "event_id = $1",
+    ),
+    ArchivedTable(
+        "event_images",
+        "id, event_id, file_id, position, created_at",
+        "event_id = $1",
+    ),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class TableSize:
+    total_bytes: int
+    index_bytes: int
+    live_rows: int
+
+
+class RetentionRepository(Repository):
+    async def list_archivable_events(self, archive_after_days: int, limit: int) -> list[int]:
+        # Events with money still in flight are skipped until it settles.
+        query = """
+        SELECT e.id
+        FROM events e
+        WHERE e.archived_at IS NULL
+          AND COALESCE(e.end_date, e.date) < (NOW() AT TIME ZONE 'Europe/Moscow')::date - $1::integer
+          AND NOT EXISTS (
+              SELECT 1 FROM payments p
+              WHERE p.event_id = e.id AND p.status IN ('pending', 'waiting_for_capture', 'refund_pending')
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM refund_tasks rt
+              WHERE rt.event_id = e.id AND rt.status = 'queued'
+          )
+        ORDER BY COALESCE(e.end_date, e.date) ASC, e.id ASC
+        LIMIT $2
+        """
+        records = await self._fetch(query, archive_after_days, limit)
+        return [record["id"] for record in records]
+
+    async def move_batch(self, table: ArchivedTable, event_id: int, batch_size: int) -> int:
+        # One statement per batch: each batch commits on its own and holds its row locks briefly.
+        query = f"""
+        WITH moved AS (
+            DELETE FROM {table.name}
+            WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM {table.name}
+                WHERE {table.event_filter}
+                LIMIT $2
+            ))
+            RETURNING {table.columns}
+        )
+        INSERT INTO {table.name}_archive ({table.columns})
+        SELECT {table.columns} FROM moved
+        """
+        result = await self._execute(query, event_id, batch_size, query_class=QUERY_CLASS_BULK)
+        return int(result.rsplit(" ", 1)[-1])
+
+    async def mark_archived(self, event_id: int) -> None:
+        query = "UPDATE events SET archived_at = NOW() WHERE id = $1"
+        await self._execute(query, event_id)
+
+    async def table_sizes(self, tables: list[str]) -> dict[str, TableSize]:
+        query = """
+        SELECT
+            c.relname AS name,
+            pg_total_relation_size(c.oid) AS total_bytes,
+            pg_indexes_size(c.oid) AS index_bytes,
+            COALESCE(s.n_live_tup, 0) AS live_rows
+        FROM pg_class c
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relname = ANY($1::text[]) AND c.relkind = 'r' AND pg_table_is_visible(c.oid)
+        """
+        records = await self._fetch(query, tables)
+        return {
+            record["name"]: TableSize(record["total_bytes"], record["index_bytes"], record["live_rows"])
+            for record in records
+        }
+
+    async def vacuum(self, table: str) -> None:
+        # VACUUM cannot run inside a transaction block, so this must not be called from one.
+        await self._execute(f"VACUUM (ANALYZE) {table}", query_class=QUERY_CLASS_BULK)
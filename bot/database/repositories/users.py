@@ -1,11 +1,9 @@
-from dataclasses import dataclass
-from typing import Optional
+from typing import NamedTuple, Optional
 
-import asyncpg
+from bot.database.repositories.base import Repository
 
 
-@dataclass
-class User:
+class User(NamedTuple):
     id: int
     telegram_id: int
     username: Optional[str]
@@ -14,64 +12,44 @@ class User:
     last_name: Optional[str] = None
 
 
-class UserRepository:
-    def __init__(self, pool: asyncpg.Pool) -> None:
-        self._pool = pool
+# Same order as the User fields: rows are mapped positionally.
+USER_COLUMNS = "id, telegram_id, username, role, first_name, last_name"
 
+
+class UserRepository(Repository):
     async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        query = "SELECT id, telegram_id, username, role, first_name, last_name FROM users WHERE telegram_id = $1"
-        record = await self._pool.fetchrow(query, telegram_id)
+        query = f"SELECT {USER_COLUMNS} FROM users WHERE telegram_id = $1"
+        record = await self._fetchrow(query, telegram_id)
         if record is None:
             return None
-        return User(
-            id=record["id"],
-            telegram_id=record["telegram_id"],
-            username=record["username"],
-            role=record["role"],
-            first_name=record.get("first_name"),
-            last_name=record.get("last_name"),
-        )
+        return User(*record)
 
     async def create(self, telegram_id: int, username: Optional[str], role: str = "user", first_name: Optional[str] = None, last_name: Optional[str] = None) -> User:
-        query = """
+        query = f"""
         INSERT INTO users (telegram_id, username, role, first_name, last_name)
         VALUES ($1, $2, $3, $4, $5)
-        RETURNING id, telegram_id, username, role, first_name, last_name
+        RETURNING {USER_COLUMNS}
         """
-        record = await self._pool.fetchrow(query, telegram_id, username, role, first_name, last_name)
-        return User(
-            id=record["id"],
-            telegram_id=record["telegram_id"],
-            username=record["username"],
-            role=record["role"],
-            first_name=record.get("first_name"),
-            last_name=record.get("last_name"),
-        )
+        record = await self._fetchrow(query, telegram_id, username, role, first_name, last_name)
+        return User(*record)
 
     async def update_role(self, user_id: int, role: str) -> None:
         query = "UPDATE users SET role = $1 WHERE id = $2"
-        await self._pool.execute(query, role, user_id)
+        await self._execute(query, role, user_id)
 
     async def update_name(self, user_id: int, first_name: Optional[str], last_name: Optional[str]) -> None:
         query = "UPDATE users SET first_name = $1, last_name = $2 WHERE id = $3"
-        await self._pool.execute(query, first_name, last_name, user_id)
+        await self._execute(query, first_name, last_name, user_id)
 
     async def get_by_id(self, user_id: int) -> Optional[User]:
-        query = "SELECT id, telegram_id, username, role, first_name, last_name FROM users WHERE id = $1"
-        record = await self._pool.fetchrow(query, user_id)
+        query = f"SELECT {USER_COLUMNS} FROM users WHERE id = $1"
+        record = await self._fetchrow(query, user_id)
         if record is None:
             return None
-        return User(
-            id=record["id"],
-            telegram_id=record["telegram_id"],
-            username=record["username"],
-            role=record["role"],
-            first_name=record.get("first_name"),
-            last_name=record.get("last_name"),
-        )
+        return User(*record)
 
     async def list_all_telegram_ids(self) -> list[int]:
         query = "SELECT telegram_id FROM users WHERE telegram_id IS NOT NULL"
-        rows = await self._pool.fetch(query)
+        rows = await self._fetch(query)
         return [row["telegram_id"] for row in rows]
 
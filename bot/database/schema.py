@@ -119,6 +119,17 @@ ALTER TABLE payments
     ADD COLUMN IF NOT EXISTS payment_message_id INTEGER;
 """
 
+ALTER_PAYMENTS_ADD_REFUND_ID = """
+ALTER TABLE payments
+    ADD COLUMN IF NOT EXISTS refund_id VARCHAR(255);
+"""
+
+CREATE_PAYMENTS_UNSETTLED_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_payments_unsettled
+    ON payments (id)
+    WHERE status IN ('pending', 'waiting_for_capture', 'refund_pending');
+"""
+
 ALTER_PROMOCODES_UNIQUE_CONSTRAINT = """
 DO $$
 BEGIN
@@ -173,6 +184,165 @@ CREATE TABLE IF NOT EXISTS promocode_usages (
 );
 """
 
+CREATE_REFUND_TASKS = """
+CREATE TABLE IF NOT EXISTS refund_tasks (
+    id SERIAL PRIMARY KEY,
+    payment_id VARCHAR(255) UNIQUE NOT NULL REFERENCES payments(payment_id) ON DELETE CASCADE,
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    amount DECIMAL(10, 2) NOT NULL,
+    idempotency_key UUID NOT NULL DEFAULT gen_random_uuid(),
+    status VARCHAR(32) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
+);
+"""
+
+CREATE_REFUND_TASKS_DUE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_refund_tasks_due
+    ON refund_tasks (next_attempt_at)
+    WHERE status = 'queued';
+"""
+
+CREATE_REFUND_TASKS_EVENT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_refund_tasks_event
+    ON refund_tasks (event_id);
+"""
+
+CREATE_REFUND_BATCHES = """
+CREATE TABLE IF NOT EXISTS refund_batches (
+    event_id INTEGER PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE,
+    chat_id BIGINT,
+    message_id INTEGER,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
+);
+"""
+
+ALTER_PROMOCODES_ADD_USAGE_LIMITS = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'promocodes' AND column_name = 'uses_count'
+    ) THEN
+        ALTER TABLE promocodes
+            ADD COLUMN max_uses INTEGER,
+            ADD COLUMN uses_count INTEGER NOT NULL DEFAULT 0;
+        UPDATE promocodes p
+        SET uses_count = u.total
+        FROM (
+            SELECT promocode_id, COUNT(*) AS total
+            FROM promocode_usages
+            GROUP BY promocode_id
+        ) u
+        WHERE u.promocode_id = p.id;
+    END IF;
+END $$;
+"""
+
+CREATE_PROMOCODE_DISCOUNTS = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.tables
+        WHERE table_name = 'promocode_discounts'
+    ) THEN
+        CREATE TABLE promocode_discounts (
+            event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            promocode_id INTEGER NOT NULL REFERENCES promocodes(id) ON DELETE CASCADE,
+            discount_amount DECIMAL(10, 2) NOT NULL,
+            applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (event_id, user_id)
+        );
+        INSERT INTO promocode_discounts (event_id, user_id, promocode_id, discount_amount, applied_at)
+        SELECT DISTINCT ON (p.event_id, pu.user_id)
+            p.event_id, pu.user_id, p.id, p.discount_amount, pu.used_at
+        FROM promocode_usages pu
+        INNER JOIN promocodes p ON p.id = pu.promocode_id
+        ORDER BY p.event_id, pu.user_id, p.discount_amount DESC;
+    END IF;
+END $$;
+"""
+
+ALTER_EVENTS_ADD_ARCHIVED_AT = """
+ALTER TABLE events
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE;
+"""
+
+CREATE_PAYMENTS_EVENT_USER_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_payments_event_user
+    ON payments (event_id, user_id);
+"""
+
+CREATE_EVENT_IMAGES_EVENT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_event_images_event
+    ON event_images (event_id, position);
+"""
+
+# Archive tables copy the columns of their hot table but no keys, foreign keys or
+# defaults, so archived rows never block deletes and cost nothing on hot writes.
+CREATE_ARCHIVE_TABLES = """
+CREATE TABLE IF NOT EXISTS payments_archive (LIKE payments);
+ALTER TABLE payments_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_payments_archive_event ON payments_archive (event_id);
+CREATE INDEX IF NOT EXISTS idx_payments_archive_payment ON payments_archive (payment_id);
+
+CREATE TABLE IF NOT EXISTS registrations_archive (LIKE registrations);
+ALTER TABLE registrations_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_registrations_archive_event ON registrations_archive (event_id);
+
+CREATE TABLE IF NOT EXISTS refund_tasks_archive (LIKE refund_tasks);
+ALTER TABLE refund_tasks_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_refund_tasks_archive_event ON refund_tasks_archive (event_id);
+
+CREATE TABLE IF NOT EXISTS promocode_usages_archive (LIKE promocode_usages);
+ALTER TABLE promocode_usages_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_promocode_usages_archive_promocode ON promocode_usages_archive (promocode_id);
+
+CREATE TABLE IF NOT EXISTS promocode_discounts_archive (LIKE promocode_discounts);
+ALTER TABLE promocode_discounts_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_promocode_discounts_archive_event ON promocode_discounts_archive (event_id);
+
+CREATE TABLE IF NOT EXISTS event_images_archive (LIKE event_images);
+ALTER TABLE event_images_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_event_images_archive_event ON event_images_archive (event_id);
+"""
+
+CREATE_FSM_STATES = """
+CREATE TABLE IF NOT EXISTS fsm_states (
+    bot_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    thread_id BIGINT NOT NULL DEFAULT 0,
+    business_connection_id VARCHAR(255) NOT NULL DEFAULT '',
+    destiny VARCHAR(64) NOT NULL DEFAULT 'default',
+    state VARCHAR(255),
+    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+);
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at);
+"""
+
+CREATE_BOT_MESSAGES = """
+CREATE TABLE IF NOT EXISTS bot_messages (
+    chat_id BIGINT NOT NULL,
+    message_id BIGINT NOT NULL,
+    sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_bot_messages_sent ON bot_messages (sent_at);
+"""
+
 STATEMENTS = (
     CREATE_USERS,
     CREATE_EVENTS,
@@ -186,10 +356,24 @@ STATEMENTS = (
     CREATE_REGISTRATIONS,
     CREATE_PAYMENTS,
     ALTER_PAYMENTS_ADD_MESSAGE_ID,
+    ALTER_PAYMENTS_ADD_REFUND_ID,
+    CREATE_PAYMENTS_UNSETTLED_INDEX,
     CREATE_PROMOCODES,
     ALTER_PROMOCODES_UNIQUE_CONSTRAINT,
     CREATE_PROMOCODE_USAGES,
+    ALTER_PROMOCODES_ADD_USAGE_LIMITS,
+    CREATE_PROMOCODE_DISCOUNTS,
     ALTER_USERS_ADD_FIRST_NAME,
     ALTER_USERS_ADD_LAST_NAME,
+    CREATE_REFUND_TASKS,
+    CREATE_REFUND_TASKS_DUE_INDEX,
+    CREATE_REFUND_TASKS_EVENT_INDEX,
+    CREATE_REFUND_BATCHES,
+    ALTER_EVENTS_ADD_ARCHIVED_AT,
+    CREATE_PAYMENTS_EVENT_USER_INDEX,
+    CREATE_EVENT_IMAGES_EVENT_INDEX,
+    CREATE_ARCHIVE_TABLES,
+    CREATE_FSM_STATES,
+    CREATE_BOT_MESSAGES,
 )
 
@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncContextManager, AsyncIterator, Optional
+
+import asyncpg
+
+from .pool import acquire, get_pool, pooled_connection
+
+_current: ContextVar[Optional["UnitOfWork"]] = ContextVar("db_unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """One lazily acquired connection shared by every repository call in a scope.
+
+    asyncpg connections run one query at a time, so access is serialized; the lock
+    is re-entrant per task so a nested repository call does not wait on itself.
+    """
+
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self._pool = pool
+        self._connection: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        self._owner: Optional[asyncio.Task] = None
+        self._depth = 0
+        self._closed = False
+        # Set once this scope has written something a later read must observe.
+        self.primary_pinned = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._connection is not None and self._connection.is_in_transaction()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[asyncpg.Connection]:
+        task = asyncio.current_task()
+        if self._owner is not task:
+            await self._lock.acquire()
+            self._owner = task
+        self._depth += 1
+        try:
+            if self._connection is None:
+                self._connection = await acquire(self._pool)
+            yield self._connection
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._lock.release()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["UnitOfWork"]:
+        # The lock is only held for BEGIN and COMMIT/ROLLBACK, not for the whole block:
+        # concurrent calls made inside the scope (e.g. via asyncio.gather) take turns on
+        # the connection and all land in the same transaction.
+        async with self.connection() as connection:
+            transaction = connection.transaction()
+            await transaction.start()
+        try:
+            yield self
+        except BaseException:
+            async with self.connection():
+                await transaction.rollback()
+            raise
+        async with self.connection():
+            await transaction.commit()
+
+    async def close(self) -> None:
+        self._closed = True
+        async with self._lock:
+            if self._connection is not None:
+                connection, self._connection = self._connection, None
+                await self._pool.release(connection)
+
+
+@asynccontextmanager
+async def unit_of_work(transactional: bool = False) -> AsyncIterator[UnitOfWork]:
+    existing = _current.get()
+    if existing is not None and not existing.closed:
+        if transactional:
+            async with existing.transaction():
+                yield existing
+        else:
+            yield existing
+        return
+    uow = UnitOfWork(get_pool())
+    token = _current.set(uow)
+    try:
+        if transactional:
+            async with uow.transaction():
+                yield uow
+        else:
+            yield uow
+    finally:
+        _current.reset(token)
+        await uow.close()
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    uow = _current.get()
+    if uow is None or uow.closed:
+        return None
+    return uow
+
+
+def acquire_connection(pool: asyncpg.Pool) -> AsyncContextManager[asyncpg.Connection]:
+    uow = _current.get()
+    # Tasks spawned during an update inherit its context and may outlive it.
+    if uow is not None and not uow.closed:
+        return uow.connection()
+    return pooled_connection(pool)
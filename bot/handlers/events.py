@@ -13,6 +13,7 @@ from bot.keyboards import (
     payment_method_keyboard,
 )
 from bot.handlers.states import PromocodeState
+from bot.services.promocode_service import PromocodeResult
 from bot.utils.callbacks import (
     EVENT_BACK_TO_LIST,
     EVENT_LIST_PAGE_PREFIX,
@@ -27,14 +28,25 @@ from bot.utils.callbacks import (
 from bot.utils.di import get_services
 from bot.utils.formatters import format_event_card
 from bot.utils.events import has_event_started
+from bot.utils.cache import LRUCache
+from bot.utils.constants import DELETABLE_SECONDS
 from bot.utils.i18n import t
-from bot.utils.messaging import remember_user_message, safe_answer_callback, safe_delete, safe_delete_by_id, safe_delete_recent_bot_messages, send_or_edit
+from bot.utils.tasks import spawn
+from bot.utils.messaging import (
+    render_card,
+    safe_answer_callback,
+    safe_delete_messages,
+    safe_delete_recent_bot_messages,
+    send_or_edit,
+)
 from bot.keyboards.event_card import promocode_back_keyboard
 
 router = Router()
 
-_MEDIA_MESSAGE_MAP: dict[tuple[int, int], list[int]] = {}
-_MAX_MEDIA_MAP_SIZE = 500
+# (chat_id, card message_id) -> ids of the album sent with that card.
+_MEDIA_MESSAGE_MAP: LRUCache[tuple[int, int], list[int]] = LRUCache(
+    "event_media_groups", max_size=5_000, ttl_seconds=DELETABLE_SECONDS
+)
 
 
 @router.callback_query(F.data.startswith(EVENT_VIEW_PREFIX))
@@ -83,43 +95,24 @@ async def show_event(callback: CallbackQuery) -> None:
         allow_payment=not event_started,
     )
     
-    MAX_CAPTION_LENGTH = 1024
-    caption_text = text[:MAX_CAPTION_LENGTH] if len(text) > MAX_CAPTION_LENGTH else text
-    
     if callback.message:
         chat_id = callback.message.chat.id
         bot = callback.message.bot
         message_id = callback.message.message_id
         cleanup_start = message_id - 1
-        old_message = callback.message
         images = list(event.image_file_ids)
-        if images and images[0]:
-            try:
-                await asyncio.wait_for(
-                    bot.send_photo(chat_id, images[0], caption=caption_text, reply_markup=markup),
-                    timeout=10.0
-                )
-                await _cleanup_media_group(old_message)
-                await safe_delete(old_message)
-            except asyncio.TimeoutError:
-                logger.error(f"[show_event] Photo send TIMEOUT after 10s")
-                new_message = await bot.send_message(chat_id, text, reply_markup=markup)
-                await _cleanup_media_group(old_message)
-                await safe_delete(old_message)
-            except Exception as e:
-                logger.error(f"[show_event] Photo send ERROR: {e}", exc_info=True)
-                new_message = await bot.send_message(chat_id, text, reply_markup=markup)
-                await _cleanup_media_group(old_message)
-                await safe_delete(old_message)
-        else:
-            try:
-                await callback.message.edit_text(text, reply_markup=markup)
-            except Exception as e:
-                logger.warning(f"[show_event] Edit failed: {e}, sending new then deleting old")
-                new_message = await bot.send_message(chat_id, text, reply_markup=markup)
-                await safe_delete(callback.message)
+        card = await render_card(callback.message, text, markup, photo=images[0] if images and images[0] else None)
+        # Everything this navigation leaves behind goes in one deleteMessages call.
+        stale_ids = _pop_media_group(callback.message)
+        if card.message_id != message_id:
+            stale_ids.append(message_id)
         if cleanup_start > 0:
-            asyncio.create_task(safe_delete_recent_bot_messages(bot, chat_id, cleanup_start, count=10))
+            spawn(
+                safe_delete_recent_bot_messages(bot, chat_id, cleanup_start, count=10, extra_message_ids=stale_ids),
+                kind="event_card_cleanup",
+            )
+        elif stale_ids:
+            spawn(safe_delete_messages(bot, chat_id, stale_ids), kind="event_card_cleanup")
     await safe_answer_callback(callback)
 
 
@@ -130,14 +123,13 @@ async def back_to_list(callback: CallbackQuery) -> None:
     user = await services.users.ensure(tg_user.id, tg_user.username, tg_user.first_name, tg_user.last_name)
     events = await services.events.get_active_events()
     if callback.message:
-        await _cleanup_media_group(callback.message)
         old_message = callback.message
         if not events:
             await old_message.answer(t("menu.actual_empty"), reply_markup=back_to_main_keyboard())
         else:
             keyboard = event_list_keyboard(events)
             await old_message.answer(t("menu.actual_prompt"), reply_markup=keyboard)
-        await safe_delete(old_message)
+        await _delete_with_media_group(old_message)
     await safe_answer_callback(callback)
 
 
@@ -177,10 +169,9 @@ async def show_payment_methods(callback: CallbackQuery) -> None:
     markup = payment_method_keyboard(event_id)
 
     if callback.message:
-        await _cleanup_media_group(callback.message)
         old_message = callback.message
         await old_message.answer(text, reply_markup=markup)
-        await safe_delete(old_message)
+        await _delete_with_media_group(old_message)
     await safe_answer_callback(callback)
 
 
@@ -269,18 +260,16 @@ async def start_promocode(callback: CallbackQuery, state: FSMContext) -> None:
         return
 
     await state.set_state(PromocodeState.code)
-    await state.update_data(promocode_event_id=event.id)
+    await state.update_data(promocode_event_id=event.id, promocode_user_id=user.id)
     if callback.message:
-        await _cleanup_media_group(callback.message)
         old_message = callback.message
         await old_message.answer(t("promocode.prompt"), reply_markup=promocode_back_keyboard(event.id))
-        await safe_delete(old_message)
+        await _delete_with_media_group(old_message)
     await safe_answer_callback(callback)
 
 
 @router.message(PromocodeState.code)
 async def process_promocode(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     current_state = await state.get_state()
     if current_state != PromocodeState.code.state:
         return
@@ -292,37 +281,27 @@ async def process_promocode(message: Message, state: FSMContext) -> None:
         await message.answer(t("error.context_lost_alert"))
         return
 
-    event = await services.events.get_event(event_id)
-    if event is None:
+    tg_user = message.from_user
+    code = (message.text or "").strip()
+    # The redeem statement checks the event itself, so a code attempt is one round trip.
+    user_id = data.get("promocode_user_id")
+    if not user_id:
+        user = await services.users.ensure(tg_user.id, tg_user.username, tg_user.first_name, tg_user.last_name)
+        user_id = user.id
+    result = await services.promocodes.apply_promocode(event_id, user_id, tg_user.id, code)
+    if result.error_code == "event_not_found":
         await state.clear()
         await message.answer(t("error.event_not_found"))
         return
-
-    if has_event_started(event):
+    if result.error_code == "event_started":
         await state.clear()
         await message.answer(t("promocode.error.expired"), reply_markup=promocode_back_keyboard(event_id))
         return
-
-    tg_user = message.from_user
-    user = await services.users.ensure(tg_user.id, tg_user.username, tg_user.first_name, tg_user.last_name)
-
-    code = (message.text or "").strip()
-    result = await services.promocodes.apply_promocode(event_id, user.id, code)
-
-    bot = message.bot
-    chat_id = message.chat.id
-    await safe_delete_recent_bot_messages(bot, chat_id, message.message_id - 1, count=1)
-
     if not result.success:
-        if result.error_code == "expired":
-            text = t("promocode.error.expired")
-        elif result.error_code == "already_used":
-            text = t("promocode.error.already_used")
-        else:
-            text = t("promocode.error.not_found")
-        await message.answer(text, reply_markup=promocode_back_keyboard(event_id))
+        await _answer_promocode_result(message, event_id, result)
         return
 
+    await safe_delete_recent_bot_messages(message.bot, message.chat.id, message.message_id - 1, count=1)
     discount_value = result.discount or 0
     await state.clear()
     await message.answer(
@@ -331,6 +310,21 @@ async def process_promocode(message: Message, state: FSMContext) -> None:
     )
 
 
+async def _answer_promocode_result(message: Message, event_id: int, result: PromocodeResult) -> None:
+    await safe_delete_recent_bot_messages(message.bot, message.chat.id, message.message_id - 1, count=1)
+    if result.error_code == "expired":
+        text = t("promocode.error.expired")
+    elif result.error_code == "already_used":
+        text = t("promocode.error.already_used")
+    elif result.error_code == "exhausted":
+        text = t("promocode.error.exhausted")
+    elif result.error_code == "throttled":
+        text = t("promocode.error.throttled")
+    else:
+        text = t("promocode.error.not_found")
+    await message.answer(text, reply_markup=promocode_back_keyboard(event_id))
+
+
 @router.callback_query(F.data.startswith(EVENT_REFUND_PREFIX))
 async def refund_event(callback: CallbackQuery) -> None:
     services = get_services()
@@ -390,40 +384,31 @@ async def refund_event(callback: CallbackQuery) -> None:
         allow_payment=not event_started,
     )
     
-    MAX_CAPTION_LENGTH = 1024
-    caption_text = text[:MAX_CAPTION_LENGTH] if len(text) > MAX_CAPTION_LENGTH else text
-    
     if callback.message:
-        await _cleanup_media_group(callback.message)
-        bot = callback.message.bot
-        chat_id = callback.message.chat.id
-        await safe_delete(callback.message)
         images = list(event.image_file_ids)
-        if images and images[0]:
-            try:
-                await bot.send_photo(chat_id, images[0], caption=caption_text, reply_markup=markup)
-            except Exception as e:
-                logger.error(f"[refund_event] Photo send ERROR: {e}", exc_info=True)
-                await bot.send_message(chat_id, text, reply_markup=markup)
-        else:
-            await bot.send_message(chat_id, text, reply_markup=markup)
+        card = await render_card(callback.message, text, markup, photo=images[0] if images and images[0] else None)
+        stale_ids = _pop_media_group(callback.message)
+        if card.message_id != callback.message.message_id:
+            stale_ids.append(callback.message.message_id)
+        await safe_delete_messages(callback.message.bot, callback.message.chat.id, stale_ids)
 
 
 def _remember_media_group(anchor: Message, media_messages: list[Message]) -> None:
     if not media_messages:
         return
-    key = (anchor.chat.id, anchor.message_id)
-    if len(_MEDIA_MESSAGE_MAP) >= _MAX_MEDIA_MAP_SIZE:
-        _MEDIA_MESSAGE_MAP.pop(next(iter(_MEDIA_MESSAGE_MAP)))
-    _MEDIA_MESSAGE_MAP[key] = [message.message_id for message in media_messages]
+    _MEDIA_MESSAGE_MAP.set((anchor.chat.id, anchor.message_id), [message.message_id for message in media_messages])
+
+
+def _pop_media_group(message: Message) -> list[int]:
+    return _MEDIA_MESSAGE_MAP.pop((message.chat.id, message.message_id), [])
 
 
 async def _cleanup_media_group(message: Message) -> None:
-    key = (message.chat.id, message.message_id)
-    media_ids = _MEDIA_MESSAGE_MAP.pop(key, [])
-    if not media_ids:
-        return
-    bot = message.bot
-    for media_id in media_ids:
-        await safe_delete_by_id(bot, message.chat.id, media_id)
+    media_ids = _pop_media_group(message)
+    if media_ids:
+        await safe_delete_messages(message.bot, message.chat.id, media_ids)
+
+
+async def _delete_with_media_group(message: Message) -> None:
+    await safe_delete_messages(message.bot, message.chat.id, [*_pop_media_group(message), message.message_id])
 
@@ -11,11 +11,12 @@ from typing import Any, Callable, Optional, TypeVar
 from aiogram import F, Router
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, Message
+from aiogram.types import BufferedInputFile, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, Message
 
 from bot.database.repositories.events import Event
 from bot.database.repositories.registrations import RegistrationStats
 from bot.handlers.states import CreateEventState, EditEventState, PromocodeAdminState
+from bot.services.promocode_service import MAX_BULK_PROMOCODES, BulkPromocodeResult
 from bot.keyboards import (
     cancel_event_keyboard,
     create_preview_keyboard,
@@ -32,9 +33,11 @@ from bot.keyboards import (
     participants_list_keyboard,
     promocode_input_keyboard,
     promocode_list_keyboard,
+    promocode_max_uses_keyboard,
     moderator_settings_keyboard,
     new_event_notification_keyboard,
 )
+from bot.utils.broadcast import send_to_all
 from bot.utils.callbacks import (
     CREATE_EVENT_BACK,
     CREATE_EVENT_IMAGES_CONFIRM,
@@ -64,7 +67,7 @@ from bot.utils.callbacks import (
 from bot.utils.di import get_services
 from bot.utils.formatters import format_event_card
 from bot.utils.constants import MAX_EVENT_IMAGES
-from bot.utils.messaging import remember_user_message, safe_answer_callback, safe_delete, safe_delete_message, safe_delete_by_id, send_or_edit
+from bot.utils.messaging import safe_answer_callback, safe_delete, safe_delete_message, safe_delete_by_id, send_or_edit
 from bot.utils.i18n import t
 
 router = Router()
@@ -74,6 +77,8 @@ PROMPT_CHAT_KEY = "prompt_chat_id"
 NOTICE_KEY = "notice_message_id"
 NOTICE_CHAT_KEY = "notice_chat_id"
 PREVIEW_MEDIA_KEY = "preview_media_entries"
+PROMOCODE_LIST_LIMIT = 30
+MAX_PROMOCODE_IMPORT_BYTES = 5 * 1024 * 1024
 
 
 CREATE_STATE_SEQUENCE = [
@@ -230,7 +235,6 @@ async def create_event_images_confirm(callback: CallbackQuery, state: FSMContext
 
 @router.message(CreateEventState.title)
 async def process_create_title(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     if not text:
         await _send_prompt_text(
@@ -255,7 +259,6 @@ async def process_create_title(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.date)
 async def process_create_date(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     try:
         start_date, end_date = _parse_date_input(text)
@@ -299,7 +302,6 @@ async def process_create_date(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.time)
 async def process_create_time(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     lowered = text.lower()
     if not text:
@@ -348,7 +350,6 @@ async def process_create_time(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.period)
 async def process_create_period(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     lowered = text.lower()
     if not text or lowered in {"пропустить", "skip"}:
@@ -389,7 +390,6 @@ async def process_create_period(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.place)
 async def process_create_place(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     lowered = text.lower()
     await _push_create_history(state, CreateEventState.place)
@@ -409,7 +409,6 @@ async def process_create_place(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.description)
 async def process_create_description(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     await _push_create_history(state, CreateEventState.description)
     if text and text.lower() not in {"пропустить", "skip"}:
@@ -438,7 +437,6 @@ async def process_create_description(message: Message, state: FSMContext) -> Non
 
 @router.message(CreateEventState.cost)
 async def process_create_cost(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     raw_text = (message.text or "").strip()
     if not raw_text or raw_text.lower() in {"пропустить", "skip"}:
         await _push_create_history(state, CreateEventState.cost)
@@ -480,7 +478,6 @@ async def process_create_cost(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.image)
 async def process_create_image(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     data = await state.get_data()
     images = list(data.get("image_file_ids", []))
     if message.photo:
@@ -549,7 +546,6 @@ async def process_create_image(message: Message, state: FSMContext) -> None:
 
 @router.message(CreateEventState.limit)
 async def process_create_limit(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     if not text or text.lower() in {"пропустить", "skip"}:
         await _push_create_history(state, CreateEventState.limit)
@@ -710,11 +706,10 @@ async def handle_edit_entry(callback: CallbackQuery, state: FSMContext) -> None:
         await state.set_state(EditEventState.image_upload)
         await state.update_data(edit_field=field, new_image_file_ids=existing_images, images_dirty=False)
         if callback.message:
-            from bot.handlers.events import _cleanup_media_group
-            await _cleanup_media_group(callback.message)
+            from bot.handlers.events import _delete_with_media_group
             chat_id = callback.message.chat.id
             bot = callback.message.bot
-            await safe_delete(callback.message)
+            await _delete_with_media_group(callback.message)
             sent = await bot.send_message(
                 chat_id,
                 t("edit.prompt_image"),
@@ -763,7 +758,6 @@ async def start_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
 
 @router.message(EditEventState.broadcast)
 async def process_broadcast(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     text = (message.text or "").strip()
     if not text:
         await _send_prompt_text(
@@ -810,15 +804,7 @@ async def process_broadcast(message: Message, state: FSMContext) -> None:
         ]
     )
     
-    delivered = 0
-    for telegram_id in telegram_ids:
-        try:
-            await message.bot.send_message(telegram_id, broadcast_text, reply_markup=broadcast_markup)
-            delivered += 1
-            logger.info(f"Message delivered to {telegram_id}")
-        except Exception as e:
-            logger.warning(f"Failed to send message to {telegram_id}: {e}")
-            continue
+    delivered = await send_to_all(message.bot, telegram_ids, broadcast_text, broadcast_markup, kind="moderator")
     
     if delivered == 0:
         await _send_prompt_text(
@@ -880,6 +866,8 @@ async def cancel_event_confirm(callback: CallbackQuery, state: FSMContext) -> No
         await safe_answer_callback(callback, text=t("error.cancel_failed"), show_alert=True)
         return
     await _notify_cancellation(callback, event)
+    if callback.message:
+        await services.refunds.start_event_refunds(callback.message.bot, event_id, callback.message.chat.id)
     await state.clear()
     if callback.message:
         await _remove_prompt_message(callback.message, state)
@@ -1047,7 +1035,7 @@ async def list_event_promocodes(callback: CallbackQuery, state: FSMContext) -> N
         edit_event_id=event_id,
         edit_stack=existing_stack,
     )
-    promocodes = await services.promocodes.list_promocodes(event_id)
+    promocodes = await services.promocodes.list_promocodes(event_id, limit=PROMOCODE_LIST_LIMIT)
     if callback.message:
         if not promocodes:
             sent = await _send_prompt_text(
@@ -1071,7 +1059,13 @@ async def list_event_promocodes(callback: CallbackQuery, state: FSMContext) -> N
                     discount=f"{p.discount_amount:.0f}",
                     event_start=event_start_str,
                 )
+                if p.max_uses is not None:
+                    item_text = f"{item_text}, {t('promocode.admin.list_item_uses', used=p.uses_count, max=p.max_uses)}"
                 lines.append(f"{idx}. {item_text}")
+            if len(promocodes) == PROMOCODE_LIST_LIMIT:
+                total = await services.promocodes.count_promocodes(event_id)
+                if total > PROMOCODE_LIST_LIMIT:
+                    lines.append(t("promocode.admin.list_more", count=total - PROMOCODE_LIST_LIMIT))
             text = "\n\n".join(lines)
             await _send_prompt_text(
                 callback.message,
@@ -1115,7 +1109,6 @@ async def start_add_promocode(callback: CallbackQuery, state: FSMContext) -> Non
 
 @router.message(PromocodeAdminState.code_input)
 async def process_promocode_code_input(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     current_state = await state.get_state()
     if current_state != PromocodeAdminState.code_input.state:
         return
@@ -1180,21 +1173,109 @@ async def process_promocode_code_input(message: Message, state: FSMContext) -> N
 
 @router.message(PromocodeAdminState.discount_input)
 async def process_promocode_discount_input(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
+    data = await state.get_data()
+    event_id = data.get("promocode_event_id")
+    value = await _parse_promocode_discount(message, state, event_id)
+    if value is None:
+        return
+    await _ask_promocode_max_uses(message, state, event_id, promocode_discount=value)
+
+
+async def _ask_promocode_max_uses(message: Message, state: FSMContext, event_id: int, **data: Any) -> None:
+    await state.update_data(**data)
+    await state.set_state(PromocodeAdminState.max_uses_input)
+    await _send_prompt_text(message, state, t("promocode.admin.max_uses_prompt"), promocode_max_uses_keyboard(event_id))
+    await safe_delete(message)
+
+
+@router.message(PromocodeAdminState.max_uses_input)
+async def process_promocode_max_uses_input(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    event_id = data.get("promocode_event_id")
+    if not event_id:
+        return
     text = (message.text or "").strip()
+    max_uses = int(text) if text.isdigit() else 0
+    if max_uses < 1:
+        await _send_prompt_text(
+            message,
+            state,
+            t("promocode.admin.max_uses_invalid"),
+            promocode_max_uses_keyboard(event_id),
+        )
+        await safe_delete(message)
+        return
+    await _apply_promocode_max_uses(message, state, event_id, max_uses)
+    await safe_delete(message)
+
+
+@router.callback_query(PromocodeAdminState.max_uses_input, F.data.startswith("promocode:unlimited:"))
+async def promocode_unlimited_uses(callback: CallbackQuery, state: FSMContext) -> None:
+    await safe_answer_callback(callback)
     data = await state.get_data()
     event_id = data.get("promocode_event_id")
+    if not event_id or not callback.message:
+        return
+    await _apply_promocode_max_uses(callback.message, state, event_id, None)
+
+
+async def _apply_promocode_max_uses(message: Message, state: FSMContext, event_id: int, max_uses: Optional[int]) -> None:
+    data = await state.get_data()
+    if data.get("promocode_bulk_mode") == "import":
+        await state.update_data(promocode_max_uses=max_uses)
+        await state.set_state(PromocodeAdminState.import_file)
+        await _send_prompt_text(message, state, t("promocode.admin.import_file_prompt"), promocode_input_keyboard(event_id))
+        return
+    await _create_promocode(message, state, event_id, data.get("promocode_code"), data.get("promocode_discount"), max_uses)
+
+
+async def _create_promocode(
+    message: Message,
+    state: FSMContext,
+    event_id: int,
+    code: str,
+    value: float,
+    max_uses: Optional[int],
+) -> None:
+    services = get_services()
     try:
-        value = float(text.replace(",", "."))
-    except ValueError:
+        await services.promocodes.create_promocode(event_id, code, value, None, max_uses)
+    except ValueError as e:
+        # Duplicate code: ask for another one and keep the discount and limit steps after it.
+        await state.set_state(PromocodeAdminState.code_input)
         await _send_prompt_text(
             message,
             state,
-            t("promocode.admin.discount_invalid"),
+            str(e),
             promocode_input_keyboard(event_id),
         )
-        await safe_delete(message)
         return
+    await _remove_prompt_message(message, state)
+    data = await state.get_data()
+    existing_stack = list(data.get("edit_stack", []))
+    if not existing_stack or existing_stack[-1] != "promocodes":
+        existing_stack = ["actions", "promocodes"]
+    await state.clear()
+    await state.set_state(EditEventState.selecting_field)
+    await state.update_data(
+        edit_event_id=event_id,
+        edit_stack=existing_stack,
+    )
+    normalized_code = code.strip().upper()
+    await _send_prompt_text(
+        message,
+        state,
+        t("promocode.admin.add_success", code=normalized_code, discount=f"{value:.0f}"),
+        manage_promocode_actions_keyboard(event_id),
+    )
+
+
+async def _parse_promocode_discount(message: Message, state: FSMContext, event_id: int) -> Optional[float]:
+    text = (message.text or "").strip()
+    try:
+        value = float(text.replace(",", "."))
+    except ValueError:
+        value = 0.0
     if value < 1:
         await _send_prompt_text(
             message,
@@ -1203,14 +1284,14 @@ async def process_promocode_discount_input(message: Message, state: FSMContext)
             promocode_input_keyboard(event_id),
         )
         await safe_delete(message)
-        return
+        return None
     services = get_services()
     event = await services.events.get_event(event_id)
     if event is None:
         await state.clear()
         await message.answer(t("error.event_not_found"))
         await safe_delete(message)
-        return
+        return None
     if event.cost and value > event.cost:
         await _send_prompt_text(
             message,
@@ -1219,19 +1300,131 @@ async def process_promocode_discount_input(message: Message, state: FSMContext)
             promocode_input_keyboard(event_id),
         )
         await safe_delete(message)
+        return None
+    return value
+
+
+@router.callback_query(F.data.startswith("promocode:") & (F.data.contains(":generate:") | F.data.contains(":import:")))
+async def start_bulk_promocodes(callback: CallbackQuery, state: FSMContext) -> None:
+    callback_data = callback.data or "None"
+    user_id = callback.from_user.id if callback.from_user else 0
+    logger.info(f"[start_bulk_promocodes] START: data={callback_data[:50]}, user_id={user_id}")
+    if callback.data is None:
         return
-    code = data.get("promocode_code")
+    parts = callback.data.split(":")
+    if len(parts) != 3:
+        return
+    mode = parts[1]
+    event_id = int(parts[2])
+    data = await state.get_data()
+    existing_stack = list(data.get("edit_stack", []))
+    if not existing_stack or existing_stack[-1] != "promocodes":
+        existing_stack = ["actions", "promocodes"]
+    await state.set_state(PromocodeAdminState.bulk_discount_input)
+    await state.update_data(
+        promocode_event_id=event_id,
+        promocode_bulk_mode=mode,
+        edit_event_id=event_id,
+        edit_stack=existing_stack,
+    )
+    if callback.message:
+        await _send_prompt_text(
+            callback.message,
+            state,
+            t("promocode.admin.add_discount_prompt"),
+            promocode_input_keyboard(event_id),
+        )
+        await safe_delete(callback.message)
+
+
+@router.message(PromocodeAdminState.bulk_discount_input)
+async def process_bulk_promocode_discount(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    event_id = data.get("promocode_event_id")
+    if not event_id:
+        return
+    value = await _parse_promocode_discount(message, state, event_id)
+    if value is None:
+        return
+    if data.get("promocode_bulk_mode") == "import":
+        await _ask_promocode_max_uses(message, state, event_id, promocode_bulk_discount=value)
+        return
+    await state.update_data(promocode_bulk_discount=value)
+    await state.set_state(PromocodeAdminState.bulk_count_input)
+    text = t("promocode.admin.bulk_count_prompt", max=MAX_BULK_PROMOCODES)
+    await _send_prompt_text(message, state, text, promocode_input_keyboard(event_id))
+    await safe_delete(message)
+
+
+@router.message(PromocodeAdminState.bulk_count_input)
+async def process_bulk_promocode_count(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    event_id = data.get("promocode_event_id")
+    discount = data.get("promocode_bulk_discount")
+    if not event_id or discount is None:
+        return
+    text = (message.text or "").strip()
+    count = int(text) if text.isdigit() else 0
+    if not 1 <= count <= MAX_BULK_PROMOCODES:
+        await _send_prompt_text(
+            message,
+            state,
+            t("promocode.admin.bulk_count_invalid", max=MAX_BULK_PROMOCODES),
+            promocode_input_keyboard(event_id),
+        )
+        await safe_delete(message)
+        return
+    services = get_services()
+    result = await services.promocodes.generate_promocodes(event_id, count, discount)
+    await _finish_bulk_promocodes(message, state, event_id, result, f"promocodes_{event_id}.csv")
+
+
+@router.message(PromocodeAdminState.import_file)
+async def process_promocode_import_file(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    event_id = data.get("promocode_event_id")
+    discount = data.get("promocode_bulk_discount")
+    if not event_id or discount is None:
+        return
+    document = message.document
+    if document is None or (document.file_size or 0) > MAX_PROMOCODE_IMPORT_BYTES:
+        await _send_prompt_text(
+            message,
+            state,
+            t("promocode.admin.import_file_invalid"),
+            promocode_input_keyboard(event_id),
+        )
+        await safe_delete(message)
+        return
+    services = get_services()
     try:
-        await services.promocodes.create_promocode(event_id, code, value, None)
-    except ValueError as e:
+        buffer = await message.bot.download(document)
+        result = await services.promocodes.import_promocodes(
+            event_id, buffer.getvalue(), discount, data.get("promocode_max_uses")
+        )
+    except UnicodeDecodeError:
         await _send_prompt_text(
             message,
             state,
-            str(e),
+            t("promocode.admin.import_file_invalid"),
             promocode_input_keyboard(event_id),
         )
         await safe_delete(message)
         return
+    await _finish_bulk_promocodes(message, state, event_id, result, f"promocodes_{event_id}_import.csv")
+
+
+async def _finish_bulk_promocodes(
+    message: Message,
+    state: FSMContext,
+    event_id: int,
+    result: BulkPromocodeResult,
+    filename: str,
+) -> None:
+    logger.info(
+        f"Bulk promocodes for event {event_id}: created={len(result.created)}, "
+        f"existing={len(result.existing)}, invalid={len(result.invalid)}"
+    )
     await _remove_prompt_message(message, state)
     await safe_delete(message)
     data = await state.get_data()
@@ -1244,11 +1437,17 @@ async def process_promocode_discount_input(message: Message, state: FSMContext)
         edit_event_id=event_id,
         edit_stack=existing_stack,
     )
-    normalized_code = code.strip().upper()
+    await message.answer_document(BufferedInputFile(result.to_csv(), filename=filename))
     await _send_prompt_text(
         message,
         state,
-        t("promocode.admin.add_success", code=normalized_code, discount=f"{value:.0f}"),
+        t(
+            "promocode.admin.bulk_done",
+            discount=f"{result.discount:.0f}",
+            created=len(result.created),
+            existing=len(result.existing),
+            invalid=len(result.invalid),
+        ),
         manage_promocode_actions_keyboard(event_id),
     )
 
@@ -1266,7 +1465,7 @@ async def start_delete_promocode(callback: CallbackQuery, state: FSMContext) ->
         return
     event_id = int(parts[2])
     services = get_services()
-    promocodes = await services.promocodes.list_promocodes(event_id)
+    promocodes = await services.promocodes.list_promocodes(event_id, limit=1)
     if not promocodes:
         if callback.message:
             sent = await _send_prompt_text(
@@ -1448,7 +1647,6 @@ async def edit_back(callback: CallbackQuery, state: FSMContext) -> None:
 
 @router.message(EditEventState.value_input)
 async def process_edit_value(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     data = await state.get_data()
     event_id = data.get("edit_event_id")
     field = data.get("edit_field")
@@ -1506,7 +1704,6 @@ async def process_edit_value(message: Message, state: FSMContext) -> None:
 
 @router.message(EditEventState.image_upload)
 async def process_edit_images(message: Message, state: FSMContext) -> None:
-    remember_user_message(message)
     data = await state.get_data()
     images = list(data.get("new_image_file_ids", []))
     if message.photo:
@@ -1816,13 +2013,7 @@ async def _notify_event_update(message: Message, state: FSMContext, event: Event
     editor_chat_id = message.chat.id
     broadcast_text = notice
     markup = new_event_notification_keyboard(event.id)
-    for telegram_id in telegram_ids:
-        if telegram_id == editor_chat_id:
-            continue
-        try:
-            await bot.send_message(telegram_id, broadcast_text, reply_markup=markup)
-        except Exception:
-            continue
+    await send_to_all(bot, telegram_ids, broadcast_text, markup, kind="event_update", exclude=editor_chat_id)
 
 
 async def _notify_cancellation(callback: CallbackQuery, event: Event) -> None:
@@ -1831,11 +2022,7 @@ async def _notify_cancellation(callback: CallbackQuery, event: Event) -> None:
     telegram_ids = await services.registrations.list_participant_telegram_ids(event.id)
     cancel_text = t("notify.event_cancelled", title=event.title)
     markup = hide_message_keyboard()
-    for telegram_id in telegram_ids:
-        try:
-            await bot.send_message(telegram_id, cancel_text, reply_markup=markup)
-        except Exception:
-            continue
+    await send_to_all(bot, telegram_ids, cancel_text, markup, kind="cancellation")
 
 
 async def _prompt_create_state(message: Message, state: FSMContext, target_state: Any) -> None:
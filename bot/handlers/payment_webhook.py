@@ -1,16 +1,41 @@
+import hmac
 import json
 import logging
+import time
 
+from aiogram import Bot
 from aiohttp import web
 from aiohttp.web_request import Request
 from aiohttp.web_response import Response
 
-from bot.utils.di import get_config, get_services
+from bot.services.payment_processor import PaymentAmountMismatchError
+from bot.utils.di import get_services
+from bot.utils.metrics import Histogram, render_metrics
 
 logger = logging.getLogger(__name__)
 
+BOT_KEY = web.AppKey("bot", Bot)
+METRICS_TOKEN_KEY = web.AppKey("metrics_token", str)
+
+PAYMENT_EVENTS = frozenset({"payment.succeeded", "payment.canceled", "payment.waiting_for_capture"})
+REFUND_EVENTS = frozenset({"refund.succeeded", "refund.canceled"})
+
+PAYMENT_WEBHOOK_SECONDS = Histogram(
+    "payment_webhook_seconds",
+    "YooKassa notification handling time, by event and response status.",
+    ("event", "status"),
+)
+
 
 async def yookassa_webhook_handler(request: Request) -> Response:
+    started = time.monotonic()
+    response = await _handle_yookassa_webhook(request)
+    event = request.get("yookassa_event") or "unknown"
+    PAYMENT_WEBHOOK_SECONDS.observe(time.monotonic() - started, event=event, status=str(response.status))
+    return response
+
+
+async def _handle_yookassa_webhook(request: Request) -> Response:
     logger.info(f"Received {request.method} request to {request.path_qs}")
     logger.info(f"Headers: {dict(request.headers)}")
 
@@ -27,141 +52,49 @@ async def yookassa_webhook_handler(request: Request) -> Response:
         logger.info(f"Received webhook: {json.dumps(data, ensure_ascii=False)}")
         
         event = data.get("event")
-        payment_object = data.get("object", {})
+        request["yookassa_event"] = event if event in PAYMENT_EVENTS or event in REFUND_EVENTS else "other"
+        notification_object = data.get("object", {})
 
         logger.info(f"Webhook event: {event}")
 
-        if event != "payment.succeeded":
+        if event not in PAYMENT_EVENTS and event not in REFUND_EVENTS:
             logger.info(f"Ignoring event: {event}")
             return web.json_response({"status": "ok"})
 
-        payment_id = payment_object.get("id")
-        if not payment_id:
-            logger.warning("Payment ID not found in webhook data")
-            return web.json_response({"status": "error", "message": "payment_id not found"}, status=400)
-
-        logger.info(f"Processing payment: {payment_id}")
+        object_id = notification_object.get("id")
+        if not object_id:
+            logger.warning("Object ID not found in webhook data")
+            return web.json_response({"status": "error", "message": "object id not found"}, status=400)
 
         services = get_services()
-        
-        existing_payment = await services.payments.get_payment(payment_id)
-        if existing_payment and existing_payment.status == "succeeded":
-            logger.info(f"Payment {payment_id} already processed, skipping")
-            return web.json_response({"status": "ok"})
 
-        payment = await services.payments.handle_webhook(payment_id)
-
-        if payment is None:
-            logger.warning(f"Payment {payment_id} not found in database, trying to create from webhook data")
-            metadata = payment_object.get("metadata", {})
-            event_id_str = metadata.get("event_id")
-            user_id_str = metadata.get("user_id")
-            
-            if event_id_str and user_id_str:
-                try:
-                    event_id = int(event_id_str)
-                    user_id = int(user_id_str)
-                    amount_value = payment_object.get("amount", {}).get("value", "0")
-                    amount = float(amount_value)
-                    confirmation_url = None
-                    confirmation = payment_object.get("confirmation")
-                    if confirmation:
-                        confirmation_url = confirmation.get("confirmation_url")
-                    
-                    logger.info(f"Creating payment from webhook: payment_id={payment_id}, event_id={event_id}, user_id={user_id}, amount={amount}")
-                    from bot.database.repositories.payments import PaymentRepository
-                    from bot.database.pool import get_pool
-                    pool = get_pool()
-                    repo = PaymentRepository(pool)
-                    await repo.create(
-                        payment_id=payment_id,
-                        event_id=event_id,
-                        user_id=user_id,
-                        amount=amount,
-                        confirmation_url=confirmation_url,
-                        payment_message_id=None,
-                    )
-                    logger.info(f"Payment created from webhook data: {payment_id}")
-                    payment = await services.payments.handle_webhook(payment_id)
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Failed to create payment from webhook data: {e}")
-                    return web.json_response({"status": "error", "message": "invalid metadata"}, status=400)
-            
-            if payment is None:
-                logger.warning(f"Payment {payment_id} not found in database and could not be created from webhook")
+        if event in REFUND_EVENTS:
+            logger.info(f"Processing refund: {object_id}")
+            sync = await services.payment_processor.process_refund(object_id)
+            if sync is None:
+                logger.warning(f"Refund {object_id} could not be matched to a payment")
                 return web.json_response({"status": "error", "message": "payment not found"}, status=404)
+            logger.info(f"Payment {sync.payment.payment_id} status: {sync.payment.status}, changed={sync.changed}")
+            return web.json_response({"status": "ok"})
 
-        logger.info(f"Payment {payment_id} status: {payment.status}")
-
-        if payment.status == "succeeded":
-            event_obj = await services.events.get_event(payment.event_id)
-            if event_obj:
-                expected_amount = event_obj.cost or 0.0
-                discount = await services.promocodes.get_user_discount(payment.event_id, payment.user_id)
-                expected_amount = max(expected_amount - discount, 0.0)
-                
-                if abs(payment.amount - expected_amount) > 0.01:
-                    logger.error(
-                        f"Payment amount mismatch: expected {expected_amount}, got {payment.amount} "
-                        f"for payment {payment_id}, event {payment.event_id}, user {payment.user_id}"
-                    )
-                    return web.json_response({"status": "error", "message": "amount mismatch"}, status=400)
-            
-            participants = await services.registrations.list_participants(payment.event_id)
-            is_already_registered = any(p.user_id == payment.user_id for p in participants)
-            
-            if is_already_registered:
-                logger.info(
-                    f"Participant {payment.user_id} already registered for event {payment.event_id}, will only send success notification"
-                )
-            else:
-                logger.info(
-                    f"Payment succeeded, registering participant for event {payment.event_id}, user {payment.user_id}"
-                )
-                await services.registrations.add_participant(payment.event_id, payment.user_id)
-                logger.info("Participant registered successfully")
-
-            try:
-                user = await services.users.get_by_id(payment.user_id)
-                if user and user.telegram_id:
-                    from aiogram import Bot
-                    from aiogram.client.default import DefaultBotProperties
-                    from aiogram.enums import ParseMode
-                    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-                    from bot.utils.callbacks import event_view
-                    from bot.utils.i18n import t
-
-                    config = get_config()
-                    bot = Bot(token=config.bot.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-                    try:
-                        event_obj = await services.events.get_event(payment.event_id)
-                        if event_obj:
-                            if payment.payment_message_id:
-                                try:
-                                    await bot.delete_message(user.telegram_id, payment.payment_message_id)
-                                    logger.info(f"Deleted payment message {payment.payment_message_id}")
-                                except Exception as e:
-                                    logger.warning(f"Failed to delete payment message: {e}")
-
-                            logger.info(f"Sending success notification to user {user.telegram_id}")
-                            markup = InlineKeyboardMarkup(
-                                inline_keyboard=[
-                                    [InlineKeyboardButton(text=t("button.back"), callback_data=event_view(payment.event_id))],
-                                ]
-                            )
-                            await bot.send_message(
-                                user.telegram_id,
-                                t("payment.success", title=event_obj.title),
-                                reply_markup=markup,
-                            )
-                            logger.info(f"Success notification sent")
-                    finally:
-                        await bot.session.close()
-                else:
-                    logger.warning(f"User {payment.user_id} not found or has no telegram_id")
-            except Exception as e:
-                logger.error(f"Failed to send payment success notification: {e}", exc_info=True)
-
+        logger.info(f"Processing payment: {object_id}")
+        try:
+            sync = await services.payment_processor.process_payment(
+                request.app[BOT_KEY],
+                object_id,
+                notification_object,
+            )
+        except PaymentAmountMismatchError:
+            return web.json_response({"status": "error", "message": "amount mismatch"}, status=400)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Failed to create payment from webhook data: {e}")
+            return web.json_response({"status": "error", "message": "invalid metadata"}, status=400)
+
+        if sync is None:
+            logger.warning(f"Payment {object_id} not found in database and could not be created from webhook")
+            return web.json_response({"status": "error", "message": "payment not found"}, status=404)
+
+        logger.info(f"Payment {object_id} status: {sync.payment.status}, changed={sync.changed}")
         return web.json_response({"status": "ok"})
 
     except Exception as e:
@@ -174,11 +107,22 @@ async def health_check_handler(request: Request) -> Response:
     return web.json_response({"status": "ok"})
 
 
-def setup_webhook_app() -> web.Application:
+async def metrics_handler(request: Request) -> Response:
+    token = request.app.get(METRICS_TOKEN_KEY)
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return web.Response(status=401)
+    return web.Response(body=render_metrics().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def setup_webhook_app(bot: Bot, metrics_token: str | None = None) -> web.Application:
     app = web.Application()
+    app[BOT_KEY] = bot
+    if metrics_token:
+        app[METRICS_TOKEN_KEY] = metrics_token
     app.router.add_get("/yookassa_payment", health_check_handler)
     app.router.add_post("/yookassa_payment", yookassa_webhook_handler)
-    logger.info("Webhook routes registered: GET /yookassa_payment, POST /yookassa_payment")
+    app.router.add_get("/metrics", metrics_handler)
+    logger.info("Webhook routes registered: GET /yookassa_payment, POST /yookassa_payment, GET /metrics")
     
     access_logger = logging.getLogger("aiohttp.access")
     access_logger.setLevel(logging.WARNING)
@@ -8,7 +8,7 @@ from aiogram.types import CallbackQuery, Message
 from bot.keyboards import main_menu_keyboard
 from bot.utils.callbacks import START_MAIN_MENU
 from bot.utils.di import get_config, get_services
-from bot.utils.messaging import remember_user_message, safe_answer_callback, safe_delete, send_or_edit
+from bot.utils.messaging import safe_answer_callback, safe_delete, send_or_edit
 from bot.utils.i18n import t
 
 router = Router()
@@ -16,7 +16,6 @@ router = Router()
 
 @router.message(CommandStart())
 async def handle_start(message: Message) -> None:
-    remember_user_message(message)
     services = get_services()
     tg_user = message.from_user
     if tg_user is None:
@@ -31,4 +31,8 @@ class PromocodeState(StatesGroup):
 class PromocodeAdminState(StatesGroup):
     action = State()
     code_input = State()
-    discount_input = State()
\ No newline at end of file
+    discount_input = State()
+    max_uses_input = State()
+    bulk_discount_input = State()
+    bulk_count_input = State()
+    import_file = State()
\ No newline at end of file
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import secrets
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.web_request import Request
+from aiohttp.web_response import Response
+
+from config import TelegramWebhookConfig
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramWebhookHandler:
+    """Accepts Telegram updates on the aiohttp app and handles each one in a background task.
+
+    Telegram gets its 200 as soon as the update is parsed, so a slow handler never
+    holds the connection open or triggers a redelivery.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, config: TelegramWebhookConfig) -> None:
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._config = config
+        self._tasks: set[asyncio.Task[Any]] = set()
+
+    def register(self, app: web.Application) -> None:
+        app.router.add_post(self._config.path, self.handle)
+        app.on_shutdown.append(self._drain)
+        logger.info(f"Webhook route registered: POST {self._config.path}")
+
+    async def set_webhook(self) -> None:
+        await self._bot.set_webhook(
+            url=self._config.url,
+            secret_token=self._config.secret_token,
+            allowed_updates=self._dispatcher.resolve_used_update_types(),
+        )
+        logger.info(f"Telegram webhook set to {self._config.url}")
+
+    async def handle(self, request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not secrets.compare_digest(token, self._config.secret_token):
+            logger.warning(f"Rejected Telegram webhook request from {request.remote}: bad secret token")
+            return web.json_response({"status": "error", "message": "unauthorized"}, status=401)
+        try:
+            update = await request.json(loads=self._bot.session.json_loads)
+        except ValueError as e:
+            logger.error(f"Failed to parse Telegram update: {e}")
+            return web.json_response({"status": "error", "message": "invalid json"}, status=400)
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({})
+
+    async def _process(self, update: dict[str, Any]) -> None:
+        try:
+            await self._dispatcher.feed_raw_update(self._bot, update)
+        except Exception as e:
+            logger.error(f"Error handling Telegram update {update.get('update_id')}: {e}", exc_info=True)
+
+    async def _drain(self, app: web.Application) -> None:
+        # Let updates already acknowledged to Telegram finish; it will not resend them.
+        if not self._tasks:
+            return
+        logger.info(f"Waiting for {len(self._tasks)} Telegram updates in progress")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=self._config.drain_timeout_seconds)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Cancelled {len(pending)} Telegram updates still running at shutdown")
+
+
+def setup_telegram_webhook(
+    app: web.Application,
+    dispatcher: Dispatcher,
+    bot: Bot,
+    config: TelegramWebhookConfig,
+) -> TelegramWebhookHandler:
+    handler = TelegramWebhookHandler(dispatcher, bot, config)
+    handler.register(app)
+    return handler
@@ -15,6 +15,7 @@ from .settings import (
     manage_promocode_actions_keyboard,
     participants_list_keyboard,
     promocode_input_keyboard,
+    promocode_max_uses_keyboard,
     promocode_list_keyboard,
     moderator_settings_keyboard,
 )
@@ -36,6 +37,7 @@ __all__ = [
     "manage_event_actions_keyboard",
     "manage_promocode_actions_keyboard",
     "promocode_input_keyboard",
+    "promocode_max_uses_keyboard",
     "promocode_list_keyboard",
     "cancel_event_keyboard",
     "edit_field_choice_keyboard",
@@ -123,6 +123,8 @@ def manage_promocode_actions_keyboard(event_id: int):
     builder.button(text=t("button.promocode.add"), callback_data=f"promocode:add:{event_id}")
     builder.button(text=t("button.promocode.delete"), callback_data=f"promocode:delete:{event_id}")
     builder.button(text=t("button.promocode.list"), callback_data=f"promocode:list:{event_id}")
+    builder.button(text=t("button.promocode.generate"), callback_data=f"promocode:generate:{event_id}")
+    builder.button(text=t("button.promocode.import"), callback_data=f"promocode:import:{event_id}")
     builder.button(text=t("button.back"), callback_data=EDIT_EVENT_BACK)
     builder.adjust(1)
     return builder.as_markup()
@@ -135,6 +137,14 @@ def promocode_input_keyboard(event_id: int):
     return builder.as_markup()
 
 
+def promocode_max_uses_keyboard(event_id: int):
+    builder = InlineKeyboardBuilder()
+    builder.button(text=t("button.promocode.unlimited"), callback_data=f"promocode:unlimited:{event_id}")
+    builder.button(text=t("button.back"), callback_data=f"promocode:back_menu:{event_id}")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
 def promocode_list_keyboard(event_id: int):
     builder = InlineKeyboardBuilder()
     builder.button(text=t("button.back"), callback_data=f"promocode:menu:{event_id}")
@@ -0,0 +1,118 @@
+import logging
+from collections import Counter as CallCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from bot.middleware.metrics import handler_labels
+from bot.utils.metrics import Counter, Histogram
+from bot.utils.tasks import collect_spawned
+
+logger = logging.getLogger(__name__)
+
+HANDLER_API_CALLS = Histogram(
+    "handler_api_calls",
+    "Telegram Bot API calls made while handling one update, by handler.",
+    ("router", "handler"),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+)
+API_BUDGET_EXCEEDED = Counter(
+    "handler_api_budget_exceeded_total",
+    "Updates whose handler made more Telegram API calls than the configured budget.",
+    ("router", "handler"),
+)
+
+
+class ApiCallTally:
+    """Bot API calls made under one tracking scope, by method name."""
+
+    def __init__(self, parent: Optional["ApiCallTally"] = None) -> None:
+        self.parent = parent
+        self.calls: CallCounter[str] = CallCounter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def add(self, method: str) -> None:
+        tally: Optional[ApiCallTally] = self
+        while tally is not None:
+            tally.calls[method] += 1
+            tally = tally.parent
+
+    def summary(self) -> str:
+        return ", ".join(f"{method}={count}" for method, count in self.calls.most_common())
+
+
+_current_tally: ContextVar[Optional[ApiCallTally]] = ContextVar("api_call_tally", default=None)
+
+
+@contextmanager
+def track_api_calls() -> Iterator[ApiCallTally]:
+    """Counts every Bot API call made in this context and in tasks started from it.
+
+    Scopes nest: an outer tally also sees the calls counted by inner ones, so a test can
+    wrap feed_update and assert on the total while the per-handler budget still applies.
+    Calls from started tasks land when those tasks run; collect_spawned() can wait for them.
+    """
+    tally = ApiCallTally(_current_tally.get())
+    token = _current_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _current_tally.reset(token)
+
+
+class ApiCallCountingMiddleware(BaseRequestMiddleware):
+    """Bot session hook that charges each outgoing call to the tally of the current context.
+
+    Registered after the edit dedup hook, so only calls that actually reach Telegram count.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> TelegramType:
+        tally = _current_tally.get()
+        if tally is not None:
+            tally.add(type(method).__name__)
+        return await make_request(bot, method)
+
+
+class ApiCallBudgetMiddleware(BaseMiddleware):
+    """Inner middleware recording how many API calls each handler made, warning above budget.
+
+    Background work the handler spawned, such as message cleanup, is charged to it too,
+    so the count is taken once those tasks have finished.
+    """
+
+    def __init__(self, budget: int) -> None:
+        self._budget = budget
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with track_api_calls() as tally, collect_spawned() as spawned:
+            try:
+                return await handler(event, data)
+            finally:
+                spawned.when_done(lambda: self._account(handler, data, tally))
+
+    def _account(self, handler: Callable[..., Any], data: dict[str, Any], tally: ApiCallTally) -> None:
+        router, name = handler_labels(handler, data)
+        total = tally.total
+        HANDLER_API_CALLS.observe(total, router=router, handler=name)
+        if total > self._budget:
+            API_BUDGET_EXCEEDED.inc(router=router, handler=name)
+            logger.warning(f"Handler {router}.{name} made {total} Telegram API calls (budget {self._budget}): {tally.summary()}")
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    DeleteMessage,
+    DeleteMessages,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendAnimation,
+    SendDocument,
+    SendMessage,
+    SendPhoto,
+    SendVideo,
+    TelegramMethod,
+)
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message
+
+from bot.utils.metrics import Counter
+
+NOT_MODIFIED = "message is not modified"
+
+EDITS_SKIPPED = Counter(
+    "telegram_edits_skipped_total",
+    "Edits dropped locally because the message already shows exactly that content.",
+    ("method",),
+)
+
+_EDITS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup, EditMessageMedia)
+_MEDIA_FIELDS = {SendPhoto: "photo", SendVideo: "video", SendAnimation: "animation", SendDocument: "document"}
+
+MessageKey = tuple[Union[int, str], Union[int, str]]
+
+
+@dataclass(frozen=True, slots=True)
+class _Rendered:
+    body: int
+    markup: int
+    # file_id of the attached media; None for text messages or uploads without one yet.
+    media: Optional[str] = None
+
+
+class SkipUnchangedEditsMiddleware(BaseRequestMiddleware):
+    """Bot session hook that answers a no-op edit locally instead of calling Telegram.
+
+    Remembers a hash of the text/caption, keyboard and media last rendered into each
+    message. An edit that would change none of them raises the same "message is not
+    modified" error Telegram would, which every caller already handles.
+
+    The record is per process, so it is only correct while one instance sends every
+    edit; bot.py leaves it out in webhook mode.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self._max_entries = max_entries
+        self._rendered: OrderedDict[MessageKey, _Rendered] = OrderedDict()
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> TelegramType:
+        if isinstance(method, (DeleteMessage, DeleteMessages)):
+            self._forget(method)
+            return await make_request(bot, method)
+        if not isinstance(method, _EDITS):
+            result = await make_request(bot, method)
+            if isinstance(result, Message):
+                rendered = _sent(method)
+                if rendered is not None:
+                    self._remember((result.chat.id, result.message_id), rendered)
+            return result
+        key = _edit_key(method)
+        current = self._rendered.get(key)
+        target = _edited(method, current)
+        if current is not None and target == current:
+            EDITS_SKIPPED.inc(method=type(method).__name__)
+            self._rendered.move_to_end(key)
+            raise TelegramBadRequest(
+                method=method,
+                message=f"Bad Request: {NOT_MODIFIED}: specified new message content and reply markup "
+                "are exactly the same as a current content and reply markup of the message",
+            )
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            # Telegram confirmed what the message shows, so the next identical edit stays local.
+            if NOT_MODIFIED in str(e) and target is not None:
+                self._remember(key, target)
+            else:
+                self._rendered.pop(key, None)
+            raise
+        except BaseException:
+            # Network errors, timeouts and cancellation leave it unknown whether the edit landed.
+            self._rendered.pop(key, None)
+            raise
+        if target is not None:
+            self._remember(key, target)
+        else:
+            self._rendered.pop(key, None)
+        return result
+
+    def _remember(self, key: MessageKey, rendered: _Rendered) -> None:
+        self._rendered[key] = rendered
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > self._max_entries:
+            self._rendered.popitem(last=False)
+
+    def _forget(self, method: Union[DeleteMessage, DeleteMessages]) -> None:
+        ids = (method.message_id,) if isinstance(method, DeleteMessage) else method.message_ids
+        for message_id in ids:
+            self._rendered.pop((method.chat_id, message_id), None)
+
+
+def _edit_key(method: Any) -> MessageKey:
+    if method.inline_message_id:
+        return ("inline", method.inline_message_id)
+    return (method.chat_id, method.message_id)
+
+
+def _content_hash(text: Optional[str], parse_mode: Any, entities: Any) -> int:
+    return hash((text, repr(parse_mode), repr(entities)))
+
+
+def _markup_hash(markup: Any) -> int:
+    return hash(markup.model_dump_json(exclude_none=True) if markup is not None else None)
+
+
+def _sent(method: Any) -> Optional[_Rendered]:
+    if isinstance(method, SendMessage):
+        return _Rendered(_content_hash(method.text, method.parse_mode, method.entities), _markup_hash(method.reply_markup))
+    field = _MEDIA_FIELDS.get(type(method))
+    if field is not None:
+        media = getattr(method, field)
+        return _Rendered(
+            _content_hash(method.caption, method.parse_mode, method.caption_entities),
+            _markup_hash(method.reply_markup),
+            media if isinstance(media, str) else None,
+        )
+    return None
+
+
+def _edited(method: Any, current: Optional[_Rendered]) -> Optional[_Rendered]:
+    """What the message shows after this edit succeeds, or None when that cannot be known."""
+    markup = _markup_hash(method.reply_markup)
+    if isinstance(method, EditMessageText):
+        return _Rendered(_content_hash(method.text, method.parse_mode, method.entities), markup)
+    if isinstance(method, EditMessageMedia):
+        media = method.media
+        file_id = media.media if isinstance(media.media, str) else None
+        if file_id is None:
+            return None
+        return _Rendered(_content_hash(media.caption, media.parse_mode, media.caption_entities), markup, file_id)
+    if current is None:
+        return None
+    if isinstance(method, EditMessageCaption):
+        return replace(current, body=_content_hash(method.caption, method.parse_mode, method.caption_entities), markup=markup)
+    return replace(current, markup=markup)
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 from typing import Any, Awaitable, Callable
@@ -8,6 +7,7 @@ from aiogram.types import CallbackQuery, TelegramObject
 
 from bot.utils.i18n import t
 from bot.utils.events import has_event_started
+from bot.utils.tasks import spawn
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +63,7 @@ class MessageRefreshMiddleware(BaseMiddleware):
                         should_refresh = await self._should_refresh(event)
                         if should_refresh:
                             logger.info(f"[MIDDLEWARE] Message needs refresh, scheduling refresh task")
-                            asyncio.create_task(self._refresh_message(event))
+                            spawn(self._refresh_message(event), kind="message_refresh")
         
         start_time = datetime.now()
         try:
@@ -0,0 +1,40 @@
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.enums import ChatType
+from aiogram.methods import DeleteMessage, DeleteMessages, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message
+
+from bot.services.message_registry import MessageRegistry
+
+
+class MessageTrackingMiddleware(BaseRequestMiddleware):
+    """Bot session hook that feeds every message sent to a private chat into the registry."""
+
+    def __init__(self, registry: MessageRegistry) -> None:
+        self._registry = registry
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> TelegramType:
+        # The session returns the call's result directly; failed calls raise before we get here.
+        result = await make_request(bot, method)
+        if isinstance(method, DeleteMessage):
+            self._registry.forget(int(method.chat_id), (method.message_id,))
+        elif isinstance(method, DeleteMessages):
+            self._registry.forget(int(method.chat_id), method.message_ids)
+        else:
+            await self._record(result)
+        return result
+
+    async def _record(self, result: Any) -> None:
+        # send_media_group returns a list; edits return the same message again, which the registry skips.
+        messages = result if isinstance(result, list) else (result,)
+        sent = [message for message in messages if isinstance(message, Message)]
+        if sent and sent[0].chat.type == ChatType.PRIVATE:
+            await self._registry.record(sent[0].chat.id, [message.message_id for message in sent])
@@ -0,0 +1,88 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from bot.utils.metrics import Counter, Histogram
+
+UPDATES = Counter(
+    "updates_total",
+    "Updates received, by type and outcome.",
+    ("type", "outcome"),
+)
+UPDATE_SECONDS = Histogram(
+    "update_seconds",
+    "Time from an update entering the dispatcher to its handler returning.",
+    ("type",),
+)
+HANDLER_SECONDS = Histogram(
+    "handler_seconds",
+    "Handler latency by router module, handler and callback data prefix.",
+    ("router", "handler", "prefix"),
+)
+HANDLER_ERRORS = Counter(
+    "handler_errors_total",
+    "Handlers that raised, by router module and handler.",
+    ("router", "handler"),
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware counting every update and how long it took end to end."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = "unhandled" if result is UNHANDLED else "handled"
+            return result
+        finally:
+            UPDATES.inc(type=update_type, outcome=outcome)
+            UPDATE_SECONDS.observe(time.monotonic() - started, type=update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware timing the handler that matched, labelled by where it lives."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        router, name = handler_labels(handler, data)
+        prefix = callback_prefix(event.data) if isinstance(event, CallbackQuery) else ""
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(router=router, handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.monotonic() - started, router=router, handler=name, prefix=prefix)
+
+
+def handler_labels(handler: Callable[..., Any], data: dict[str, Any]) -> tuple[str, str]:
+    """Router module and function name of the handler that matched this event."""
+    handler_object: HandlerObject | None = data.get("handler")
+    callback = handler_object.callback if handler_object else handler
+    router = getattr(callback, "__module__", "unknown").rsplit(".", 1)[-1]
+    return router, getattr(callback, "__name__", "unknown")
+
+
+def callback_prefix(data: str | None) -> str:
+    # "event:payment:method:42:sbp" -> "event:payment:method:id:sbp": ids anywhere in the
+    # data would make one series per event, page or message.
+    if not data:
+        return ""
+    return ":".join("id" if part.lstrip("-").isdigit() else part for part in data.split(":"))
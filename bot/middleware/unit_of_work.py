@@ -0,0 +1,19 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.database.unit_of_work import unit_of_work
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # Every repository call made while handling this update shares one pooled
+        # connection, acquired on first use and released when the update is done.
+        async with unit_of_work():
+            return await handler(event, data)
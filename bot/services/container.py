@@ -2,10 +2,15 @@ from dataclasses import dataclass
 
 from config import Config
 from .event_service import EventService, build_event_service
+from .message_registry import MessageRegistry, build_message_registry
+from .payment_processor import PaymentProcessor, build_payment_processor
 from .payment_service import PaymentService, build_payment_service
 from .promocode_service import PromocodeService, build_promocode_service
+from .reconciliation_service import ReconciliationService, build_reconciliation_service
+from .refund_service import RefundService, build_refund_service
 from .registration_service import RegistrationService, build_registration_service
 from .reminder_service import ReminderService, build_reminder_service
+from .retention_service import RetentionService, build_retention_service
 from .user_service import UserService, build_user_service
 
 
@@ -17,6 +22,11 @@ class ServiceContainer:
     reminders: ReminderService
     payments: PaymentService
     promocodes: PromocodeService
+    payment_processor: PaymentProcessor
+    reconciliation: ReconciliationService
+    refunds: RefundService
+    retention: RetentionService
+    message_registry: MessageRegistry
 
 
 def build_services(config: Config) -> ServiceContainer:
@@ -26,6 +36,11 @@ def build_services(config: Config) -> ServiceContainer:
     reminders = build_reminder_service(events, registrations, config.reminders)
     payments = build_payment_service(config.yookassa)
     promocodes = build_promocode_service(events)
+    payment_processor = build_payment_processor(payments, events, registrations, users, promocodes)
+    reconciliation = build_reconciliation_service(payments, payment_processor, config.reconciliation)
+    refunds = build_refund_service(payments, events, config.refunds)
+    retention = build_retention_service(config.retention)
+    message_registry = build_message_registry(config.message_registry)
     return ServiceContainer(
         users=users,
         events=events,
@@ -33,5 +48,10 @@ def build_services(config: Config) -> ServiceContainer:
         reminders=reminders,
         payments=payments,
         promocodes=promocodes,
+        payment_processor=payment_processor,
+        reconciliation=reconciliation,
+        refunds=refunds,
+        retention=retention,
+        message_registry=message_registry,
     )
 
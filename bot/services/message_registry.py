@@ -0,0 +1,118 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+
+import asyncpg
+
+from config import MessageRegistryConfig
+from bot.database.pool import get_pool
+from bot.database.repositories.bot_messages import BotMessageRepository
+from bot.utils.constants import DELETABLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_PURGE_BATCH_SIZE = 1000
+
+
+class MessageRegistry:
+    """Ids of messages the bot sent to each private chat, so cleanup deletes exactly those.
+
+    Filled by the Bot session hook. Each chat keeps a bounded ring buffer in memory;
+    with persistence on, the table is the source of truth and the buffers are a
+    write-through copy, which keeps cleanup working after a restart and when another
+    instance sent the messages.
+    """
+
+    def __init__(self, repository: Optional[BotMessageRepository], config: MessageRegistryConfig) -> None:
+        self._repository = repository
+        self._config = config
+        self._chats: OrderedDict[int, deque[tuple[int, float]]] = OrderedDict()
+
+    async def record(self, chat_id: int, message_ids: Iterable[int]) -> None:
+        buffer = self._buffer(chat_id)
+        known = {message_id for message_id, _ in buffer}
+        new_ids = [message_id for message_id in message_ids if message_id not in known]
+        if not new_ids:
+            return
+        now = time.time()
+        buffer.extend((message_id, now) for message_id in new_ids)
+        if self._repository is None:
+            return
+        try:
+            await self._repository.add_many(chat_id, new_ids)
+        except (asyncpg.PostgresError, OSError, TimeoutError) as e:
+            # Losing a tracked id only means one message survives a cleanup.
+            logger.warning(f"Failed to persist sent message ids for chat {chat_id}: {e}")
+
+    def forget(self, chat_id: int, message_ids: Iterable[int]) -> None:
+        buffer = self._chats.get(chat_id)
+        if not buffer:
+            return
+        gone = set(message_ids)
+        kept = [item for item in buffer if item[0] not in gone]
+        if len(kept) != len(buffer):
+            buffer.clear()
+            buffer.extend(kept)
+
+    async def take(
+        self,
+        chat_id: int,
+        up_to_message_id: int,
+        limit: int,
+        exclude: Iterable[Optional[int]] = (),
+    ) -> list[int]:
+        excluded = {message_id for message_id in exclude if message_id}
+        buffer = self._chats.get(chat_id)
+        deletable_after = time.time() - DELETABLE_SECONDS
+        local = sorted(
+            (
+                message_id
+                for message_id, sent_at in (buffer or ())
+                if message_id <= up_to_message_id and message_id not in excluded and sent_at > deletable_after
+            ),
+            reverse=True,
+        )[:limit]
+        if self._repository is not None:
+            try:
+                taken = await self._repository.take(
+                    chat_id, up_to_message_id, limit, sorted(excluded), DELETABLE_SECONDS
+                )
+            except (asyncpg.PostgresError, OSError, TimeoutError) as e:
+                logger.warning(f"Failed to read sent message ids for chat {chat_id}, using local ones: {e}")
+            else:
+                local = sorted(set(local) | set(taken), reverse=True)[:limit]
+        self.forget(chat_id, local)
+        return local
+
+    async def purge_expired(self) -> int:
+        cutoff = time.time() - DELETABLE_SECONDS
+        for chat_id in list(self._chats):
+            buffer = self._chats[chat_id]
+            while buffer and buffer[0][1] <= cutoff:
+                buffer.popleft()
+            if not buffer:
+                del self._chats[chat_id]
+        if self._repository is None:
+            return 0
+        removed = 0
+        while True:
+            count = await self._repository.delete_older_than(DELETABLE_SECONDS, _PURGE_BATCH_SIZE)
+            removed += count
+            if count < _PURGE_BATCH_SIZE:
+                return removed
+
+    def _buffer(self, chat_id: int) -> deque[tuple[int, float]]:
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            buffer = self._chats[chat_id] = deque(maxlen=self._config.per_chat)
+            while len(self._chats) > self._config.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return buffer
+
+
+def build_message_registry(config: MessageRegistryConfig) -> MessageRegistry:
+    repository = BotMessageRepository(get_pool()) if config.persist else None
+    return MessageRegistry(repository, config)
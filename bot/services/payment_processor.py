@@ -0,0 +1,151 @@
+import logging
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.database.replica import primary_only
+from bot.database.repositories.payments import Payment as PaymentModel
+from bot.services.event_service import EventService
+from bot.services.payment_service import PaymentService, PaymentSync
+from bot.services.promocode_service import PromocodeService
+from bot.services.registration_service import RegistrationService
+from bot.services.user_service import UserService
+from bot.utils.callbacks import event_view
+from bot.utils.i18n import t
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentAmountMismatchError(ValueError):
+    pass
+
+
+class PaymentProcessor:
+    def __init__(
+        self,
+        payments: PaymentService,
+        events: EventService,
+        registrations: RegistrationService,
+        users: UserService,
+        promocodes: PromocodeService,
+    ) -> None:
+        self._payments = payments
+        self._events = events
+        self._registrations = registrations
+        self._users = users
+        self._promocodes = promocodes
+
+    async def process_payment(
+        self,
+        bot: Bot,
+        payment_id: str,
+        payment_object: Optional[dict[str, Any]] = None,
+    ) -> Optional[PaymentSync]:
+        # Settling a payment checks the discount and registration it was priced against,
+        # so every read in it must see the primary.
+        with primary_only():
+            sync = await self._payments.sync_payment(payment_id)
+            if sync is None and payment_object:
+                if await self._record_from_object(payment_id, payment_object):
+                    sync = await self._payments.sync_payment(payment_id)
+            return await self._after_sync(bot, sync)
+
+    async def apply_payment_status(self, bot: Bot, payment_id: str, remote_status: str) -> Optional[PaymentSync]:
+        with primary_only():
+            sync = await self._payments.apply_payment_status(payment_id, remote_status)
+            return await self._after_sync(bot, sync)
+
+    async def _after_sync(self, bot: Bot, sync: Optional[PaymentSync]) -> Optional[PaymentSync]:
+        if sync is None:
+            return None
+        if sync.changed and sync.payment.status == "succeeded":
+            await self._complete_payment(bot, sync.payment)
+        return sync
+
+    async def process_refund(self, refund_id: str) -> Optional[PaymentSync]:
+        sync = await self._payments.sync_refund(refund_id)
+        if sync is None:
+            return None
+        if sync.changed and sync.payment.status == "succeeded":
+            # The refund was rejected, so the money stays and so does the seat.
+            logger.info(f"Refund {refund_id} canceled, restoring participant {sync.payment.user_id} for event {sync.payment.event_id}")
+            await self._registrations.add_participant(sync.payment.event_id, sync.payment.user_id)
+        return sync
+
+    async def _record_from_object(self, payment_id: str, payment_object: dict[str, Any]) -> bool:
+        metadata = payment_object.get("metadata") or {}
+        event_id_str = metadata.get("event_id")
+        user_id_str = metadata.get("user_id")
+        if not event_id_str or not user_id_str:
+            return False
+        event_id = int(event_id_str)
+        user_id = int(user_id_str)
+        amount = float(payment_object.get("amount", {}).get("value", "0"))
+        confirmation = payment_object.get("confirmation")
+        confirmation_url = confirmation.get("confirmation_url") if confirmation else None
+        logger.info(f"Creating payment from webhook: payment_id={payment_id}, event_id={event_id}, user_id={user_id}, amount={amount}")
+        await self._payments.record_payment(
+            payment_id=payment_id,
+            event_id=event_id,
+            user_id=user_id,
+            amount=amount,
+            confirmation_url=confirmation_url,
+        )
+        return True
+
+    async def _complete_payment(self, bot: Bot, payment: PaymentModel) -> None:
+        event = await self._events.get_event(payment.event_id)
+        if event:
+            expected_amount = event.cost or 0.0
+            discount = await self._promocodes.get_user_discount(payment.event_id, payment.user_id)
+            expected_amount = max(expected_amount - discount, 0.0)
+            if abs(payment.amount - expected_amount) > 0.01:
+                logger.error(
+                    f"Payment amount mismatch: expected {expected_amount}, got {payment.amount} "
+                    f"for payment {payment.payment_id}, event {payment.event_id}, user {payment.user_id}"
+                )
+                raise PaymentAmountMismatchError(payment.payment_id)
+
+        if await self._registrations.is_registered(payment.event_id, payment.user_id):
+            logger.info(
+                f"Participant {payment.user_id} already registered for event {payment.event_id}, will only send success notification"
+            )
+        else:
+            logger.info(f"Payment succeeded, registering participant for event {payment.event_id}, user {payment.user_id}")
+            await self._registrations.add_participant(payment.event_id, payment.user_id)
+
+        try:
+            await self._notify_success(bot, payment, event)
+        except Exception as e:
+            logger.error(f"Failed to send payment success notification: {e}", exc_info=True)
+
+    async def _notify_success(self, bot: Bot, payment: PaymentModel, event) -> None:
+        user = await self._users.get_by_id(payment.user_id)
+        if not user or not user.telegram_id:
+            logger.warning(f"User {payment.user_id} not found or has no telegram_id")
+            return
+        if event is None:
+            return
+        if payment.payment_message_id:
+            try:
+                await bot.delete_message(user.telegram_id, payment.payment_message_id)
+            except Exception as e:
+                logger.warning(f"Failed to delete payment message: {e}")
+        markup = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text=t("button.back"), callback_data=event_view(payment.event_id))],
+            ]
+        )
+        await bot.send_message(user.telegram_id, t("payment.success", title=event.title), reply_markup=markup)
+        logger.info(f"Success notification sent to user {user.telegram_id}")
+
+
+def build_payment_processor(
+    payments: PaymentService,
+    events: EventService,
+    registrations: RegistrationService,
+    users: UserService,
+    promocodes: PromocodeService,
+) -> PaymentProcessor:
+    return PaymentProcessor(payments, events, registrations, users, promocodes)
@@ -1,6 +1,7 @@
 import asyncio
 import logging
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import uuid4
 
@@ -8,10 +9,30 @@ from yookassa import Configuration, Payment, Refund
 
 from config import YooKassaConfig
 from bot.database.pool import get_pool
-from bot.database.repositories.payments import Payment as PaymentModel, PaymentRepository
+from bot.database.repositories.payments import Payment as PaymentModel, PaymentRepository, UnsettledPayment
 
 logger = logging.getLogger(__name__)
 
+# Remote payment status -> local statuses it may be reached from. Anything else is a
+# replay or an out-of-order notification and leaves the row untouched.
+_PAYMENT_TRANSITIONS: dict[str, tuple[str, ...]] = {
+    "waiting_for_capture": ("pending",),
+    "succeeded": ("pending", "waiting_for_capture"),
+    "canceled": ("pending", "waiting_for_capture"),
+}
+
+# Remote refund status -> (local payment status, statuses it may be reached from).
+_REFUND_TRANSITIONS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "succeeded": ("refunded", ("succeeded", "refund_pending")),
+    "canceled": ("succeeded", ("refund_pending",)),
+}
+
+
+@dataclass(frozen=True)
+class PaymentSync:
+    payment: PaymentModel
+    changed: bool
+
 
 class PaymentService:
     def __init__(self, repository: PaymentRepository, config: YooKassaConfig) -> None:
@@ -19,6 +40,8 @@ class PaymentService:
         self._config = config
         Configuration.account_id = config.shop_id
         Configuration.secret_key = config.api_key
+        if config.api_url:
+            Configuration.api_url = config.api_url
 
     async def create_payment(
         self,
@@ -76,48 +99,123 @@ class PaymentService:
     async def get_successful_payment(self, event_id: int, user_id: int):
         return await self._repository.get_successful_payment(event_id, user_id)
 
+    async def record_payment(
+        self,
+        payment_id: str,
+        event_id: int,
+        user_id: int,
+        amount: float,
+        confirmation_url: Optional[str] = None,
+    ) -> PaymentModel:
+        return await self._repository.create(
+            payment_id=payment_id,
+            event_id=event_id,
+            user_id=user_id,
+            amount=amount,
+            confirmation_url=confirmation_url,
+            payment_message_id=None,
+        )
+
     async def refund_payment(self, payment_id: str, amount: float) -> bool:
         try:
-            loop = asyncio.get_running_loop()
-            refund_data = {
-                "amount": {"value": f"{amount:.2f}", "currency": "RUB"},
-                "payment_id": payment_id,
-            }
-            refund_idempotency_key = str(uuid4())
-            refund = await loop.run_in_executor(
-                None,
-                lambda: Refund.create(refund_data, refund_idempotency_key),
-            )
-            logger.info(f"Refund created: refund_id={refund.id}, payment_id={payment_id}, status={refund.status}, amount={amount}")
-            # Immediately lock the payment against re-refund regardless of YooKassa's async status.
-            # get_successful_payment() queries WHERE status = 'succeeded', so setting 'refund_pending'
-            # breaks the double-refund cycle even if YooKassa responds with status='pending'.
-            await self._repository.update_status(payment_id, "refund_pending", None)
-            if refund.status == "succeeded":
-                await self._repository.update_status(payment_id, "refunded", None)
+            await self.create_refund(payment_id, amount, str(uuid4()))
             return True
         except Exception as e:
             logger.error(f"Failed to create refund: {e}", exc_info=True)
             return False
 
-    async def handle_webhook(self, payment_id: str) -> Optional[PaymentModel]:
+    async def create_refund(self, payment_id: str, amount: float, idempotency_key: str) -> str:
+        loop = asyncio.get_running_loop()
+        refund_data = {
+            "amount": {"value": f"{amount:.2f}", "currency": "RUB"},
+            "payment_id": payment_id,
+        }
+        refund = await loop.run_in_executor(
+            None,
+            lambda: Refund.create(refund_data, idempotency_key),
+        )
+        logger.info(f"Refund created: refund_id={refund.id}, payment_id={payment_id}, status={refund.status}, amount={amount}")
+        # Immediately lock the payment against re-refund regardless of YooKassa's async status.
+        # get_successful_payment() queries WHERE status = 'succeeded', so setting 'refund_pending'
+        # breaks the double-refund cycle even if YooKassa responds with status='pending'.
+        # The refund.succeeded / refund.canceled notifications settle it later.
+        await self._repository.update_refund_id(payment_id, refund.id)
+        await self._repository.transition_status(payment_id, "refund_pending", ("succeeded",))
+        if refund.status == "succeeded":
+            await self._apply_status(payment_id, "refunded", _REFUND_TRANSITIONS["succeeded"][1])
+        return refund.status
+
+    async def sync_payment(self, payment_id: str) -> Optional[PaymentSync]:
         try:
             loop = asyncio.get_running_loop()
             payment = await loop.run_in_executor(None, Payment.find_one, payment_id)
-        except Exception:
+        except Exception as e:
+            logger.warning(f"Failed to fetch payment {payment_id} from YooKassa: {e}")
+            return None
+        return await self.apply_payment_status(payment_id, payment.status)
+
+    async def apply_payment_status(self, payment_id: str, remote_status: str) -> Optional[PaymentSync]:
+        from_statuses = _PAYMENT_TRANSITIONS.get(remote_status, ())
+        paid_at = datetime.now() if remote_status == "succeeded" else None
+        return await self._apply_status(payment_id, remote_status, from_statuses, paid_at)
+
+    async def list_remote_statuses(self, created_from: datetime, created_to: datetime) -> dict[str, str]:
+        loop = asyncio.get_running_loop()
+        params: dict[str, str | int] = {
+            "created_at.gte": _format_api_time(created_from),
+            "created_at.lte": _format_api_time(created_to),
+            "limit": 100,
+        }
+        statuses: dict[str, str] = {}
+        while True:
+            response = await loop.run_in_executor(None, Payment.list, dict(params))
+            for item in response.items or []:
+                statuses[item.id] = item.status
+            cursor = getattr(response, "next_cursor", None)
+            if not cursor:
+                return statuses
+            params["cursor"] = cursor
+
+    async def list_unsettled(
+        self,
+        after_id: int,
+        stale_after_minutes: int,
+        max_age_hours: int,
+        limit: int,
+    ) -> list[UnsettledPayment]:
+        return await self._repository.list_unsettled(after_id, stale_after_minutes, max_age_hours, limit)
+
+    async def sync_refund(self, refund_id: str) -> Optional[PaymentSync]:
+        try:
+            loop = asyncio.get_running_loop()
+            refund = await loop.run_in_executor(None, Refund.find_one, refund_id)
+        except Exception as e:
+            logger.warning(f"Failed to fetch refund {refund_id} from YooKassa: {e}")
             return None
+        status, from_statuses = _REFUND_TRANSITIONS.get(refund.status, (refund.status, ()))
+        return await self._apply_status(refund.payment_id, status, from_statuses)
 
+    async def _apply_status(
+        self,
+        payment_id: str,
+        status: str,
+        from_statuses: tuple[str, ...],
+        paid_at: Optional[datetime] = None,
+    ) -> Optional[PaymentSync]:
+        if from_statuses:
+            updated = await self._repository.transition_status(payment_id, status, from_statuses, paid_at)
+            if updated is not None:
+                logger.info(f"Payment {payment_id} moved to {status}")
+                return PaymentSync(payment=updated, changed=True)
         db_payment = await self._repository.get_by_payment_id(payment_id)
         if db_payment is None:
             return None
+        return PaymentSync(payment=db_payment, changed=False)
 
-        status = payment.status
-        paid_at = None
-        if status == "succeeded":
-            paid_at = datetime.now()
 
-        await self._repository.update_status(payment_id, status, paid_at)
-        return await self._repository.get_by_payment_id(payment_id)
+def _format_api_time(value: datetime) -> str:
+    utc_value = value.astimezone(timezone.utc)
+    return utc_value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{utc_value.microsecond // 1000:03d}Z"
 
 
 def build_payment_service(config: YooKassaConfig) -> PaymentService:
@@ -1,11 +1,47 @@
+import csv
+import io
+import re
+import secrets
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import Optional
 
 from bot.database.pool import get_pool
 from bot.database.repositories.promocodes import PromocodeRepository
 from bot.services.event_service import EventService
-from bot.utils.events import get_event_start, now_moscow
+from bot.utils.metrics import Counter
+
+# Codes that did not exist a moment ago are answered from memory until they expire
+# or create_promocode adds them; the limiter caps failed attempts per user.
+_NEGATIVE_TTL_SECONDS = 600.0
+_NEGATIVE_CACHE_SIZE = 10_000
+_ATTEMPT_WINDOW_SECONDS = 60.0
+_MAX_FAILED_ATTEMPTS = 5
+_TRACKED_USERS_LIMIT = 10_000
+
+MAX_BULK_PROMOCODES = 50_000
+MAX_PROMOCODE_LENGTH = 64
+_GENERATED_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+_GENERATED_CODE_LENGTH = 10
+_GENERATION_ROUNDS = 5
+_IMPORT_SEPARATORS = re.compile(r"[,;\t]")
+_EVENT_OUTCOMES = frozenset({"event_not_found", "event_started"})
+
+PROMOCODE_ATTEMPTS = Counter(
+    "promocode_attempts_total",
+    "Promocode entry attempts by outcome.",
+    ("outcome",),
+)
+PROMOCODE_NEGATIVE_CACHE_HITS = Counter(
+    "promocode_negative_cache_hits_total",
+    "Promocode misses answered without a database query.",
+)
+PROMOCODE_THROTTLED_USERS = Counter(
+    "promocode_throttled_users_total",
+    "Times a user crossed the failed promocode attempt limit.",
+)
 
 
 @dataclass(frozen=True)
@@ -15,42 +51,105 @@ class PromocodeResult:
     error_code: Optional[str] = None
 
 
+@dataclass(frozen=True)
+class BulkPromocodeResult:
+    discount: float
+    created: list[str]
+    existing: list[str]
+    invalid: list[str]
+
+    def to_csv(self) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(("code", "discount", "status"))
+        discount = f"{self.discount:.2f}"
+        for code in self.created:
+            writer.writerow((code, discount, "created"))
+        for code in self.existing:
+            writer.writerow((code, discount, "exists"))
+        for code in self.invalid:
+            writer.writerow((code, "", "invalid"))
+        return buffer.getvalue().encode("utf-8-sig")
+
+
 class PromocodeService:
     def __init__(self, repository: PromocodeRepository, events: EventService) -> None:
         self._repository = repository
         self._events = events
-
-    async def apply_promocode(self, event_id: int, user_id: int, code: str) -> PromocodeResult:
+        self._misses: OrderedDict[tuple[int, str], float] = OrderedDict()
+        self._failed_attempts: OrderedDict[int, deque[float]] = OrderedDict()
+
+    def reject_cached(self, event_id: int, telegram_id: int, code: str) -> Optional[PromocodeResult]:
+        now = time.monotonic()
+        if self._is_throttled(telegram_id, now):
+            PROMOCODE_ATTEMPTS.inc(outcome="throttled")
+            return PromocodeResult(success=False, error_code="throttled")
         normalized_code = code.strip().upper()
-        if not normalized_code:
+        if not normalized_code or self._is_known_miss(event_id, normalized_code, now):
+            self._record_failure(telegram_id, now)
+            PROMOCODE_ATTEMPTS.inc(outcome="not_found")
             return PromocodeResult(success=False, error_code="not_found")
+        return None
 
-        promocode = await self._repository.get_by_code(event_id, normalized_code)
-        if promocode is None or not promocode.is_active:
-            return PromocodeResult(success=False, error_code="not_found")
+    async def apply_promocode(self, event_id: int, user_id: int, telegram_id: int, code: str) -> PromocodeResult:
+        rejected = self.reject_cached(event_id, telegram_id, code)
+        if rejected is not None:
+            return rejected
 
-        event = await self._events.get_event(event_id)
-        if event is None:
-            return PromocodeResult(success=False, error_code="not_found")
-
-        event_start = get_event_start(event)
-        now = now_moscow()
-        if now >= event_start:
-            return PromocodeResult(success=False, error_code="expired")
-
-        if await self._repository.is_used_by_user(promocode.id, user_id):
-            return PromocodeResult(success=False, error_code="already_used")
-
-        try:
-            stored_time = now.astimezone(timezone.utc).replace(tzinfo=None)
-            await self._repository.mark_used(promocode.id, user_id, stored_time)
-            if await self._repository.is_used_by_user(promocode.id, user_id):
-                return PromocodeResult(success=True, discount=promocode.discount_amount)
-            return PromocodeResult(success=False, error_code="already_used")
-        except Exception as e:
-            if await self._repository.is_used_by_user(promocode.id, user_id):
-                return PromocodeResult(success=True, discount=promocode.discount_amount)
-            raise
+        normalized_code = code.strip().upper()
+        redemption = await self._repository.redeem(event_id, normalized_code, user_id)
+        PROMOCODE_ATTEMPTS.inc(outcome=redemption.outcome)
+        if redemption.outcome == "applied":
+            return PromocodeResult(success=True, discount=redemption.discount)
+        if redemption.outcome in _EVENT_OUTCOMES:
+            # Not a wrong guess: the event itself is gone or has started.
+            return PromocodeResult(success=False, error_code=redemption.outcome)
+        now = time.monotonic()
+        if redemption.outcome == "not_found":
+            self._remember_miss(event_id, normalized_code, now)
+        self._record_failure(telegram_id, now)
+        return PromocodeResult(success=False, error_code=redemption.outcome)
+
+    def _is_known_miss(self, event_id: int, code: str, now: float) -> bool:
+        key = (event_id, code)
+        expires_at = self._misses.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= now:
+            del self._misses[key]
+            return False
+        PROMOCODE_NEGATIVE_CACHE_HITS.inc()
+        return True
+
+    def _remember_miss(self, event_id: int, code: str, now: float) -> None:
+        key = (event_id, code)
+        self._misses[key] = now + _NEGATIVE_TTL_SECONDS
+        self._misses.move_to_end(key)
+        while len(self._misses) > _NEGATIVE_CACHE_SIZE:
+            self._misses.popitem(last=False)
+
+    def _is_throttled(self, telegram_id: int, now: float) -> bool:
+        attempts = self._failed_attempts.get(telegram_id)
+        if attempts is None:
+            return False
+        while attempts and attempts[0] <= now - _ATTEMPT_WINDOW_SECONDS:
+            attempts.popleft()
+        if not attempts:
+            del self._failed_attempts[telegram_id]
+            return False
+        return len(attempts) >= _MAX_FAILED_ATTEMPTS
+
+    def _record_failure(self, telegram_id: int, now: float) -> None:
+        attempts = self._failed_attempts.get(telegram_id)
+        if attempts is None:
+            attempts = deque(maxlen=_MAX_FAILED_ATTEMPTS)
+            self._failed_attempts[telegram_id] = attempts
+        attempts.append(now)
+        self._failed_attempts.move_to_end(telegram_id)
+        if len(attempts) == _MAX_FAILED_ATTEMPTS:
+            PROMOCODE_THROTTLED_USERS.inc()
+        while len(self._failed_attempts) > _TRACKED_USERS_LIMIT:
+            self._failed_attempts.popitem(last=False)
 
     async def get_user_discount(self, event_id: int, user_id: int) -> float:
         return await self._repository.get_user_discount(event_id, user_id)
@@ -61,20 +160,81 @@ class PromocodeService:
         code: str,
         discount_amount: float,
         expires_at: Optional[datetime],
+        max_uses: Optional[int] = None,
     ) -> None:
         normalized_code = code.strip().upper()
         existing = await self._repository.get_by_code(event_id, normalized_code)
         if existing is not None:
             from bot.utils.i18n import t
             raise ValueError(t("promocode.admin.duplicate"))
-        await self._repository.create(event_id, normalized_code, discount_amount, expires_at)
+        await self._repository.create(event_id, normalized_code, discount_amount, expires_at, max_uses)
+        self._misses.pop((event_id, normalized_code), None)
+
+    async def generate_promocodes(self, event_id: int, count: int, discount_amount: float) -> BulkPromocodeResult:
+        if not 1 <= count <= MAX_BULK_PROMOCODES:
+            raise ValueError(f"count must be between 1 and {MAX_BULK_PROMOCODES}")
+        created: list[str] = []
+        for _ in range(_GENERATION_ROUNDS):
+            missing = count - len(created)
+            if missing <= 0:
+                break
+            codes = {_generate_code() for _ in range(missing)}
+            # Generated codes are handed out one per person, so each redeems once.
+            created.extend(await self._repository.bulk_create(event_id, codes, discount_amount, max_uses=1))
+        self._forget_misses(event_id, created)
+        return BulkPromocodeResult(discount=discount_amount, created=created, existing=[], invalid=[])
+
+    async def import_promocodes(
+        self,
+        event_id: int,
+        content: bytes,
+        discount_amount: float,
+        max_uses: Optional[int] = None,
+    ) -> BulkPromocodeResult:
+        codes, invalid = _parse_import(content)
+        created = await self._repository.bulk_create(event_id, codes, discount_amount, max_uses) if codes else []
+        self._forget_misses(event_id, created)
+        created_set = set(created)
+        existing = [code for code in codes if code not in created_set]
+        return BulkPromocodeResult(discount=discount_amount, created=created, existing=existing, invalid=invalid)
+
+    def _forget_misses(self, event_id: int, codes: list[str]) -> None:
+        for code in codes:
+            self._misses.pop((event_id, code), None)
+
+    async def count_promocodes(self, event_id: int) -> int:
+        return await self._repository.count_for_event(event_id)
 
     async def delete_promocode(self, event_id: int, code: str) -> bool:
         normalized_code = code.strip().upper()
         return await self._repository.delete_by_code(event_id, normalized_code)
 
-    async def list_promocodes(self, event_id: int):
-        return await self._repository.list_for_event(event_id)
+    async def list_promocodes(self, event_id: int, limit: Optional[int] = None):
+        return await self._repository.list_for_event(event_id, limit)
+
+
+def _generate_code() -> str:
+    return "".join(secrets.choice(_GENERATED_CODE_ALPHABET) for _ in range(_GENERATED_CODE_LENGTH))
+
+
+def _parse_import(content: bytes) -> tuple[list[str], list[str]]:
+    text = content.decode("utf-8-sig")
+    codes: list[str] = []
+    invalid: list[str] = []
+    seen: set[str] = set()
+    for line in text.splitlines():
+        code = _IMPORT_SEPARATORS.split(line, 1)[0].strip().upper()
+        if not code or code in seen:
+            continue
+        seen.add(code)
+        if len(code) > MAX_PROMOCODE_LENGTH or any(char.isspace() for char in code):
+            invalid.append(code)
+            continue
+        if len(codes) >= MAX_BULK_PROMOCODES:
+            invalid.append(code)
+            continue
+        codes.append(code)
+    return codes, invalid
 
 
 def build_promocode_service(events: EventService) -> PromocodeService:
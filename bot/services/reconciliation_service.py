@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional, Sequence
+
+from aiogram import Bot
+
+from config import ReconciliationConfig
+from bot.database.repositories.payments import UnsettledPayment
+from bot.services.payment_processor import PaymentAmountMismatchError, PaymentProcessor
+from bot.services.payment_service import PaymentService, PaymentSync
+
+logger = logging.getLogger(__name__)
+
+# Payments created close together are resolved with one list call instead of one
+# lookup each; lone stragglers are cheaper to fetch individually.
+_LIST_WINDOW = timedelta(minutes=15)
+_LIST_WINDOW_PADDING = timedelta(minutes=1)
+_MIN_LIST_GROUP = 3
+
+
+@dataclass(frozen=True)
+class ReconciliationReport:
+    checked: int = 0
+    changed: int = 0
+    failed: int = 0
+
+
+class ReconciliationService:
+    def __init__(
+        self,
+        payments: PaymentService,
+        processor: PaymentProcessor,
+        config: ReconciliationConfig,
+    ) -> None:
+        self._payments = payments
+        self._processor = processor
+        self._config = config
+
+    async def reconcile(self, bot: Bot) -> ReconciliationReport:
+        semaphore = asyncio.Semaphore(self._config.concurrency)
+        checked = changed = failed = 0
+        after_id = 0
+        while True:
+            batch = await self._payments.list_unsettled(
+                after_id,
+                self._config.stale_after_minutes,
+                self._config.max_age_hours,
+                self._config.batch_size,
+            )
+            if not batch:
+                break
+            after_id = batch[-1].id
+            remote_statuses = await self._list_remote_statuses(batch, semaphore)
+            results = await asyncio.gather(
+                *(self._reconcile_one(bot, item, remote_statuses.get(item.payment_id), semaphore) for item in batch)
+            )
+            checked += len(batch)
+            changed += sum(1 for result in results if result is True)
+            failed += sum(1 for result in results if result is None)
+            if len(batch) < self._config.batch_size:
+                break
+        report = ReconciliationReport(checked=checked, changed=changed, failed=failed)
+        if checked:
+            logger.info(f"Payment reconciliation finished: checked={checked}, changed={changed}, failed={failed}")
+        return report
+
+    async def _list_remote_statuses(
+        self,
+        batch: Sequence[UnsettledPayment],
+        semaphore: asyncio.Semaphore,
+    ) -> dict[str, str]:
+        candidates = sorted(
+            (item for item in batch if item.status != "refund_pending"),
+            key=lambda item: item.created_at,
+        )
+        groups: list[list[UnsettledPayment]] = []
+        for item in candidates:
+            if groups and item.created_at - groups[-1][0].created_at <= _LIST_WINDOW:
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+        statuses: dict[str, str] = {}
+        for group in groups:
+            if len(group) < _MIN_LIST_GROUP:
+                continue
+            created_from = group[0].created_at - _LIST_WINDOW_PADDING
+            created_to = group[-1].created_at + _LIST_WINDOW_PADDING
+            try:
+                async with semaphore:
+                    statuses.update(await self._payments.list_remote_statuses(created_from, created_to))
+            except Exception as e:
+                logger.warning(f"Failed to list YooKassa payments for {created_from}..{created_to}: {e}")
+        return statuses
+
+    async def _reconcile_one(
+        self,
+        bot: Bot,
+        item: UnsettledPayment,
+        remote_status: Optional[str],
+        semaphore: asyncio.Semaphore,
+    ) -> Optional[bool]:
+        try:
+            sync: Optional[PaymentSync]
+            if item.status == "refund_pending":
+                if not item.refund_id:
+                    logger.warning(f"Payment {item.payment_id} is refund_pending without a refund id")
+                    return None
+                async with semaphore:
+                    sync = await self._processor.process_refund(item.refund_id)
+            elif remote_status is not None:
+                sync = await self._processor.apply_payment_status(bot, item.payment_id, remote_status)
+            else:
+                async with semaphore:
+                    sync = await self._processor.process_payment(bot, item.payment_id)
+        except PaymentAmountMismatchError:
+            return None
+        except Exception as e:
+            logger.error(f"Failed to reconcile payment {item.payment_id}: {e}", exc_info=True)
+            return None
+        if sync is None:
+            return None
+        return sync.changed
+
+
+def build_reconciliation_service(
+    payments: PaymentService,
+    processor: PaymentProcessor,
+    config: ReconciliationConfig,
+) -> ReconciliationService:
+    return ReconciliationService(payments, processor, config)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from config import RefundConfig
+from bot.database.pool import get_pool
+from bot.database.repositories.refunds import RefundProgress, RefundRepository, RefundTask
+from bot.services.event_service import EventService
+from bot.services.payment_service import PaymentService
+from bot.utils.i18n import t
+
+logger = logging.getLogger(__name__)
+
+# A claimed task is invisible to other claims for this long; it only matters if the
+# process dies between Refund.create and recording the outcome.
+_LEASE_SECONDS = 300
+_CLAIM_BATCH_FACTOR = 4
+
+
+class RefundService:
+    def __init__(
+        self,
+        repository: RefundRepository,
+        payments: PaymentService,
+        events: EventService,
+        config: RefundConfig,
+    ) -> None:
+        self._repository = repository
+        self._payments = payments
+        self._events = events
+        self._config = config
+        self._wakeup = asyncio.Event()
+
+    async def start_event_refunds(self, bot: Bot, event_id: int, chat_id: int) -> RefundProgress:
+        queued = await self._repository.enqueue_event(event_id, chat_id)
+        progress = await self._repository.get_progress(event_id)
+        logger.info(f"Queued {queued} refunds for event {event_id}, total={progress.total}")
+        if progress.total:
+            try:
+                message = await bot.send_message(chat_id, await self._progress_text(event_id, progress))
+                await self._repository.set_batch_message(event_id, message.message_id)
+            except Exception as e:
+                logger.warning(f"Failed to send refund progress message for event {event_id}: {e}")
+            self._wakeup.set()
+        return progress
+
+    async def run(self, bot: Bot) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await self.process_due(bot)
+            except Exception as e:
+                logger.error(f"Refund worker iteration failed: {e}", exc_info=True)
+                processed = 0
+            if processed:
+                continue
+            await self._sleep_until_due()
+
+    async def process_due(self, bot: Bot) -> int:
+        tasks = await self._repository.claim_due(self._config.concurrency * _CLAIM_BATCH_FACTOR, _LEASE_SECONDS)
+        if not tasks:
+            return 0
+        semaphore = asyncio.Semaphore(self._config.concurrency)
+
+        async def process(task: RefundTask) -> None:
+            async with semaphore:
+                await self._process_task(task)
+
+        await asyncio.gather(*(process(task) for task in tasks))
+        for event_id in sorted({task.event_id for task in tasks}):
+            await self._report_progress(bot, event_id)
+        return len(tasks)
+
+    async def _process_task(self, task: RefundTask) -> None:
+        payment = await self._payments.get_payment(task.payment_id)
+        if payment is None or payment.status != "succeeded":
+            # Already refunded by the participant, or a previous attempt got through
+            # before we could record it.
+            await self._repository.mark_done(task.id)
+            return
+        try:
+            await self._payments.create_refund(task.payment_id, task.amount, task.idempotency_key)
+        except Exception as e:
+            delay = min(self._config.retry_base_seconds * 2 ** (task.attempts - 1), self._config.retry_max_seconds)
+            await self._repository.mark_retry(task.id, delay, self._config.max_attempts, str(e)[:500])
+            if task.attempts >= self._config.max_attempts:
+                logger.error(f"Refund for payment {task.payment_id} failed after {task.attempts} attempts: {e}")
+            else:
+                logger.warning(f"Refund for payment {task.payment_id} failed (attempt {task.attempts}), retry in {delay}s: {e}")
+            return
+        await self._repository.mark_done(task.id)
+
+    async def _sleep_until_due(self) -> None:
+        timeout = float(self._config.poll_seconds)
+        try:
+            next_due_in = await self._repository.next_due_in()
+        except Exception as e:
+            logger.warning(f"Failed to read next refund due time: {e}")
+            next_due_in = None
+        if next_due_in is not None:
+            timeout = min(timeout, max(next_due_in, 1.0))
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _report_progress(self, bot: Bot, event_id: int) -> None:
+        batch = await self._repository.get_batch(event_id)
+        if batch is None or batch.chat_id is None or batch.message_id is None:
+            return
+        progress = await self._repository.get_progress(event_id)
+        try:
+            await bot.edit_message_text(
+                await self._progress_text(event_id, progress),
+                chat_id=batch.chat_id,
+                message_id=batch.message_id,
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.warning(f"Failed to update refund progress for event {event_id}: {e}")
+        except Exception as e:
+            logger.warning(f"Failed to update refund progress for event {event_id}: {e}")
+
+    async def _progress_text(self, event_id: int, progress: RefundProgress) -> str:
+        event = await self._events.get_event(event_id)
+        title = event.title if event else str(event_id)
+        if progress.finished:
+            return t("moderator.refunds_done", title=title, done=progress.done, total=progress.total, failed=progress.failed)
+        return t(
+            "moderator.refunds_progress",
+            title=title,
+            processed=progress.done + progress.failed,
+            total=progress.total,
+            failed=progress.failed,
+        )
+
+
+def build_refund_service(payments: PaymentService, events: EventService, config: RefundConfig) -> RefundService:
+    pool = get_pool()
+    repository = RefundRepository(pool)
+    return RefundService(repository, payments, events, config)
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime, time, timedelta
+from time import monotonic
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot
@@ -9,7 +10,15 @@ from bot.database.repositories.events import Event
 from bot.keyboards.common import event_link_keyboard
 from bot.services.event_service import EventService
 from bot.services.registration_service import RegistrationService
+from bot.utils.broadcast import send_to_all
 from bot.utils.i18n import t
+from bot.utils.metrics import Histogram
+
+REMINDER_RUN_SECONDS = Histogram(
+    "reminder_run_seconds",
+    "Duration of one reminder job run, including sending.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
 
 
 @dataclass(frozen=True)
@@ -57,6 +66,13 @@ class ReminderService:
         }
 
     async def process_due_reminders(self, bot: Bot, now: datetime | None = None) -> None:
+        started = monotonic()
+        try:
+            await self._process_due_reminders(bot, now)
+        finally:
+            REMINDER_RUN_SECONDS.observe(monotonic() - started)
+
+    async def _process_due_reminders(self, bot: Bot, now: datetime | None) -> None:
         current = now.astimezone(self._timezone) if now else datetime.now(self._timezone)
         candidates = await self._events.list_reminder_candidates()
         for event in candidates:
@@ -97,11 +113,7 @@ class ReminderService:
             text_key = rule.fallback_text_key
         text = t(text_key, title=event.title, time=time_display)
         markup = event_link_keyboard(event.id)
-        for telegram_id in recipients:
-            try:
-                await bot.send_message(telegram_id, text, reply_markup=markup)
-            except Exception:
-                continue
+        await send_to_all(bot, recipients, text, markup, kind="reminder")
 
     async def _mark_sent(self, event: Event, marks: list[str], current: datetime) -> None:
         payload: dict[str, datetime | None] = {}
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from config import RetentionConfig
+from bot.database.pool import get_pool
+from bot.database.repositories.retention import ARCHIVED_TABLES, ArchivedTable, RetentionRepository, TableSize
+from bot.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Events are picked up in chunks so one run never holds a long candidate list.
+_EVENTS_PER_QUERY = 50
+
+ROWS_ARCHIVED = Counter(
+    "retention_rows_archived_total",
+    "Rows moved from hot tables into their archive tables.",
+    ("table",),
+)
+
+
+@dataclass(frozen=True)
+class TableRetention:
+    name: str
+    rows_moved: int
+    before: TableSize
+    after: TableSize
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        # VACUUM only returns trailing pages to the OS; the rest becomes free space
+        # that new rows reuse, so estimate it from the share of rows moved out.
+        if not self.rows_moved or not self.before.live_rows:
+            return max(self.before.total_bytes - self.after.total_bytes, 0)
+        share = min(self.rows_moved / self.before.live_rows, 1.0)
+        return max(int(self.before.total_bytes * share), self.before.total_bytes - self.after.total_bytes)
+
+
+@dataclass(frozen=True)
+class RetentionReport:
+    events: int
+    tables: tuple[TableRetention, ...]
+
+    @property
+    def rows_moved(self) -> int:
+        return sum(table.rows_moved for table in self.tables)
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return sum(table.reclaimed_bytes for table in self.tables)
+
+    def lines(self) -> list[str]:
+        lines = [
+            f"Archived {self.events} events, {self.rows_moved} rows, ~{_format_bytes(self.reclaimed_bytes)} reclaimed"
+        ]
+        for table in self.tables:
+            lines.append(
+                f"  {table.name}: moved={table.rows_moved} "
+                f"size {_format_bytes(table.before.total_bytes)} -> {_format_bytes(table.after.total_bytes)}, "
+                f"indexes {_format_bytes(table.before.index_bytes)} -> {_format_bytes(table.after.index_bytes)}, "
+                f"reclaimed ~{_format_bytes(table.reclaimed_bytes)}"
+            )
+        return lines
+
+
+class RetentionService:
+    def __init__(self, repository: RetentionRepository, config: RetentionConfig) -> None:
+        self._repository = repository
+        self._config = config
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.archive_after_days is not None
+
+    async def archive(self) -> RetentionReport:
+        if self._lock.locked():
+            logger.info("Retention run already in progress, skipping")
+            return RetentionReport(events=0, tables=())
+        async with self._lock:
+            return await self._archive()
+
+    async def _archive(self) -> RetentionReport:
+        names = [table.name for table in ARCHIVED_TABLES]
+        before = await self._repository.table_sizes(names)
+        moved = dict.fromkeys(names, 0)
+        archived_events = 0
+        while True:
+            event_ids = await self._repository.list_archivable_events(self._config.archive_after_days, _EVENTS_PER_QUERY)
+            for event_id in event_ids:
+                for table in ARCHIVED_TABLES:
+                    moved[table.name] += await self._move_event_rows(table, event_id)
+                await self._repository.mark_archived(event_id)
+                archived_events += 1
+            if len(event_ids) < _EVENTS_PER_QUERY:
+                break
+        for name, count in moved.items():
+            if count:
+                await self._repository.vacuum(name)
+        after = await self._repository.table_sizes(names)
+        empty = TableSize(0, 0, 0)
+        report = RetentionReport(
+            events=archived_events,
+            tables=tuple(
+                TableRetention(name, moved[name], before.get(name, empty), after.get(name, empty)) for name in names
+            ),
+        )
+        if archived_events:
+            logger.info("\n".join(report.lines()))
+        return report
+
+    async def _move_event_rows(self, table: ArchivedTable, event_id: int) -> int:
+        total = 0
+        while True:
+            count = await self._repository.move_batch(table, event_id, self._config.batch_size)
+            total += count
+            if count:
+                ROWS_ARCHIVED.inc(count, table=table.name)
+            if count < self._config.batch_size:
+                return total
+            # Let replication, autovacuum and interactive queries catch up between batches.
+            await asyncio.sleep(self._config.batch_pause_seconds)
+
+
+def _format_bytes(value: int) -> str:
+    size = float(value)
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def build_retention_service(config: RetentionConfig) -> RetentionService:
+    pool = get_pool()
+    repository = RetentionRepository(pool)
+    return RetentionService(repository, config)
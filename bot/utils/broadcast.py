@@ -0,0 +1,55 @@
+import logging
+import time
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+
+from bot.database.pool import QUERY_CLASS_BACKGROUND, query_class
+from bot.utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MESSAGES = Counter(
+    "broadcast_messages_total",
+    "Messages sent to event participants by broadcasts, reminders and notices.",
+    ("kind", "outcome"),
+)
+BROADCAST_SECONDS = Histogram(
+    "broadcast_seconds",
+    "Wall time of one broadcast to all of its recipients.",
+    ("kind",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+
+async def send_to_all(
+    bot: Bot,
+    telegram_ids: Iterable[int],
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    *,
+    kind: str,
+    exclude: Optional[int] = None,
+) -> int:
+    """Send one message to every recipient, skipping failures; returns how many were delivered.
+
+    Runs under the background query class even when a handler calls it, so the messages
+    go through the bulk rate limiter lane and queue behind replies to users.
+    """
+    started = time.monotonic()
+    delivered = 0
+    with query_class(QUERY_CLASS_BACKGROUND):
+        for telegram_id in telegram_ids:
+            if telegram_id == exclude:
+                continue
+            try:
+                await bot.send_message(telegram_id, text, reply_markup=reply_markup)
+            except Exception as e:
+                BROADCAST_MESSAGES.inc(kind=kind, outcome="failed")
+                logger.warning(f"Failed to send {kind} message to {telegram_id}: {e}")
+                continue
+            BROADCAST_MESSAGES.inc(kind=kind, outcome="delivered")
+            delivered += 1
+    BROADCAST_SECONDS.observe(time.monotonic() - started, kind=kind)
+    return delivered
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar, Union, overload
+
+from bot.utils.metrics import Counter, Gauge
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+D = TypeVar("D")
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "In-process cache lookups by cache and outcome.",
+    ("cache", "result"),
+)
+CACHE_EVICTIONS = Counter(
+    "cache_evictions_total",
+    "Entries dropped from in-process caches, by cache and reason.",
+    ("cache", "reason"),
+)
+CACHE_ENTRIES = Gauge(
+    "cache_entries",
+    "Entries currently held by each in-process cache.",
+    ("cache",),
+)
+
+
+class LRUCache(Generic[K, V]):
+    """Size-bounded mapping that evicts the least recently used entry, with an optional TTL.
+
+    Every operation is O(1). Expired entries are dropped when looked up or when they
+    reach the cold end of the LRU order, so memory is bounded by max_size alone.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_seconds: Optional[float] = None) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be greater than zero")
+        self.name = name
+        self._max_size = max_size
+        self._ttl = ttl_seconds
+        # key -> (value, monotonic expiry or None)
+        self._entries: OrderedDict[K, tuple[V, Optional[float]]] = OrderedDict()
+
+    @overload
+    def get(self, key: K) -> Optional[V]: ...
+
+    @overload
+    def get(self, key: K, default: D) -> Union[V, D]: ...
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._drop(key, "ttl")
+            CACHE_LOOKUPS.inc(cache=self.name, result="expired")
+            return default
+        self._entries.move_to_end(key)
+        CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        expires_at = time.monotonic() + self._ttl if self._ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            oldest, (_, oldest_expiry) = next(iter(self._entries.items()))
+            expired = oldest_expiry is not None and oldest_expiry <= time.monotonic()
+            self._drop(oldest, "ttl" if expired else "size")
+        CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+
+    @overload
+    def pop(self, key: K) -> Optional[V]: ...
+
+    @overload
+    def pop(self, key: K, default: D) -> Union[V, D]: ...
+
+    def pop(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        del self._entries[key]
+        CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        CACHE_ENTRIES.set(0, cache=self.name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        entry = self._entries.get(key)  # type: ignore[arg-type]
+        return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def _drop(self, key: K, reason: str) -> None:
+        del self._entries[key]
+        CACHE_EVICTIONS.inc(cache=self.name, reason=reason)
+        CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+
+
+_MISSING = object()
@@ -8,3 +8,6 @@ STATUS_NOT_GOING = "not_going"
 MAX_EVENT_IMAGES = 1
 MAX_DESCRIPTION_LENGTH = 1024
 
+# Telegram refuses to delete messages older than 48 hours.
+DELETABLE_SECONDS = 48 * 3600
+
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from config import RuntimeConfig
+from bot.utils.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Gauge("event_loop_lag_last_seconds", "Delay of the most recent event loop heartbeat.")
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late event loop heartbeats fire.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = Counter("event_loop_stalls_total", "Times the event loop stayed blocked past the stall threshold.")
+
+
+class LoopLagMonitor:
+    """Measures event loop lag and logs what the loop is running when it stalls.
+
+    A heartbeat coroutine records how late each tick wakes up. A watchdog thread checks
+    that heartbeat; when the loop has not ticked for stall_seconds it logs the loop
+    thread's stack, once per stall, so the blocking call shows up while it is still running.
+    """
+
+    def __init__(self, interval_seconds: float, stall_seconds: float) -> None:
+        self._interval = interval_seconds
+        self._stall = stall_seconds
+        self._heartbeat = time.monotonic()
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._loop_thread_id = 0
+
+    async def run(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        try:
+            while True:
+                expected = time.monotonic() + self._interval
+                await asyncio.sleep(self._interval)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                self._heartbeat = now
+                LOOP_LAG.set(lag)
+                LOOP_LAG_SECONDS.observe(lag)
+        finally:
+            self._stop.set()
+
+    def _watch(self) -> None:
+        reported = 0.0
+        while not self._stop.wait(self._stall / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self._interval
+            if blocked < self._stall or heartbeat == reported:
+                continue
+            reported = heartbeat
+            LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable\n"
+            logger.warning(f"Event loop blocked for {blocked:.2f}s, loop thread stack:\n{stack}")
+
+
+def build_loop_monitor(config: RuntimeConfig) -> LoopLagMonitor:
+    return LoopLagMonitor(config.loop_lag_interval_seconds, config.loop_stall_seconds)
@@ -1,19 +1,16 @@
-from typing import Union
+import asyncio
+import logging
+from typing import Iterable, Union
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, InputMediaPhoto, Message
 
-_LAST_USER_MESSAGES: dict[int, int] = {}
+logger = logging.getLogger(__name__)
 
-
-def remember_user_message(message: Message) -> None:
-    if message.chat:
-        _LAST_USER_MESSAGES[message.chat.id] = message.message_id
-
-
-def get_last_user_message_id(chat_id: int) -> int | None:
-    return _LAST_USER_MESSAGES.get(chat_id)
+DELETE_MESSAGES_LIMIT = 100
+MAX_CAPTION_LENGTH = 1024
+PHOTO_SEND_TIMEOUT = 10.0
 
 
 async def safe_delete_message(bot, chat_id: int, message_id: int | None) -> None:
@@ -98,33 +95,67 @@ async def send_or_edit(
     return await msg.answer(text, reply_markup=reply_markup, **kwargs)
 
 
-async def safe_delete_recent_bot_messages(bot: Bot, chat_id: int, start_message_id: int, count: int = 100, exclude_message_id: int | None = None) -> None:
-    deleted_count = 0
-    failed_count = 0
-    max_failed = 10
-    last_user_message_id = get_last_user_message_id(chat_id)
-    
-    for i in range(count):
-        message_id = start_message_id - i
-        if message_id <= 0:
-            break
-        if last_user_message_id and message_id == last_user_message_id:
-            continue
-        if exclude_message_id and message_id == exclude_message_id:
-            continue
+async def render_card(message: Message, text: str, reply_markup=None, photo: str | None = None) -> Message:
+    """
+    Show a card in place of `message`, editing it whenever the message type allows.
+
+    - photo card over a photo message → edit_media (new picture, caption and keyboard in one call)
+    - text card over a text message   → edit_text
+    - anything else, or a failed edit → a new message is sent
+    Returns the message that now shows the card; if its id differs from `message`,
+    the caller is responsible for deleting the old one.
+    """
+    caption = text[:MAX_CAPTION_LENGTH]
+    try:
+        if photo and message.photo:
+            edited = await message.edit_media(InputMediaPhoto(media=photo, caption=caption), reply_markup=reply_markup)
+            return edited if isinstance(edited, Message) else message
+        if not photo and message.text is not None:
+            edited = await message.edit_text(text, reply_markup=reply_markup)
+            return edited if isinstance(edited, Message) else message
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            return message
+        logger.warning(f"Card edit failed, sending a new message instead: {e}")
+    except TelegramAPIError as e:
+        logger.warning(f"Card edit failed, sending a new message instead: {e}")
+    bot = message.bot
+    if photo:
+        try:
+            return await asyncio.wait_for(
+                bot.send_photo(message.chat.id, photo, caption=caption, reply_markup=reply_markup),
+                timeout=PHOTO_SEND_TIMEOUT,
+            )
+        except Exception as e:
+            logger.error(f"Card photo send failed, falling back to text: {e}")
+    return await bot.send_message(message.chat.id, text, reply_markup=reply_markup)
+
+
+async def safe_delete_messages(bot: Bot, chat_id: int | None, message_ids: Iterable[int | None]) -> None:
+    if not chat_id:
+        return
+    ids = sorted({message_id for message_id in message_ids if message_id and message_id > 0})
+    # deleteMessages takes up to 100 ids and skips the ones that are already gone.
+    for offset in range(0, len(ids), DELETE_MESSAGES_LIMIT):
         try:
-            await bot.delete_message(chat_id, message_id)
-            deleted_count += 1
-            failed_count = 0
-        except (TelegramBadRequest, TelegramAPIError) as e:
-            error_code = getattr(e, 'error_code', None)
-            if error_code == 400:
-                failed_count += 1
-                if failed_count >= max_failed:
-                    break
-            continue
+            await bot.delete_messages(chat_id=chat_id, message_ids=ids[offset:offset + DELETE_MESSAGES_LIMIT])
+        except (TelegramBadRequest, TelegramAPIError):
+            pass
         except Exception:
-            failed_count += 1
-            if failed_count >= max_failed:
-                break
-            continue
\ No newline at end of file
+            pass
+
+
+async def safe_delete_recent_bot_messages(
+    bot: Bot,
+    chat_id: int,
+    start_message_id: int,
+    count: int = 100,
+    exclude_message_id: int | None = None,
+    extra_message_ids: Iterable[int] = (),
+) -> None:
+    """Delete up to `count` tracked bot messages at or below start_message_id, plus any extra ids, in one call."""
+    from bot.utils.di import get_services
+
+    registry = get_services().message_registry
+    tracked = await registry.take(chat_id, start_message_id, count, exclude=(exclude_message_id,))
+    await safe_delete_messages(bot, chat_id, [*tracked, *extra_message_ids])
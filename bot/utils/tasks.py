@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Iterator, Optional
+
+from config import RuntimeConfig
+from bot.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_TASKS = Gauge(
+    "background_tasks",
+    "Background tasks owned by the supervisor, running or waiting for a slot.",
+    ("kind",),
+)
+BACKGROUND_TASK_RESULTS = Counter(
+    "background_tasks_total",
+    "Finished background tasks by kind and outcome (ok, error, cancelled, dropped).",
+    ("kind", "outcome"),
+)
+
+
+class SpawnedTasks:
+    """Tasks spawned inside a collect_spawned() block, including tasks those tasks spawn."""
+
+    def __init__(self) -> None:
+        self._tasks: set[asyncio.Task[Any]] = set()
+        self._callbacks: list[Callable[[], None]] = []
+
+    def add(self, task: asyncio.Task[Any]) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._check)
+
+    def when_done(self, callback: Callable[[], None]) -> None:
+        """Runs callback once every collected task has finished; right away if none is running."""
+        self._callbacks.append(callback)
+        self._check()
+
+    async def wait(self) -> None:
+        while pending := [task for task in self._tasks if not task.done()]:
+            await asyncio.wait(pending)
+
+    def _check(self, _: Optional[asyncio.Task[Any]] = None) -> None:
+        if self._callbacks and all(task.done() for task in self._tasks):
+            callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                callback()
+
+
+_collector: ContextVar[Optional[SpawnedTasks]] = ContextVar("spawned_tasks", default=None)
+
+
+@contextmanager
+def collect_spawned() -> Iterator[SpawnedTasks]:
+    spawned = SpawnedTasks()
+    token = _collector.set(spawned)
+    try:
+        yield spawned
+    finally:
+        _collector.reset(token)
+
+
+class TaskSupervisor:
+    """Owns every fire-and-forget task so none is lost, leaked or left running at shutdown.
+
+    Short jobs go through spawn(): at most max_concurrency run at once, and past limit
+    tracked jobs new ones are dropped rather than piling up. Long-lived workers go through
+    start_service() and are only cancelled by drain(). Failures are logged either way.
+    """
+
+    def __init__(self, max_concurrency: int = 50, limit: int = 1000) -> None:
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._limit = limit
+        self._tasks: set[asyncio.Task[Any]] = set()
+        self._services: set[asyncio.Task[Any]] = set()
+        self._closed = False
+
+    def spawn(self, coro: Coroutine[Any, Any, Any], kind: str) -> Optional[asyncio.Task[Any]]:
+        if self._closed or len(self._tasks) >= self._limit:
+            coro.close()
+            BACKGROUND_TASK_RESULTS.inc(kind=kind, outcome="dropped")
+            reason = "shutting down" if self._closed else f"{len(self._tasks)} already pending"
+            logger.warning(f"Dropped background task {kind}: {reason}")
+            return None
+        task = asyncio.create_task(self._run(coro), name=kind)
+        self._track(task, self._tasks, kind)
+        collector = _collector.get()
+        if collector is not None:
+            collector.add(task)
+        return task
+
+    def start_service(self, coro: Coroutine[Any, Any, Any], kind: str) -> asyncio.Task[Any]:
+        task = asyncio.create_task(coro, name=kind)
+        self._track(task, self._services, kind)
+        return task
+
+    async def drain(self, timeout: float) -> None:
+        # Short jobs (message cleanups and the like) get to finish; services are stopped.
+        self._closed = True
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} background tasks")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"Cancelled {len(pending)} background tasks still running at shutdown")
+                await asyncio.wait(pending)
+        services = set(self._services)
+        for task in services:
+            task.cancel()
+        if services:
+            await asyncio.wait(services)
+
+    async def _run(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        async with self._slots:
+            return await coro
+
+    def _track(self, task: asyncio.Task[Any], owner: set[asyncio.Task[Any]], kind: str) -> None:
+        owner.add(task)
+        BACKGROUND_TASKS.inc(kind=kind)
+
+        def done(finished: asyncio.Task[Any]) -> None:
+            owner.discard(finished)
+            BACKGROUND_TASKS.dec(kind=kind)
+            if finished.cancelled():
+                BACKGROUND_TASK_RESULTS.inc(kind=kind, outcome="cancelled")
+                return
+            error = finished.exception()
+            if error is not None:
+                BACKGROUND_TASK_RESULTS.inc(kind=kind, outcome="error")
+                logger.error(f"Background task {kind} failed: {error}", exc_info=error)
+            else:
+                BACKGROUND_TASK_RESULTS.inc(kind=kind, outcome="ok")
+
+        task.add_done_callback(done)
+
+
+_supervisor: Optional[TaskSupervisor] = None
+
+
+def init_task_supervisor(config: RuntimeConfig) -> TaskSupervisor:
+    global _supervisor
+    _supervisor = TaskSupervisor(config.background_task_concurrency, config.background_task_limit)
+    return _supervisor
+
+
+def get_task_supervisor() -> TaskSupervisor:
+    # Scripts and tests that never call init_task_supervisor still get bounded, logged tasks.
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = TaskSupervisor()
+    return _supervisor
+
+
+def spawn(coro: Coroutine[Any, Any, Any], kind: str) -> Optional[asyncio.Task[Any]]:
+    return get_task_supervisor().spawn(coro, kind)
@@ -0,0 +1,241 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, GetUpdates, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config import TelegramRateLimitConfig
+from bot.database.pool import QUERY_CLASS_INTERACTIVE, current_query_class
+from bot.utils.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Lower value goes first. Callback answers expire after a few seconds, so they jump every queue.
+LANE_URGENT = 0
+LANE_INTERACTIVE = 1
+LANE_BULK = 2
+LANE_NAMES = {LANE_URGENT: "urgent", LANE_INTERACTIVE: "interactive", LANE_BULK: "bulk"}
+
+# Per-chat buckets that refilled completely carry no state, so they are dropped past this many.
+_MAX_IDLE_CHAT_BUCKETS = 10_000
+
+REQUESTS_WAITING = Gauge(
+    "telegram_requests_waiting",
+    "Outgoing Telegram calls waiting for a rate limit token.",
+    ("lane",),
+)
+API_CALL_SECONDS = Histogram(
+    "telegram_api_seconds",
+    "Telegram Bot API call latency, rate limiter wait excluded.",
+    ("method",),
+)
+API_CALL_ERRORS = Counter(
+    "telegram_api_errors_total",
+    "Telegram Bot API calls that failed, by method and exception type.",
+    ("method", "error"),
+)
+REQUEST_WAIT = Histogram(
+    "telegram_request_wait_seconds",
+    "Time an outgoing Telegram call waited for the rate limiter.",
+    ("lane",),
+)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Seconds until one token is available; 0 when one can be taken now."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def drain_for(self, seconds: float) -> None:
+        # Telegram said to back off: no tokens until `seconds` from now.
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.capacity
+
+
+@dataclass(order=True)
+class _Waiter:
+    lane: int
+    seq: int
+    chat_id: Optional[Union[int, str]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class OutboundRateLimiter:
+    """Global token bucket plus one per chat; waiting calls are granted in lane order.
+
+    A single granter task hands out tokens, so an interactive call queued behind bulk
+    notifications still goes first, and a chat that is out of tokens does not hold up
+    calls to other chats.
+    """
+
+    def __init__(self, config: TelegramRateLimitConfig) -> None:
+        self._config = config
+        self._global = TokenBucket(config.global_per_second, config.global_per_second)
+        self._chats: dict[Union[int, str], TokenBucket] = {}
+        self._waiting: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._granter: Optional[asyncio.Task] = None
+
+    async def acquire(self, lane: int, chat_id: Optional[Union[int, str]]) -> None:
+        waiter = _Waiter(lane, next(self._seq), chat_id, asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        lane_name = LANE_NAMES[lane]
+        REQUESTS_WAITING.inc(lane=lane_name)
+        started = time.monotonic()
+        self._wakeup.set()
+        if self._granter is None or self._granter.done():
+            self._granter = asyncio.create_task(self._grant_loop())
+        try:
+            await waiter.future
+        finally:
+            REQUESTS_WAITING.dec(lane=lane_name)
+            REQUEST_WAIT.observe(time.monotonic() - started, lane=lane_name)
+
+    def back_off(self, chat_id: Optional[Union[int, str]], seconds: float) -> None:
+        # A flood wait on a call to one chat is that chat's limit; pausing everyone for it
+        # would stall callback answers in every other chat.
+        if chat_id is not None:
+            self._chat_bucket(chat_id).drain_for(seconds)
+        else:
+            self._global.drain_for(seconds)
+        self._wakeup.set()
+
+    async def close(self) -> None:
+        if self._granter is not None:
+            self._granter.cancel()
+        for waiter in self._waiting:
+            waiter.future.cancel()
+        self._waiting.clear()
+
+    async def _grant_loop(self) -> None:
+        while self._waiting:
+            self._wakeup.clear()
+            sleep_for = self._grant(time.monotonic())
+            if not self._waiting:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant(self, now: float) -> Optional[float]:
+        """Hands out every token available now and returns how long until the next one."""
+        self._waiting.sort()
+        next_in: Optional[float] = None
+        remaining: list[_Waiter] = []
+        for index, waiter in enumerate(self._waiting):
+            if waiter.future.done():
+                continue
+            global_delay = self._global.delay(now)
+            if global_delay > 0:
+                # Out of global tokens: everyone behind waits, higher lanes keep their place.
+                remaining.extend(w for w in self._waiting[index:] if not w.future.done())
+                next_in = global_delay if next_in is None else min(next_in, global_delay)
+                break
+            bucket = self._chat_bucket(waiter.chat_id) if waiter.chat_id is not None else None
+            if bucket is not None:
+                chat_delay = bucket.delay(now)
+                if chat_delay > 0:
+                    remaining.append(waiter)
+                    next_in = chat_delay if next_in is None else min(next_in, chat_delay)
+                    continue
+                bucket.take()
+            self._global.take()
+            waiter.future.set_result(None)
+        self._waiting = remaining
+        self._prune_chat_buckets()
+        return next_in
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if _is_group(chat_id):
+                rate = self._config.group_per_minute / 60
+            else:
+                rate = self._config.chat_per_second
+            bucket = self._chats[chat_id] = TokenBucket(rate, self._config.chat_burst)
+        return bucket
+
+    def _prune_chat_buckets(self) -> None:
+        if len(self._chats) <= _MAX_IDLE_CHAT_BUCKETS:
+            return
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.delay(now) == 0 and bucket.full]:
+            del self._chats[chat_id]
+
+
+class RateLimitedSession(AiohttpSession):
+    """AiohttpSession that rate-limits every call except getUpdates and times each one.
+
+    The lane comes from the call itself (callback answers are urgent) and otherwise from
+    the query class of the calling code, so scheduled jobs running under the background
+    class queue behind handlers replying to users.
+    """
+
+    def __init__(self, config: TelegramRateLimitConfig, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._limiter = OutboundRateLimiter(config)
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+        timeout: Optional[int] = None,
+    ) -> TelegramType:
+        if isinstance(method, GetUpdates):
+            return await super().make_request(bot, method, timeout=timeout)
+        chat_id = getattr(method, "chat_id", None)
+        name = type(method).__name__
+        await self._limiter.acquire(_lane_for(method), chat_id)
+        started = time.monotonic()
+        try:
+            return await super().make_request(bot, method, timeout=timeout)
+        except TelegramRetryAfter as e:
+            API_CALL_ERRORS.inc(method=name, error=type(e).__name__)
+            logger.warning(f"Telegram flood control on {name}: retry after {e.retry_after}s")
+            self._limiter.back_off(chat_id, e.retry_after)
+            raise
+        except Exception as e:
+            API_CALL_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            API_CALL_SECONDS.observe(time.monotonic() - started, method=name)
+
+    async def close(self) -> None:
+        await self._limiter.close()
+        await super().close()
+
+
+def _lane_for(method: TelegramMethod[Any]) -> int:
+    if isinstance(method, AnswerCallbackQuery):
+        return LANE_URGENT
+    if current_query_class() == QUERY_CLASS_INTERACTIVE:
+        return LANE_INTERACTIVE
+    return LANE_BULK
+
+
+def _is_group(chat_id: Union[int, str]) -> bool:
+    # Group, supergroup and channel ids are negative; @usernames only name public groups and channels.
+    return isinstance(chat_id, str) or chat_id < 0
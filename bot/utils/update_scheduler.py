@@ -0,0 +1,84 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncGenerator
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+from bot.utils.metrics import Gauge, Histogram
+
+UPDATES_QUEUED = Gauge(
+    "updates_queued",
+    "Updates waiting for an earlier update from the same chat or for a free worker slot.",
+)
+UPDATES_RUNNING = Gauge(
+    "updates_in_progress",
+    "Updates currently being handled.",
+)
+CHATS_ACTIVE = Gauge(
+    "update_chats_active",
+    "Chats with at least one update queued or in progress.",
+)
+CHAT_QUEUE_MAX_DEPTH = Gauge(
+    "update_chat_queue_max_depth",
+    "Updates queued or in progress for the busiest chat.",
+)
+QUEUE_WAIT = Histogram(
+    "update_queue_wait_seconds",
+    "Time an update waited for its chat turn and a worker slot.",
+)
+
+
+@dataclass(slots=True)
+class _ChatQueue:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Updates of this chat queued or running; the entry is dropped when it reaches zero.
+    depth: int = 0
+
+
+class ChatUpdateScheduler(BaseEventIsolation):
+    """Handles one chat's updates strictly in arrival order and different chats in parallel.
+
+    Plugged in as the dispatcher's event isolation, so it wraps every update before
+    its FSM state is read. An update takes a worker slot only once it is at the head
+    of its chat queue, so one busy chat cannot occupy the whole pool.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._chats: dict[tuple[int, int], _ChatQueue] = {}
+        self._slots = asyncio.Semaphore(max_concurrency)
+        CHATS_ACTIVE.set_function(lambda: len(self._chats))
+        CHAT_QUEUE_MAX_DEPTH.set_function(lambda: max((queue.depth for queue in self._chats.values()), default=0))
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        # Nothing above the lock acquisition may await: updates are dispatched as tasks in
+        # arrival order, and reaching the chat lock in that same order is what keeps them ordered.
+        chat_key = (key.bot_id, key.chat_id)
+        queue = self._chats.get(chat_key)
+        if queue is None:
+            queue = self._chats[chat_key] = _ChatQueue()
+        queue.depth += 1
+        UPDATES_QUEUED.inc()
+        queued_at = time.monotonic()
+        waiting = True
+        try:
+            async with queue.lock, self._slots:
+                waiting = False
+                UPDATES_QUEUED.dec()
+                QUEUE_WAIT.observe(time.monotonic() - queued_at)
+                UPDATES_RUNNING.inc()
+                try:
+                    yield
+                finally:
+                    UPDATES_RUNNING.dec()
+        finally:
+            if waiting:
+                UPDATES_QUEUED.dec()
+            queue.depth -= 1
+            if not queue.depth:
+                self._chats.pop(chat_key, None)
+
+    async def close(self) -> None:
+        self._chats.clear()
@@ -1,20 +1,87 @@
 import os
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from datetime import time
 from typing import Sequence
 
 from dotenv import load_dotenv
 
+# Telegram accepts only these characters in the webhook secret token.
+_WEBHOOK_SECRET_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+
+@dataclass(frozen=True)
+class TelegramWebhookConfig:
+    base_url: str
+    path: str
+    secret_token: str
+    drain_timeout_seconds: float = 10.0
+
+    @property
+    def url(self) -> str:
+        return self.base_url.rstrip("/") + self.path
+
+
+@dataclass(frozen=True)
+class TelegramRateLimitConfig:
+    # Telegram allows about 30 messages a second overall, one a second per private
+    # chat (short bursts tolerated) and 20 a minute per group.
+    global_per_second: float = 25.0
+    chat_per_second: float = 1.0
+    group_per_minute: float = 20.0
+    chat_burst: int = 3
+
 
 @dataclass(frozen=True)
 class BotConfig:
     token: str
     admin_ids: Sequence[int]
+    # None keeps long polling.
+    webhook: TelegramWebhookConfig | None = None
+    # Updates handled at the same time across all chats.
+    update_concurrency: int = 32
+    rate_limit: TelegramRateLimitConfig = field(default_factory=TelegramRateLimitConfig)
+    # Bot API calls one handler may make per update before it is logged and counted.
+    api_call_budget: int = 8
+
+
+@dataclass(frozen=True)
+class QueryTimeouts:
+    interactive: float = 5.0
+    background: float = 30.0
+    bulk: float = 300.0
+
+
+@dataclass(frozen=True)
+class ProfilerConfig:
+    enabled: bool = False
+    slow_query_ms: float = 200.0
+    explain_sample_rate: float = 0.0
+    dump_path: str | None = None
+    dump_interval_minutes: int = 5
+    sample_size: int = 1024
+
+
+@dataclass(frozen=True)
+class ReplicaConfig:
+    dsn: str
+    min_size: int = 1
+    max_size: int = 10
+    max_lag_seconds: float = 5.0
+    lag_check_interval_seconds: float = 10.0
 
 
 @dataclass(frozen=True)
 class DatabaseConfig:
     dsn: str
+    min_size: int = 5
+    max_size: int = 10
+    statement_cache_size: int = 100
+    max_inactive_connection_lifetime: float = 300.0
+    acquire_timeout: float = 10.0
+    timeouts: QueryTimeouts = QueryTimeouts()
+    profiler: ProfilerConfig = ProfilerConfig()
+    replica: ReplicaConfig | None = None
 
 
 @dataclass(frozen=True)
@@ -50,6 +117,63 @@ class YooKassaConfig:
     api_key: str
     shop_id: str
     webhook_url: str
+    api_url: str | None = None
+
+
+@dataclass(frozen=True)
+class ReconciliationConfig:
+    interval_minutes: int
+    stale_after_minutes: int
+    max_age_hours: int
+    batch_size: int
+    concurrency: int
+
+
+@dataclass(frozen=True)
+class RetentionConfig:
+    archive_after_days: int | None
+    batch_size: int
+    batch_pause_seconds: float
+    run_at: time
+
+
+@dataclass(frozen=True)
+class FSMConfig:
+    cache_size: int = 1024
+    cache_ttl_seconds: int = 300
+    state_ttl_hours: int = 72
+
+
+@dataclass(frozen=True)
+class MessageRegistryConfig:
+    per_chat: int = 50
+    max_chats: int = 10000
+    persist: bool = False
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    # Bearer token required on GET /metrics; None serves it to anyone who can reach the port.
+    token: str | None = None
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    loop_lag_interval_seconds: float = 0.5
+    # A loop blocked this long gets its stack logged.
+    loop_stall_seconds: float = 1.0
+    background_task_concurrency: int = 50
+    background_task_limit: int = 1000
+    background_drain_seconds: float = 10.0
+
+
+@dataclass(frozen=True)
+class RefundConfig:
+    concurrency: int
+    max_attempts: int
+    retry_base_seconds: int
+    retry_max_seconds: int
+    poll_seconds: int
 
 
 @dataclass(frozen=True)
@@ -60,6 +184,13 @@ class Config:
     support: SupportLinks
     reminders: ReminderConfig
     yookassa: YooKassaConfig
+    reconciliation: ReconciliationConfig
+    refunds: RefundConfig
+    retention: RetentionConfig
+    fsm: FSMConfig
+    message_registry: MessageRegistryConfig
+    metrics: MetricsConfig
+    runtime: RuntimeConfig
 
 
 def _parse_admin_ids(raw: str | None) -> Sequence[int]:
@@ -102,14 +233,137 @@ def load_config() -> Config:
         api_key=_require_env("YOOKASSA_API_KEY"),
         shop_id=_require_env("YOOKASSA_SHOP_ID"),
         webhook_url=_require_env("YOOKASSA_WEBHOOK_URL"),
+        api_url=os.getenv("YOOKASSA_API_URL") or None,
+    )
+    reconciliation = ReconciliationConfig(
+        interval_minutes=_optional_positive_int("RECONCILE_INTERVAL_MINUTES", 10),
+        stale_after_minutes=_optional_positive_int("RECONCILE_STALE_AFTER_MINUTES", 15),
+        max_age_hours=_optional_positive_int("RECONCILE_MAX_AGE_HOURS", 72),
+        batch_size=_optional_positive_int("RECONCILE_BATCH_SIZE", 100),
+        concurrency=_optional_positive_int("RECONCILE_CONCURRENCY", 5),
+    )
+    refunds = RefundConfig(
+        concurrency=_optional_positive_int("REFUND_CONCURRENCY", 5),
+        max_attempts=_optional_positive_int("REFUND_MAX_ATTEMPTS", 8),
+        retry_base_seconds=_optional_positive_int("REFUND_RETRY_BASE_SECONDS", 30),
+        retry_max_seconds=_optional_positive_int("REFUND_RETRY_MAX_SECONDS", 3600),
+        poll_seconds=_optional_positive_int("REFUND_POLL_SECONDS", 60),
+    )
+    archive_after_days = os.getenv("RETENTION_ARCHIVE_AFTER_DAYS")
+    retention = RetentionConfig(
+        archive_after_days=_parse_positive_int(archive_after_days, "RETENTION_ARCHIVE_AFTER_DAYS") if archive_after_days else None,
+        batch_size=_optional_positive_int("RETENTION_BATCH_SIZE", 1000),
+        batch_pause_seconds=_optional_positive_float("RETENTION_BATCH_PAUSE_SECONDS", 0.5),
+        run_at=_parse_time_value(os.getenv("RETENTION_RUN_TIME"), default=time(hour=4, minute=30)),
+    )
+    webhook = _parse_telegram_webhook_config()
+    fsm = FSMConfig(
+        cache_size=_optional_non_negative_int("FSM_CACHE_SIZE", 1024),
+        # A load balancer spreads a chat's updates over instances, so each must reread the state.
+        cache_ttl_seconds=_optional_non_negative_int("FSM_CACHE_TTL_SECONDS", 300 if webhook is None else 0),
+        state_ttl_hours=_optional_positive_int("FSM_STATE_TTL_HOURS", 72),
+    )
+    message_registry = MessageRegistryConfig(
+        per_chat=_optional_positive_int("MESSAGE_REGISTRY_PER_CHAT", 50),
+        max_chats=_optional_positive_int("MESSAGE_REGISTRY_MAX_CHATS", 10000),
+        persist=_optional_bool("MESSAGE_REGISTRY_PERSIST", False),
     )
     return Config(
-        bot=BotConfig(token=token, admin_ids=admin_ids),
-        database=DatabaseConfig(dsn=dsn),
+        bot=BotConfig(
+            token=token,
+            admin_ids=admin_ids,
+            webhook=webhook,
+            update_concurrency=_optional_positive_int("UPDATE_CONCURRENCY", 32),
+            rate_limit=TelegramRateLimitConfig(
+                global_per_second=_optional_positive_float("TELEGRAM_RATE_GLOBAL_PER_SECOND", 25.0),
+                chat_per_second=_optional_positive_float("TELEGRAM_RATE_CHAT_PER_SECOND", 1.0),
+                group_per_minute=_optional_positive_float("TELEGRAM_RATE_GROUP_PER_MINUTE", 20.0),
+                chat_burst=_optional_positive_int("TELEGRAM_RATE_CHAT_BURST", 3),
+            ),
+            api_call_budget=_optional_positive_int("TELEGRAM_API_CALL_BUDGET", 8),
+        ),
+        database=_parse_database_config(dsn),
         community=community,
         support=support,
         reminders=reminders,
         yookassa=yookassa,
+        reconciliation=reconciliation,
+        refunds=refunds,
+        retention=retention,
+        fsm=fsm,
+        message_registry=message_registry,
+        metrics=MetricsConfig(token=os.getenv("METRICS_TOKEN") or None),
+        runtime=RuntimeConfig(
+            loop_lag_interval_seconds=_optional_positive_float("LOOP_LAG_INTERVAL_SECONDS", 0.5),
+            loop_stall_seconds=_optional_positive_float("LOOP_STALL_SECONDS", 1.0),
+            background_task_concurrency=_optional_positive_int("BACKGROUND_TASK_CONCURRENCY", 50),
+            background_task_limit=_optional_positive_int("BACKGROUND_TASK_LIMIT", 1000),
+            background_drain_seconds=_optional_positive_float("BACKGROUND_DRAIN_SECONDS", 10.0),
+        ),
+    )
+
+
+def _parse_database_config(dsn: str) -> DatabaseConfig:
+    min_size = _optional_non_negative_int("DB_POOL_MIN_SIZE", 5)
+    max_size = _optional_positive_int("DB_POOL_MAX_SIZE", 10)
+    if min_size > max_size:
+        raise RuntimeError("DB_POOL_MIN_SIZE must not exceed DB_POOL_MAX_SIZE")
+    return DatabaseConfig(
+        dsn=dsn,
+        min_size=min_size,
+        max_size=max_size,
+        statement_cache_size=_optional_non_negative_int("DB_STATEMENT_CACHE_SIZE", 100),
+        max_inactive_connection_lifetime=_optional_positive_float("DB_MAX_INACTIVE_CONNECTION_LIFETIME", 300.0),
+        acquire_timeout=_optional_positive_float("DB_ACQUIRE_TIMEOUT", 10.0),
+        timeouts=QueryTimeouts(
+            interactive=_optional_positive_float("DB_TIMEOUT_INTERACTIVE", 5.0),
+            background=_optional_positive_float("DB_TIMEOUT_BACKGROUND", 30.0),
+            bulk=_optional_positive_float("DB_TIMEOUT_BULK", 300.0),
+        ),
+        profiler=ProfilerConfig(
+            enabled=_optional_bool("DB_PROFILE", False),
+            slow_query_ms=_optional_positive_float("DB_SLOW_QUERY_MS", 200.0),
+            explain_sample_rate=_optional_ratio("DB_EXPLAIN_SAMPLE_RATE", 0.0),
+            dump_path=os.getenv("DB_PROFILE_DUMP_PATH") or None,
+            dump_interval_minutes=_optional_positive_int("DB_PROFILE_DUMP_INTERVAL_MINUTES", 5),
+            sample_size=_optional_positive_int("DB_PROFILE_SAMPLE_SIZE", 1024),
+        ),
+        replica=_parse_replica_config(),
+    )
+
+
+def _parse_telegram_webhook_config() -> TelegramWebhookConfig | None:
+    base_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    if not base_url:
+        return None
+    secret_token = _require_env("TELEGRAM_WEBHOOK_SECRET")
+    if not _WEBHOOK_SECRET_PATTERN.fullmatch(secret_token):
+        raise RuntimeError("TELEGRAM_WEBHOOK_SECRET must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+    path = os.getenv("TELEGRAM_WEBHOOK_PATH") or "/telegram_update"
+    if not path.startswith("/"):
+        raise RuntimeError("TELEGRAM_WEBHOOK_PATH must start with /")
+    return TelegramWebhookConfig(
+        base_url=base_url,
+        path=path,
+        secret_token=secret_token,
+        drain_timeout_seconds=_optional_positive_float("TELEGRAM_WEBHOOK_DRAIN_SECONDS", 10.0),
+    )
+
+
+def _parse_replica_config() -> ReplicaConfig | None:
+    dsn = os.getenv("DB_REPLICA_URL")
+    if not dsn:
+        return None
+    min_size = _optional_non_negative_int("DB_REPLICA_POOL_MIN_SIZE", 1)
+    max_size = _optional_positive_int("DB_REPLICA_POOL_MAX_SIZE", 10)
+    if min_size > max_size:
+        raise RuntimeError("DB_REPLICA_POOL_MIN_SIZE must not exceed DB_REPLICA_POOL_MAX_SIZE")
+    return ReplicaConfig(
+        dsn=dsn,
+        min_size=min_size,
+        max_size=max_size,
+        max_lag_seconds=_optional_positive_float("DB_REPLICA_MAX_LAG_SECONDS", 5.0),
+        lag_check_interval_seconds=_optional_positive_float("DB_REPLICA_LAG_CHECK_SECONDS", 10.0),
     )
 
 
@@ -153,6 +407,53 @@ def _parse_positive_int(raw: str, key: str) -> int:
     return value
 
 
+def _optional_positive_int(key: str, default: int) -> int:
+    raw = os.getenv(key)
+    if not raw:
+        return default
+    return _parse_positive_int(raw, key)
+
+
+def _optional_non_negative_int(key: str, default: int) -> int:
+    raw = os.getenv(key)
+    if not raw:
+        return default
+    return _parse_non_negative_int(raw, key)
+
+
+def _optional_positive_float(key: str, default: float) -> float:
+    raw = os.getenv(key)
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError as error:
+        raise RuntimeError(f"{key} must be a number") from error
+    if value <= 0:
+        raise RuntimeError(f"{key} must be greater than zero")
+    return value
+
+
+def _optional_ratio(key: str, default: float) -> float:
+    raw = os.getenv(key)
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError as error:
+        raise RuntimeError(f"{key} must be a number") from error
+    if not 0 <= value <= 1:
+        raise RuntimeError(f"{key} must be between 0 and 1")
+    return value
+
+
+def _optional_bool(key: str, default: bool) -> bool:
+    raw = os.getenv(key)
+    if not raw:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _parse_non_negative_int(raw: str, key: str) -> int:
     try:
         value = int(raw)
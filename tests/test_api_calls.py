@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import logging
+from collections import Counter
+from types import SimpleNamespace
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, DeleteMessages, EditMessageText, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from bot.database.repositories.events import Event
+from bot.handlers import events
+from bot.middleware.api_calls import ApiCallBudgetMiddleware, ApiCallCountingMiddleware, track_api_calls
+from bot.services.registration_service import Availability
+from bot.utils import di
+from bot.utils.tasks import collect_spawned
+
+CHAT = Chat(id=100, type="private")
+USER = User(id=100, is_bot=False, first_name="Test")
+
+
+class StubSession(BaseSession):
+    """Answers every request locally and records which methods were called."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests: list[TelegramMethod] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.requests.append(method)
+        if isinstance(method, EditMessageText):
+            return Message(message_id=method.message_id, date=datetime.datetime.now(), chat=CHAT, text=method.text)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        # No file downloads here: an empty stream.
+        return
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class StubRegistry:
+    def __init__(self, tracked: list[int]) -> None:
+        self.tracked = tracked
+
+    async def take(self, chat_id, start_message_id, count, exclude=()):
+        return self.tracked
+
+
+def _services() -> SimpleNamespace:
+    event = Event(
+        id=1, title="Meetup", date=datetime.date(2099, 1, 1), time=datetime.time(19, 0), end_date=None,
+        end_time=None, place="Hall", description=None, cost=None, image_file_id=None, max_participants=None,
+        reminder_3days=False, reminder_1day=False, reminder_3days_sent_at=None, reminder_1day_sent_at=None,
+        status="active",
+    )
+
+    async def get_event(event_id):
+        return event
+
+    async def ensure(*args):
+        return SimpleNamespace(id=7)
+
+    async def get_stats(event_id):
+        return SimpleNamespace(going=3)
+
+    async def is_registered(event_id, user_id):
+        return False
+
+    return SimpleNamespace(
+        events=SimpleNamespace(get_event=get_event),
+        users=SimpleNamespace(ensure=ensure),
+        registrations=SimpleNamespace(
+            get_stats=get_stats,
+            is_registered=is_registered,
+            availability=lambda capacity, going: Availability(capacity=capacity, going=going),
+        ),
+        message_registry=StubRegistry([8, 9]),
+    )
+
+
+def _dispatcher(budget: int) -> Dispatcher:
+    dp = Dispatcher()
+    dp.callback_query.middleware(ApiCallBudgetMiddleware(budget))
+    dp.include_router(events.router)
+    return dp
+
+
+def _view_update() -> Update:
+    message = Message(message_id=10, date=datetime.datetime.now(), chat=CHAT, from_user=USER, text="Menu")
+    callback = CallbackQuery(id="1", from_user=USER, chat_instance="1", data="event:view:1", message=message)
+    return Update(update_id=1, callback_query=callback)
+
+
+def test_show_event_api_calls(caplog, monkeypatch):
+    session = StubSession()
+    session.middleware(ApiCallCountingMiddleware())
+    bot = Bot("42:TEST", session=session)
+    dp = _dispatcher(budget=2)
+    # monkeypatch puts the real globals back after the test.
+    monkeypatch.setattr(di, "_config", SimpleNamespace(support=SimpleNamespace(question_url="https://t.me/support")))
+    monkeypatch.setattr(di, "_services", _services())
+
+    async def feed():
+        with track_api_calls() as tally, collect_spawned() as spawned:
+            await dp.feed_update(bot, _view_update())
+            await spawned.wait()
+        return tally
+
+    with caplog.at_level(logging.WARNING, logger="bot.middleware.api_calls"):
+        tally = asyncio.run(feed())
+
+    assert tally.total == 3
+    assert tally.calls == Counter({"EditMessageText": 1, "DeleteMessages": 1, "AnswerCallbackQuery": 1})
+    assert [type(request) for request in session.requests] == [EditMessageText, AnswerCallbackQuery, DeleteMessages]
+    assert session.requests[2].message_ids == [8, 9]
+    # The cleanup runs after the handler returns but is still charged to it.
+    assert "show_event made 3 Telegram API calls (budget 2)" in caplog.text